@@ -0,0 +1,77 @@
+import asyncio
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterator, List
+
+import testing.postgresql
+import uvicorn
+from final_project.api.storage import app
+from final_project.config import image_storage_settings
+from final_project.database import database
+from final_project.utils import rmtree
+from sqlalchemy import create_engine
+
+STORAGE_FOLDER_NAME = 'benchmark-image-storage'
+
+
+@contextmanager
+def postgres_database() -> Iterator[None]:
+    '''
+    Поднимает временный postgres и подменяет им engine проекта, как в тестах
+    '''
+    with testing.postgresql.Postgresql() as postgres:
+        database.engine = create_engine(postgres.url())
+        database.Base.metadata.create_all(database.engine)
+        yield
+        database.engine.dispose()
+
+
+@contextmanager
+def storage_server(port: int) -> Iterator[None]:
+    '''
+    Запускает узел хранилища в потоке с отдельной папкой изображений,
+    которая удаляется после бенчмарка
+    '''
+    image_storage_settings.storage_folder_name = STORAGE_FOLDER_NAME
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level='warning'))
+    thread = threading.Thread(target=server.run)
+    thread.start()
+    while not server.started:
+        time.sleep(0.1)
+    try:
+        yield
+    finally:
+        server.should_exit = True
+        thread.join()
+        rmtree(Path(__file__).resolve().parent.parent / STORAGE_FOLDER_NAME)
+
+
+def measure(func: Callable[[], Any], repeat: int = 20) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def measure_async(func: Callable[[], Awaitable[Any]], repeat: int = 20) -> List[float]:
+    loop = asyncio.new_event_loop()
+    try:
+        return measure(lambda: loop.run_until_complete(func()), repeat)
+    finally:
+        loop.close()
+
+
+def percentile(timings: List[float], value: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * value))]
+
+
+def format_timings(timings: List[float]) -> str:
+    median = statistics.median(timings) * 1000
+    p99 = percentile(timings, 0.99) * 1000
+    return f'median {median:8.2f} ms  p99 {p99:8.2f} ms'
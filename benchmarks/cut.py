@@ -0,0 +1,112 @@
+'''
+Сравнивает процессорное время и пиковый RSS обрезки изображения до квадрата
+ASPECT_RESOLUTION после полного декодирования и MyImage.cut, который вычисляет
+квадрат до декодирования, декодирует jpeg в уменьшенном масштабе
+и пересэмплирует квадрат один раз.
+Каждая обрезка выполняется в отдельном процессе, пиковый RSS
+сбрасывается перед ней через /proc, поэтому бенчмарк работает только в Linux.
+
+    python -m benchmarks.cut
+'''
+import resource
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+from final_project.image_processor.image import MyImage
+from PIL import Image
+from PIL.Image import LANCZOS  # type: ignore
+
+ASPECT_RESOLUTION = 1080
+SIZES = {'1 MP': (1224, 816), '12 MP': (4000, 3000), '48 MP': (8000, 6000)}
+FORMATS = ['jpeg', 'png']
+KILOBYTE = 1024
+
+
+def _cut_full_decode(image_bytes: bytes, aspect_resolution: int) -> Image.Image:
+    image = Image.open(BytesIO(image_bytes))
+    image.load()
+    side = min(image.width, image.height)
+    x, y = (image.width - side) // 2, (image.height - side) // 2
+    square = image.crop((x, y, x + side, y + side))
+    return square.resize((aspect_resolution, aspect_resolution), LANCZOS)
+
+
+def _cut(image_bytes: bytes, aspect_resolution: int) -> Image.Image:
+    return MyImage(image_bytes).cut(aspect_resolution)
+
+
+PIPELINES: Dict[str, Callable[[bytes, int], Image.Image]] = {
+    'full decode': _cut_full_decode,
+    'cut': _cut,
+}
+
+
+def _get_cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _get_memory_status(name: str) -> float:
+    '''
+    :return: значение поля /proc/self/status в мегабайтах
+    '''
+    for line in Path('/proc/self/status').read_text().splitlines():
+        if line.startswith(f'{name}:'):
+            return int(line.split()[1]) / KILOBYTE
+    raise ValueError(name)
+
+
+def _run(path: Path, pipeline: str) -> Tuple[float, float, float]:
+    '''
+    :return: процессорное время в секундах, RSS до обрезки
+    и пиковый RSS во время нее в мегабайтах
+    '''
+    image_bytes = path.read_bytes()
+    Path('/proc/self/clear_refs').write_text('5')
+    rss = _get_memory_status('VmRSS')
+    start = _get_cpu_time()
+    PIPELINES[pipeline](image_bytes, ASPECT_RESOLUTION).load()
+    return _get_cpu_time() - start, rss, _get_memory_status('VmHWM')
+
+
+def _make_image(size: Tuple[int, int]) -> Image.Image:
+    gradient = Image.radial_gradient('L').resize(size)
+    noise = Image.effect_noise(size, 32)
+    return Image.merge(
+        'RGB', (gradient, noise, Image.linear_gradient('L').resize(size))
+    )
+
+
+def _write_images(directory: Path) -> Dict[Tuple[str, str], Path]:
+    res = {}
+    for name, size in SIZES.items():
+        image = _make_image(size)
+        for image_format in FORMATS:
+            path = directory / f'{name.replace(" ", "")}.{image_format}'
+            image.save(path, image_format)
+            res[name, image_format] = path
+    return res
+
+
+def main() -> None:
+    context = get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        images = _write_images(Path(directory))
+        for (name, image_format), path in images.items():
+            for pipeline in PIPELINES:
+                with ProcessPoolExecutor(1, mp_context=context) as executor:
+                    future = executor.submit(_run, path, pipeline)
+                    cpu_time, rss, peak_rss = future.result()
+                print(
+                    f'{name:>6} {image_format:>4}  {pipeline:>11}  '
+                    f'cpu {cpu_time * 1000:8.1f} ms  '
+                    f'peak rss {peak_rss:7.1f} MB (+{peak_rss - rss:6.1f} MB)'
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+'''
+Сравнивает постраничную выдачу ленты одним SQL запросом с прежней схемой,
+когда все посты подписок загружались в python и сортировались.
+
+    python -m benchmarks.feed
+'''
+from datetime import datetime, timedelta
+from typing import List
+
+from benchmarks.common import format_timings, measure, measure_async, postgres_database
+from final_project.data_access_layer.users import UsersDataAccessLayer
+from final_project.database.database import create_session
+from final_project.database.models import Post, User, user_subsriptions
+from final_project.utils import get_pagination
+
+FOLLOWED_AUTHORS = 200
+POSTS_TOTALS = [1_000, 10_000, 50_000]
+PAGE_SIZE = 20
+
+
+def _populate(posts_total: int) -> None:
+    with create_session() as session:
+        session.execute(
+            User.__table__.insert(),
+            [{'username': str(i)} for i in range(FOLLOWED_AUTHORS + 1)],
+        )
+        session.execute(
+            user_subsriptions.insert(),
+            [
+                {'follower_id': 1, 'followed_id': author_id}
+                for author_id in range(2, FOLLOWED_AUTHORS + 2)
+            ],
+        )
+        start = datetime.utcnow()
+        session.execute(
+            Post.__table__.insert(),
+            [
+                {
+                    'user_id': i % (FOLLOWED_AUTHORS + 1) + 1,
+                    'image_path': str(i),
+                    'description': 'descr',
+                    'created_at': start + timedelta(seconds=i),
+                }
+                for i in range(posts_total)
+            ],
+        )
+        session.execute('ANALYZE')
+
+
+def _legacy_feed_page() -> List[Post]:
+    with create_session() as session:
+        user = session.query(User).filter(User.id == 1).one()
+        posts = list(user.posts)
+        for subscription in user.subscriptions:
+            posts.extend(subscription.posts)
+        posts.sort(key=lambda post: post.created_at)
+        return get_pagination(posts, 1, PAGE_SIZE)
+
+
+def main() -> None:
+    for posts_total in POSTS_TOTALS:
+        with postgres_database():
+            _populate(posts_total)
+            sql = measure_async(
+                lambda: UsersDataAccessLayer.get_feed_posts_with_paths(1, 1, PAGE_SIZE)
+            )
+            legacy = measure(_legacy_feed_page, repeat=5)
+        print(f'posts={posts_total:>6}  sql:    {format_timings(sql)}')
+        print(f'posts={posts_total:>6}  legacy: {format_timings(legacy)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+'''
+Сравнивает размер и время кодирования изображений из tests/images
+в форматах хранилища, в исходном размере и в размере варианта feed.
+
+    python -m benchmarks.image_formats
+'''
+import statistics
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from benchmarks.common import measure
+from final_project.config import (
+    ImageFormat,
+    image_cutting_settings,
+    image_storage_settings,
+)
+from final_project.image_formats import encode_image
+from PIL.Image import LANCZOS, Image  # type: ignore
+from PIL.Image import open as open_image
+
+IMAGES_DIRECTORY = Path(__file__).resolve().parent.parent / 'tests' / 'images'
+FEED_VARIANT = 'feed'
+
+
+def _get_images() -> List[Tuple[str, Image]]:
+    size = image_cutting_settings.variants[FEED_VARIANT]
+    res: List[Tuple[str, Image]] = []
+    for path in sorted(IMAGES_DIRECTORY.iterdir()):
+        image = open_image(path)
+        image.load()
+        res.append((path.name, image))
+        res.append((f'{path.name}@{size}', image.resize((size, size), LANCZOS)))
+    return res
+
+
+def main() -> None:
+    quality = image_storage_settings.image_quality
+    totals: Dict[ImageFormat, int] = {image_format: 0 for image_format in ImageFormat}
+    print(f'quality {quality}')
+    for name, image in _get_images():
+        for image_format in ImageFormat:
+            size = len(encode_image(image, image_format, quality))
+            timings = measure(lambda: encode_image(image, image_format, quality))
+            totals[image_format] += size
+            median = statistics.median(timings) * 1000
+            print(
+                f'{name:>20}  {image_format.value:>4}  {size:>8} bytes  '
+                f'encode median {median:8.2f} ms'
+            )
+    for image_format, total in totals.items():
+        print(f'total {image_format.value:>4}  {total:>8} bytes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+'''
+Сравнивает соединение постов с изображениями через индекс по пути
+с прежним вложенным циклом по изображениям и постам.
+
+    python -m benchmarks.join
+'''
+from datetime import datetime
+from typing import List
+
+from benchmarks.common import format_timings, measure
+from final_project.models import (
+    ImageWithPath,
+    OutUser,
+    Post,
+    PostWithImage,
+    PostWithImagePath,
+)
+from final_project.utils import join_posts_with_images
+
+POSTS_TOTALS = [1_000, 10_000]
+IMAGE = b'iVBORw0KGgo='
+
+
+def _get_posts(posts_total: int) -> List[PostWithImagePath]:
+    user = OutUser(id=1, username='user')
+    return [
+        PostWithImagePath(
+            id=i,
+            user=user,
+            comments=[],
+            likes=[],
+            marked_users=[],
+            created_at=datetime.utcnow(),
+            image_path=str(i),
+        )
+        for i in range(posts_total)
+    ]
+
+
+def _legacy_join(
+    posts: List[PostWithImagePath], images: List[ImageWithPath]
+) -> List[PostWithImage]:
+    res = []
+    for img in images:
+        for post in posts:
+            if post.image_path == img.path:
+                res.append(PostWithImage(**Post.from_orm(post).dict(), image=img.image))
+    return res
+
+
+def main() -> None:
+    for posts_total in POSTS_TOTALS:
+        posts = _get_posts(posts_total)
+        images = [ImageWithPath(path=post.image_path, image=IMAGE) for post in posts]
+        images.reverse()
+        indexed = measure(lambda: join_posts_with_images(posts, images), repeat=5)
+        legacy = measure(lambda: _legacy_join(posts, images), repeat=1)
+        print(f'posts={posts_total:>6}  indexed: {format_timings(indexed)}')
+        print(f'posts={posts_total:>6}  legacy:  {format_timings(legacy)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+'''
+Измеряет задержку чтения маленького изображения из хранилища, пока
+параллельно сохраняются большие изображения: с работой с диском и Pillow
+в пуле потоков и прежним вариантом, когда она выполнялась в цикле событий.
+
+    python -m benchmarks.storage_io
+'''
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Any, Callable, Iterator, List, TypeVar
+
+import aiohttp
+from benchmarks.common import format_timings, storage_server
+from final_project.config import image_storage_settings
+from final_project.io_executor import io_executor
+from PIL import Image
+
+T = TypeVar('T')
+
+PORT = 8011
+URL = f'http://127.0.0.1:{PORT}/images/raw'
+LARGE_IMAGE_SIDE = 2000
+READERS = 20
+WRITERS = 2
+DURATION = 5.0
+
+
+def _encode(image: Image.Image) -> bytes:
+    image_bytes = BytesIO()
+    image.save(image_bytes, format='png')
+    return image_bytes.getvalue()
+
+
+def _get_large_image() -> bytes:
+    side = LARGE_IMAGE_SIDE
+    return _encode(Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)))
+
+
+async def _run_inline(func: Callable[..., T], *args: Any) -> T:
+    return func(*args)
+
+
+@contextmanager
+def _inline_io() -> Iterator[None]:
+    setattr(io_executor, 'run', _run_inline)
+    try:
+        yield
+    finally:
+        delattr(io_executor, 'run')
+
+
+async def _read(
+    session: aiohttp.ClientSession, path: str, deadline: float, timings: List[float]
+) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        async with session.get(URL, params={'image_path': path}) as response:
+            await response.read()
+        timings.append(time.perf_counter() - start)
+
+
+async def _write(
+    session: aiohttp.ClientSession, image: bytes, deadline: float, writes: List[int]
+) -> None:
+    while time.perf_counter() < deadline:
+        async with session.post(URL, params={'user_id': 1}, data=image) as response:
+            await response.read()
+        writes.append(1)
+
+
+async def _measure(small_image: bytes, large_image: bytes) -> None:
+    async with aiohttp.ClientSession() as session:
+        async with session.post(
+            URL, params={'user_id': 1}, data=small_image
+        ) as response:
+            path = (await response.json())['path']
+        for with_writes in (False, True):
+            deadline = time.perf_counter() + DURATION
+            timings: List[float] = []
+            writes: List[int] = []
+            await asyncio.gather(
+                *(_read(session, path, deadline, timings) for _ in range(READERS)),
+                *(
+                    _write(session, large_image, deadline, writes)
+                    for _ in range(WRITERS if with_writes else 0)
+                ),
+            )
+            print(
+                f'  large writes={len(writes):>4}  reads={len(timings):>6}  '
+                f'{format_timings(timings)}'
+            )
+
+
+def main() -> None:
+    small_image = _encode(Image.new('RGB', (2, 2)))
+    large_image = _get_large_image()
+    with storage_server(PORT):
+        print(f'thread pool of {image_storage_settings.io_threads}:')
+        asyncio.run(_measure(small_image, large_image))
+        with _inline_io():
+            print('event loop:')
+            asyncio.run(_measure(small_image, large_image))
+
+
+if __name__ == '__main__':
+    main()
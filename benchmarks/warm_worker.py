@@ -0,0 +1,43 @@
+'''
+Сравнивает накладные расходы на задачу у воркера rq по умолчанию,
+который выполняет каждую задачу в новом процессе, и у воркера без fork.
+Задача только открывает сессию бд и выполняет в ней запрос:
+в новом процессе соединение с бд устанавливается заново,
+в прогретом процессе - берется из пула.
+
+    python -m benchmarks.warm_worker
+'''
+import os
+
+from benchmarks.common import format_timings, measure, postgres_database
+from final_project.database import database
+from final_project.database.database import create_session
+
+REPEAT = 200
+
+
+def _job() -> None:
+    with create_session() as session:
+        session.execute('SELECT 1')
+
+
+def _run_forked() -> None:
+    pid = os.fork()
+    if pid == 0:
+        _job()
+        os._exit(0)  # pylint: disable=protected-access
+    os.waitpid(pid, 0)
+
+
+def main() -> None:
+    with postgres_database():
+        _job()
+        # как и у воркера rq, у родителя нет соединений, которые унаследует процесс
+        database.engine.dispose()
+        print(f'fork per job: {format_timings(measure(_run_forked, REPEAT))}')
+        _job()
+        print(f'warm process: {format_timings(measure(_job, REPEAT))}')
+
+
+if __name__ == '__main__':
+    main()
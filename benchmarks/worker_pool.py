@@ -0,0 +1,78 @@
+'''
+Измеряет пропускную способность обработки постов в задачах в секунду
+в зависимости от числа процессов пула: от одного, как у прежнего
+единственного rq worker, до числа ядер, и от размера пачки задач:
+по одной или по worker_batch_size. Задачи отдаются пулу напрямую,
+без очереди redis, поэтому измеряется обработка изображений,
+запись в хранилище и бд.
+
+    python -m benchmarks.worker_pool
+'''
+import os
+import time
+from io import BytesIO
+from typing import List
+
+from benchmarks.common import postgres_database, storage_server
+from final_project import storage_client
+from final_project.config import image_cutting_settings, worker_settings
+from final_project.database.database import create_session
+from final_project.database.models import User
+from final_project.image_processor.pool import WorkerPool
+from final_project.models import QueuedPost
+from final_project.storage_client import StorageClient
+from PIL import Image
+
+PORT = 8012
+JOBS = 48
+IMAGE_SIZE = (2000, 1500)
+ASPECT_RESOLUTION = 1080
+
+
+def _get_image() -> bytes:
+    gradient = Image.radial_gradient('L').resize(IMAGE_SIZE)
+    noise = Image.effect_noise(IMAGE_SIZE, 32)
+    image = Image.merge('RGB', (gradient, noise, gradient))
+    image_bytes = BytesIO()
+    image.save(image_bytes, 'jpeg')
+    return image_bytes.getvalue()
+
+
+def _get_processes_counts() -> List[int]:
+    cpu_count = os.cpu_count() or 1
+    res = [1]
+    while res[-1] * 2 <= cpu_count:
+        res.append(res[-1] * 2)
+    if res[-1] != cpu_count:
+        res.append(cpu_count)
+    return res
+
+
+def main() -> None:
+    image_cutting_settings.aspect_resolution = ASPECT_RESOLUTION
+    post = QueuedPost(image=_get_image(), description='benchmark')
+    with postgres_database(), storage_server(PORT):
+        storage_client.client = StorageClient({'0': f'http://127.0.0.1:{PORT}'})
+        with create_session() as session:
+            session.add(User(username='benchmark'))
+        batch_sizes = [1, worker_settings.worker_batch_size]
+        for processes in _get_processes_counts():
+            with WorkerPool(processes) as pool:
+                # первая задача каждого процесса не учитывается
+                for future in [pool.submit([(1, post)]) for _ in range(processes)]:
+                    future.result()
+                for batch_size in batch_sizes:
+                    batch = [(1, post)] * batch_size
+                    start = time.perf_counter()
+                    futures = [pool.submit(batch) for _ in range(JOBS // batch_size)]
+                    for future in futures:
+                        assert all(result.post_id for result in future.result())
+                    elapsed = time.perf_counter() - start
+                    print(
+                        f'processes {processes:>3}  batch {batch_size:>3}  '
+                        f'{JOBS / elapsed:7.2f} jobs/sec'
+                    )
+
+
+if __name__ == '__main__':
+    main()
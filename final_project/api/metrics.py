@@ -0,0 +1,21 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter
+from final_project import storage_client
+from final_project.image_cache import image_cache
+from final_project.metrics import metrics
+
+router = APIRouter()
+
+
+@router.get('/')
+async def get_metrics() -> Dict[str, Any]:
+    '''
+    Возвращает метрики процесса, состояние пула соединений с хранилищем
+    и кэша изображений
+    '''
+    return {
+        **metrics.snapshot(),
+        'storage_pool': storage_client.client.get_stats(),
+        'image_cache': image_cache.get_stats(),
+    }
@@ -1,7 +1,8 @@
 from http import HTTPStatus
-from typing import List
+from typing import List, Optional
 
 from fastapi import APIRouter, Depends
+from final_project.api.utils import check_variant
 from final_project.data_access_layer.auth import check_authorization
 from final_project.data_access_layer.post import PostDAL
 from final_project.models import OutUser, PostWithImage
@@ -20,11 +21,13 @@ class CommonPathParams:
 )
 async def get_post(
     commons: CommonPathParams = Depends(CommonPathParams),
+    variant: Optional[str] = None,
 ) -> PostWithImage:
     '''
-    Возвращает запись
+    Возвращает запись с изображением в варианте variant
     '''
-    return await PostDAL.get_post(post_id=commons.post_id)
+    check_variant(variant)
+    return await PostDAL.get_post(post_id=commons.post_id, variant=variant)
 
 
 @router.post(
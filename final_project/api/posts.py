@@ -1,20 +1,48 @@
 from http import HTTPStatus
-from typing import List, Union
+from typing import List, Optional, Union
 
 from fastapi import APIRouter, Depends
-from final_project.api.utils import check_user
+from final_project.api.utils import check_user, check_variant, set_missing_posts_header
 from final_project.data_access_layer.auth import check_authorization
 from final_project.data_access_layer.posts import PostsDAL
 from final_project.database.models import User
-from final_project.models import InPost, PostWithImage, TaskResponse
-from starlette.responses import JSONResponse
+from final_project.models import (
+    InPost,
+    PostWithImage,
+    PostWithImagePath,
+    TaskResponse,
+)
+from starlette.responses import JSONResponse, Response
 
 router = APIRouter()
 
+POSTS_PAGE_SIZE = 20
+
 
-@router.get('/', response_model=List[PostWithImage])
-async def get_posts(user_id: int) -> List[PostWithImage]:
-    return await PostsDAL.get_posts(user_id)
+@router.get(
+    '/',
+    response_model=Union[List[PostWithImage], List[PostWithImagePath]],  # type: ignore
+)
+async def get_posts(  # pylint: disable=too-many-arguments
+    user_id: int,
+    response: Response,
+    page: int = 1,
+    size: int = POSTS_PAGE_SIZE,
+    with_images: bool = True,
+    variant: Optional[str] = None,
+) -> Union[List[PostWithImage], List[PostWithImagePath]]:
+    '''
+    Возвращает страницу постов пользователя с изображениями в варианте variant.
+    С with_images=false вместо изображений отдаются пути к ним,
+    хранилище не запрашивается. Посты, изображения которых не нашлись,
+    перечислены в заголовке X-Missing-Posts
+    '''
+    check_variant(variant)
+    if with_images:
+        posts_page = await PostsDAL.get_posts(user_id, page, size, variant)
+        set_missing_posts_header(response, posts_page.missing_posts_ids)
+        return posts_page.posts
+    return await PostsDAL.get_posts_with_paths(user_id, page, size)
 
 
 @router.post(
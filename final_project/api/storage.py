@@ -1,39 +1,220 @@
+from email.utils import parsedate
 from http import HTTPStatus
-from io import BytesIO
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Tuple, Union
 
 import uvicorn
 from fastapi import FastAPI
+from final_project.config import StorageBackend, image_storage_settings
 from final_project.data_access_layer.storage import (
-    get_all_user_images,
+    delete_image,
     get_image,
-    save_image,
+    get_image_file,
+    get_images,
+    get_segment_store,
+    read_image,
+    read_images,
+    save_image_bytes,
+)
+from final_project.exceptions import DALError
+from final_project.image_formats import (
+    HEADER_SIZE,
+    detect_format,
+    get_media_type,
+    negotiate_format,
+    transcode_image,
+)
+from final_project.io_executor import io_executor
+from final_project.messages import Message
+from final_project.models import (
+    CompactionResult,
+    ImageIn,
+    ImagePath,
+    ImagePaths,
+    ImagesBatch,
+    ImageWithPath,
+    SavedImage,
+)
+from final_project.storage_transport import (
+    MULTIPART_MIXED,
+    OCTET_STREAM,
+    USER_ID_HEADER,
+    decode_multipart,
+    encode_multipart,
 )
-from final_project.models import ImageIn, ImageWithPath
 from final_project.utils import decode_base64_to_bytes
-from PIL.Image import open as open_image
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+
+# пути изображений уникальны, содержимое по пути не меняется
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
 
 app = FastAPI()
+app.add_event_handler('shutdown', io_executor.shutdown)
 
 
 @app.get('/images', response_model=ImageWithPath)
 async def get_image_from_storage(image_path: str) -> ImageWithPath:
-    image = get_image(Path(image_path))
+    image = await io_executor.run(get_image, Path(image_path))
     return ImageWithPath(image=image, path=image_path)
 
 
-@app.get('/user-images/{user_id}', response_model=List[ImageWithPath])
-async def get_user_images(user_id: int) -> List[ImageWithPath]:
-    return get_all_user_images(user_id)
+def _is_not_modified(request: Request, response: Response) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        etags = {etag.strip(' "') for etag in if_none_match.split(',')}
+        return '*' in etags or response.headers['etag'] in etags
+    if_modified_since = parsedate(request.headers.get('if-modified-since', ''))
+    last_modified = parsedate(response.headers.get('last-modified', ''))
+    if if_modified_since is None or last_modified is None:
+        return False
+    return if_modified_since >= last_modified
+
+
+def _read_header(path: Path) -> bytes:
+    with path.open('rb') as f:
+        return f.read(HEADER_SIZE)
+
+
+def _get_raw_image_response(path: Path, accept: str) -> Response:
+    '''
+    Файл изображения отдается потоком с диска, не загружаясь в память целиком,
+    а изображение из сегмента - срезом его отображения в память.
+    Если клиент не принимает формат изображения, оно перекодируется
+    '''
+    image = b''
+    if image_storage_settings.backend == StorageBackend.SEGMENTS:
+        image = read_image(path)
+        stored_format = detect_format(image[:HEADER_SIZE])
+    else:
+        path = get_image_file(path)
+        stored_format = detect_format(_read_header(path))
+    image_format = negotiate_format(accept, stored_format)
+    media_type = OCTET_STREAM if image_format is None else get_media_type(image_format)
+    headers = {'Cache-Control': IMMUTABLE_CACHE_CONTROL, 'Vary': 'Accept'}
+    if image_format is not None and image_format != stored_format:
+        image = transcode_image(image or path.read_bytes(), image_format)
+        headers['ETag'] = f'{path.name}.{image_format.value}'
+        return Response(image, media_type=media_type, headers=headers)
+    if image_storage_settings.backend == StorageBackend.SEGMENTS:
+        headers['ETag'] = path.name
+        return Response(image, media_type=media_type, headers=headers)
+    return FileResponse(
+        str(path), media_type=media_type, headers=headers, stat_result=path.stat()
+    )
+
+
+@app.get('/images/raw')
+async def get_raw_image_from_storage(image_path: str, request: Request) -> Response:
+    '''
+    Отдает изображение байтами, в формате из заголовка Accept, если он в нем указан.
+    На условный запрос по ETag или Last-Modified отвечает 304
+    '''
+    response = await io_executor.run(
+        _get_raw_image_response, Path(image_path), request.headers.get('accept', '')
+    )
+    if _is_not_modified(request, response):
+        return NotModifiedResponse(response.headers)
+    return response
+
+
+@app.post('/images/batch', response_model=ImagesBatch)
+async def get_images_from_storage(
+    paths: ImagePaths, request: Request
+) -> Union[Response, ImagesBatch]:
+    '''
+    Если клиент принимает multipart/mixed, изображения отдаются байтами,
+    иначе - в json в base64
+    '''
+    if MULTIPART_MIXED in request.headers.get('accept', ''):
+        batch = await io_executor.run(read_images, paths.paths)
+        body, content_type = encode_multipart(batch)
+        return Response(body, headers={'Content-Type': content_type})
+    return await io_executor.run(get_images, paths.paths)
+
+
+def _save_base64_image(image: ImageIn) -> Path:
+    return save_image_bytes(image.user_id, decode_base64_to_bytes(image.image))
 
 
 @app.post('/images', response_model=ImageWithPath, status_code=HTTPStatus.CREATED.value)
 async def add_image(image: ImageIn) -> ImageWithPath:
-    pillow_image = open_image(BytesIO(decode_base64_to_bytes(image.image)))
-    path = save_image(image.user_id, pillow_image)
+    path = await io_executor.run(_save_base64_image, image)
     return ImageWithPath(path=str(path), image=image.image)
 
 
+@app.post('/images/raw', response_model=ImagePath, status_code=HTTPStatus.CREATED.value)
+async def add_raw_image(user_id: int, request: Request) -> ImagePath:
+    '''
+    Сохраняет изображение, переданное в теле запроса как application/octet-stream
+    '''
+    path = await io_executor.run(save_image_bytes, user_id, await request.body())
+    return ImagePath(path=str(path))
+
+
+def _get_upload(part: Tuple[Dict[str, str], bytes]) -> Tuple[int, bytes]:
+    headers, image = part
+    try:
+        return int(headers[USER_ID_HEADER.lower()]), image
+    except (KeyError, ValueError):
+        raise DALError(
+            HTTPStatus.BAD_REQUEST.value, Message.INVALID_MULTIPART_BODY.value
+        )
+
+
+def _save_images_bytes(uploads: List[Tuple[int, bytes]]) -> List[SavedImage]:
+    res = []
+    for user_id, image in uploads:
+        try:
+            res.append(SavedImage(path=str(save_image_bytes(user_id, image))))
+        except DALError as e:
+            res.append(SavedImage(error=e.detail))
+    return res
+
+
+@app.post(
+    '/images/raw/batch',
+    response_model=List[SavedImage],
+    status_code=HTTPStatus.CREATED.value,
+)
+async def add_raw_images(request: Request) -> List[SavedImage]:
+    '''
+    Сохраняет изображения разных пользователей, переданные частями multipart/mixed
+    с id пользователя в заголовке X-User-Id. Ошибка сохранения одного изображения
+    не прерывает сохранение остальных
+    :return: путь или ошибку для каждого изображения в порядке частей
+    '''
+    try:
+        parts = decode_multipart(
+            await request.body(), request.headers.get('content-type', '')
+        )
+    except ValueError:
+        raise DALError(
+            HTTPStatus.BAD_REQUEST.value, Message.INVALID_MULTIPART_BODY.value
+        )
+    uploads = [_get_upload(part) for part in parts]
+    return await io_executor.run(_save_images_bytes, uploads)
+
+
+@app.delete('/images', status_code=HTTPStatus.NO_CONTENT.value)
+async def remove_image(image_path: str) -> Response:
+    await io_executor.run(delete_image, Path(image_path))
+    return Response(status_code=HTTPStatus.NO_CONTENT.value)
+
+
+@app.post('/segments/compaction', response_model=CompactionResult)
+async def compact_segments() -> CompactionResult:
+    '''
+    Освобождает место изображений, удаленных из сегментов
+    '''
+    if image_storage_settings.backend != StorageBackend.SEGMENTS:
+        raise DALError(
+            HTTPStatus.BAD_REQUEST.value, Message.SEGMENTS_BACKEND_IS_NOT_USED.value
+        )
+    reclaimed = await io_executor.run(get_segment_store().compact)
+    return CompactionResult(reclaimed=reclaimed)
+
+
 if __name__ == '__main__':
     uvicorn.run(app)
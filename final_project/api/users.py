@@ -1,8 +1,13 @@
 from http import HTTPStatus
-from typing import Any, List, Union
+from typing import Any, List, Optional, Union
 
 from fastapi import APIRouter, Depends
-from final_project.api.utils import check_user
+from final_project.api.utils import (
+    FeedPagination,
+    check_user,
+    check_variant,
+    set_missing_posts_header,
+)
 from final_project.data_access_layer.auth import check_authorization
 from final_project.data_access_layer.users import UsersDataAccessLayer
 from final_project.models import (
@@ -13,10 +18,12 @@ from final_project.models import (
     UserId,
     UserInDetailOut,
 )
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response
 
 router = APIRouter()
 
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
 
 @router.post(
     '/',
@@ -86,9 +93,30 @@ async def get_user_by_id(user_id: int) -> Any:
     return await UsersDataAccessLayer.get_user_by_id(user_id)
 
 
-@router.get('{user_id}/feed', response_model=List[PostWithImage])
+@router.get('/{user_id}/feed', response_model=List[PostWithImage])
 async def get_feed(
-    user_id: int, page: int, size: int, user: OutUser = Depends(check_authorization)
+    user_id: int,
+    response: Response,
+    pagination: FeedPagination = Depends(),
+    variant: Optional[str] = None,
+    user: OutUser = Depends(check_authorization),
 ) -> Any:
+    '''
+    Возвращает ленту с изображениями в варианте variant, по умолчанию - full.
+    Без page лента листается курсором: курсор следующей
+    страницы приходит в заголовке X-Next-Cursor.
+    Посты, изображения которых не нашлись, перечислены в заголовке X-Missing-Posts
+    '''
     check_user(user_id, user.id)
-    return await UsersDataAccessLayer.get_feed(user_id=user_id, page=page, size=size)
+    check_variant(variant)
+    feed_page = await UsersDataAccessLayer.get_feed(
+        user_id=user_id,
+        page=pagination.page,
+        size=pagination.size,
+        cursor=pagination.cursor,
+        variant=variant,
+    )
+    if feed_page.next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = feed_page.next_cursor
+    set_missing_posts_header(response, feed_page.missing_posts_ids)
+    return feed_page.posts
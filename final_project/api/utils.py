@@ -1,8 +1,43 @@
 from http import HTTPStatus
+from typing import List, Optional
 
 from fastapi import HTTPException
+from final_project.config import image_cutting_settings
+from final_project.messages import Message
+from final_project.utils import FULL_VARIANT
+from starlette.responses import Response
+
+MISSING_POSTS_HEADER = 'X-Missing-Posts'
 
 
 def check_user(user_id_expected: int, user_id_actual: int) -> None:
     if user_id_expected != user_id_actual:
         raise HTTPException(HTTPStatus.FORBIDDEN.value)
+
+
+def check_variant(variant: Optional[str]) -> None:
+    if variant not in (None, FULL_VARIANT, *image_cutting_settings.variants):
+        raise HTTPException(
+            HTTPStatus.BAD_REQUEST.value, Message.UNKNOWN_IMAGE_VARIANT.value
+        )
+
+
+def set_missing_posts_header(response: Response, posts_ids: List[int]) -> None:
+    '''
+    Перечисляет в заголовке посты страницы, которые отданы без изображений
+    '''
+    if posts_ids:
+        response.headers[MISSING_POSTS_HEADER] = ','.join(map(str, posts_ids))
+
+
+class FeedPagination:
+    '''
+    Параметры страницы ленты: по номеру page или, без него, по курсору cursor
+    '''
+
+    def __init__(
+        self, size: int, page: Optional[int] = None, cursor: Optional[str] = None
+    ) -> None:
+        self.size = size
+        self.page = page
+        self.cursor = cursor
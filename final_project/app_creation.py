@@ -1,7 +1,8 @@
 from http import HTTPStatus
 
 from fastapi import FastAPI
-from final_project.api import auth, post, posts, users
+from final_project import storage_client
+from final_project.api import auth, metrics, post, posts, users
 from final_project.models import ErrorMessage
 
 
@@ -38,4 +39,7 @@ def get_app() -> FastAPI:
         tags=['auth'],
         responses={HTTPStatus.UNAUTHORIZED.value: {'model': ErrorMessage}},
     )
+    _app.include_router(metrics.router, prefix='/metrics', tags=['metrics'])
+    _app.add_event_handler('startup', storage_client.client.open)
+    _app.add_event_handler('shutdown', storage_client.client.close)
     return _app
@@ -1,4 +1,6 @@
 import logging
+from enum import Enum
+from typing import Dict, Optional
 
 from pydantic import BaseSettings
 
@@ -18,22 +20,115 @@ class AppSettings(BaseSettings):
     name = 'todo'
 
 
+class StorageBackend(str, Enum):
+    # файл с uuid-именем на каждую загрузку
+    FILES = 'files'
+    # файл на каждое уникальное содержимое
+    CONTENT_ADDRESSED = 'content_addressed'
+    # изображения дописываются в большие файлы-сегменты
+    SEGMENTS = 'segments'
+
+
+class ImageFormat(str, Enum):
+    PNG = 'png'
+    WEBP = 'webp'
+    # сохраняется прогрессивным
+    JPEG = 'jpeg'
+
+
 class ImageStorageSettings(BaseSettings):
     items_in_one_folder = 1000
     storage_folder_name = 'image-storage'
     address: str = 'storage'
     port: int = 8001
-    image_format: str = 'png'
+    # id шарда -> host:port его узла, без узлов хранилище - один узел address:port.
+    # Изображения, сохраненные до шардирования, остаются в шарде '0'
+    nodes: Dict[str, str] = {}
+    # точек каждого шарда на кольце консистентного хеширования
+    virtual_nodes = 100
+    # копий изображения на разных шардах и сколько из них должны сохраниться
+    replication_factor = 1
+    write_quorum = 1
+    # после кворума остальные реплики ждут не дольше write_grace_ms,
+    # опоздавшие реплики удаляются, их восстанавливает rebalance
+    write_grace_ms = 50
+    # второй запрос к другой реплике отправляется, если первая не ответила
+    # за hedge_percentile задержек последних hedge_window запросов
+    hedge_percentile = 0.95
+    hedge_window = 1000
+    # задержка до второго запроса, пока запросов для перцентиля мало
+    hedge_delay_ms = 50
+    image_format: ImageFormat = ImageFormat.PNG
+    # качество сжатия webp и jpeg от 1 до 100, png сжимается без потерь
+    image_quality = 85
+    backend: StorageBackend = StorageBackend.FILES
+    segment_max_size_mb = 64
+    # потоки хранилища для работы с диском и Pillow
+    io_threads = 8
+    # пул соединений клиента хранилища
+    connections_limit = 100
+    connections_limit_per_host = 30
+    keepalive_timeout = 30
+    # секунд на ответ узла синхронному клиенту воркера и скриптов
+    request_timeout = 10
+    # секунд на ответ узла асинхронному клиенту API
+    fetch_timeout = 5
+    compaction_timeout = 600
+
+
+class ImageCacheSettings(BaseSettings):
+    # 0 отключает кэш изображений в API
+    image_cache_max_size_mb = 128
 
 
 class ImageCuttingSettings(BaseSettings):
-    aspect_resolution = 10
+    # сторона полного изображения, варианта full
+    aspect_resolution = 1080
+    # вариант изображения -> сторона в пикселях. Варианты строятся из исходного
+    # квадрата и сохраняются вместе с изображением aspect_resolution. Варианты
+    # не меньше aspect_resolution или стороны исходного квадрата пропускаются
+    variants: Dict[str, int] = {'thumbnail': 150, 'feed': 640}
+    # качество вариантов, сохраняемых не с image_quality хранилища
+    variants_quality: Dict[str, int] = {'thumbnail': 75}
+
+
+class WorkerSettings(BaseSettings):
+    # процессов обработки изображений, по умолчанию - по числу ядер
+    worker_processes: Optional[int] = None
+    # сколько задач на процесс забирается из очереди заранее
+    worker_prefetch = 2
+    # сколько секунд супервизор ждет задачу в пустой очереди
+    worker_dequeue_timeout = 5
+    # после скольких задач перезапускается процесс воркера без fork, 0 - никогда
+    worker_max_jobs = 1000
+    # сколько задач обрабатывается одной пачкой, 1 - по одной
+    worker_batch_size = 16
+    # сколько миллисекунд пачка дозаполняется задачами из очереди
+    worker_batch_wait_ms = 50
+    # сколько секунд хранится проваленная задача rq, вместе с изображением
+    worker_failure_ttl = 24 * 60 * 60
 
 
 class RedisSettings(BaseSettings):
     redis_address = 'redis'
 
 
+class FeedMode(str, Enum):
+    QUERY = 'query'
+    TIMELINE = 'timeline'
+    MERGE = 'merge'
+
+
+class FeedSettings(BaseSettings):
+    feed_mode: FeedMode = FeedMode.QUERY
+    timeline_max_size = 1000
+    # посты авторов с большим числом подписчиков не раскладываются по таймлайнам,
+    # а подмешиваются в ленту при чтении
+    fan_out_followers_threshold = 10000
+    # сколько постов одного автора подгружается за раз в режиме merge
+    merge_prefetch = 10
+
+
 class DataBaseSettings(BaseSettings):
     server_name = 'db'
     user = 'evgeny'
@@ -43,7 +138,10 @@ class DataBaseSettings(BaseSettings):
 
 db_settings = DataBaseSettings()
 redis_settings = RedisSettings()
+worker_settings = WorkerSettings()
+feed_settings = FeedSettings()
 image_cutting_settings = ImageCuttingSettings()
+image_cache_settings = ImageCacheSettings()
 image_storage_settings = ImageStorageSettings()
 app_settings = AppSettings()
 tokens_settings = TokensSettings()
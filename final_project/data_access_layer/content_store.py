@@ -0,0 +1,68 @@
+import hashlib
+import os
+from pathlib import Path
+from threading import Lock
+
+# счетчик ссылок хранится рядом с изображением в файле с этим суффиксом
+REFS_SUFFIX = '.refs'
+
+
+class ContentStore:
+    '''
+    Хранит изображения по sha256 их содержимого: одинаковые загрузки
+    попадают в один файл, а число загрузок учитывается счетчиком ссылок
+    '''
+
+    def __init__(self, root: Path, suffix: str) -> None:
+        self._root = root
+        self._suffix = suffix
+        self._lock = Lock()
+
+    def get_path(self, digest: str) -> Path:
+        return self._root / digest[:2] / digest[2:4] / f'{digest}{self._suffix}'
+
+    @staticmethod
+    def _get_refs_path(path: Path) -> Path:
+        return path.with_suffix(REFS_SUFFIX)
+
+    @staticmethod
+    def get_refs(path: Path) -> int:
+        refs_path = ContentStore._get_refs_path(path)
+        if not refs_path.exists():
+            return 0
+        return int(refs_path.read_text())
+
+    @staticmethod
+    def _write_atomically(path: Path, data: bytes) -> None:
+        tmp_path = path.with_name(f'{path.name}.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def add(self, image_bytes: bytes) -> Path:
+        '''
+        :return: путь к изображению, одинаковый для одинакового содержимого
+        '''
+        path = self.get_path(hashlib.sha256(image_bytes).hexdigest())
+        with self._lock:
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                self._write_atomically(path, image_bytes)
+            refs = self.get_refs(path) + 1
+            self._write_atomically(self._get_refs_path(path), str(refs).encode())
+        return path
+
+    def release(self, path: Path) -> None:
+        '''
+        Уменьшает счетчик ссылок, файл удаляется вместе с последней ссылкой
+        '''
+        with self._lock:
+            refs = self.get_refs(path) - 1
+            if refs > 0:
+                self._write_atomically(self._get_refs_path(path), str(refs).encode())
+                return
+            path.unlink()
+            # у файла, записанного не этим хранилищем, счетчика ссылок нет
+            try:
+                self._get_refs_path(path).unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,128 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from final_project.database.models import Comment, Post, user_subsriptions
+from final_project.exceptions import PaginationError
+from final_project.messages import Message
+from final_project.utils import get_offset
+from sqlalchemy.orm import Query, Session
+
+PostKey = Tuple[datetime, int]
+
+
+def _get_subscriptions_ids(user_id: int) -> sa.sql.Select:
+    return sa.select([user_subsriptions.c.followed_id]).where(
+        user_subsriptions.c.follower_id == user_id
+    )
+
+
+def get_feed_criterion(user_id: int) -> sa.sql.ClauseElement:
+    return sa.or_(
+        Post.user_id == user_id, Post.user_id.in_(_get_subscriptions_ids(user_id))
+    )
+
+
+class KeysetFeed:
+    '''
+    Лента, которая листается курсором - ключом (created_at, id) последнего поста
+    предыдущей страницы. Посты после курсора выбирает наследник
+    '''
+
+    @classmethod
+    def get_page_after(
+        cls, user_id: int, cursor: Optional[PostKey], size: int, session: Session
+    ) -> List[Post]:
+        '''
+        Возвращает size постов ленты, созданных после поста из cursor
+        :raises PaginationError если size невалиден
+        '''
+        if size < 1:
+            raise PaginationError(Message.INVALID_PAGINATION_PARAMS.value)
+        return cls._get_posts_after(user_id, cursor, size, session)
+
+    @staticmethod
+    def _get_posts_after(
+        user_id: int, cursor: Optional[PostKey], size: int, session: Session
+    ) -> List[Post]:
+        raise NotImplementedError
+
+
+class FeedDAL(KeysetFeed):
+    @staticmethod
+    def get_feed_query(user_id: int, session: Session) -> Query:
+        '''
+        Посты пользователя и всех его подписок, отсортированные по времени создания.
+        Связи, нужные для сериализации, подгружаются пачкой, а не по одной на пост
+        '''
+        return FeedDAL.get_feed_options(
+            session.query(Post)
+            .filter(get_feed_criterion(user_id))
+            .order_by(Post.created_at, Post.id)
+        )
+
+    @staticmethod
+    def get_feed_options(query: Query) -> Query:
+        return query.options(
+            so.joinedload(Post.user),
+            so.selectinload(Post.likes),
+            so.selectinload(Post.marked_users),
+            so.selectinload(Post.comments).joinedload(Comment.user),
+            so.selectinload(Post.comments).selectinload(Comment.likes),
+        )
+
+    @staticmethod
+    def get_page(user_id: int, page: int, size: int, session: Session) -> List[Post]:
+        '''
+        Возвращает одну страницу ленты, не загружая остальные посты
+        :raises PaginationError если параметры невалидны или страница за концом ленты
+        '''
+        offset = get_offset(page, size)
+        query = FeedDAL.get_feed_query(user_id, session)
+        posts: List[Post] = query.offset(offset).limit(size).all()
+        if not posts and offset and FeedDAL.is_feed_not_empty(user_id, session):
+            raise PaginationError(Message.INVALID_PAGINATION_PARAMS.value)
+        return posts
+
+    @staticmethod
+    def get_posts_by_ids(ids: List[int], session: Session) -> List[Post]:
+        '''
+        Загружает посты одним запросом и возвращает их в порядке ids
+        '''
+        if not ids:
+            return []
+        posts = FeedDAL.get_feed_options(session.query(Post)).filter(Post.id.in_(ids))
+        posts_by_id = {post.id: post for post in posts}
+        return [posts_by_id[id_] for id_ in ids if id_ in posts_by_id]
+
+    @staticmethod
+    def _get_posts_after(
+        user_id: int, cursor: Optional[PostKey], size: int, session: Session
+    ) -> List[Post]:
+        '''
+        Страница выбирается по диапазону индекса, без OFFSET
+        '''
+        query = FeedDAL.get_feed_query(user_id, session)
+        if cursor:
+            query = query.filter(sa.tuple_(Post.created_at, Post.id) > cursor)
+        return query.limit(size).all()
+
+    @staticmethod
+    def get_authors_posts_after(
+        authors_ids: List[int], cursor: Optional[PostKey], count: int, session: Session,
+    ) -> List[Tuple[datetime, int]]:
+        '''
+        :return: время создания и id первых count постов авторов после cursor
+        '''
+        query = session.query(Post.created_at, Post.id).filter(
+            Post.user_id.in_(authors_ids)
+        )
+        if cursor:
+            query = query.filter(sa.tuple_(Post.created_at, Post.id) > cursor)
+        return query.order_by(Post.created_at, Post.id).limit(count).all()
+
+    @staticmethod
+    def is_feed_not_empty(user_id: int, session: Session) -> bool:
+        query = session.query(Post.id).filter(get_feed_criterion(user_id))
+        return bool(session.query(query.exists()).scalar())
@@ -0,0 +1,84 @@
+import heapq
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import sqlalchemy as sa
+from final_project.config import feed_settings
+from final_project.data_access_layer.feed import FeedDAL, KeysetFeed, PostKey
+from final_project.database.models import Post, user_subsriptions
+from final_project.exceptions import PaginationError
+from final_project.messages import Message
+from final_project.utils import get_offset
+from sqlalchemy.orm import Session
+
+
+def merge_streams(
+    streams: Sequence[Iterable[PostKey]], offset: int, count: int
+) -> List[PostKey]:
+    '''
+    Сливает отсортированные потоки кучей и читает из них ровно столько,
+    сколько нужно для count элементов после offset
+    '''
+    return list(islice(heapq.merge(*streams), offset, offset + count))
+
+
+def _get_author_posts(
+    author_id: int, after: Optional[PostKey], prefetch: int, session: Session
+) -> Iterator[PostKey]:
+    '''
+    Посты автора по времени создания, подгружаемые окнами по prefetch штук
+    '''
+    while True:
+        query = session.query(Post.created_at, Post.id).filter(
+            Post.user_id == author_id
+        )
+        if after:
+            query = query.filter(sa.tuple_(Post.created_at, Post.id) > after)
+        window: List[PostKey] = (
+            query.order_by(Post.created_at, Post.id).limit(prefetch).all()
+        )
+        yield from window
+        if len(window) < prefetch:
+            return
+        after = window[-1]
+
+
+class MergeFeedDAL(KeysetFeed):
+    '''
+    Лента как ленивое слияние потоков постов пользователя и каждой его подписки.
+    В памяти одновременно не больше prefetch постов на автора
+    '''
+
+    @staticmethod
+    def _get_streams(
+        user_id: int, after: Optional[PostKey], session: Session
+    ) -> List[Iterator[PostKey]]:
+        subscriptions = session.query(user_subsriptions.c.followed_id).filter(
+            user_subsriptions.c.follower_id == user_id
+        )
+        authors_ids = [user_id, *(author_id for author_id, in subscriptions)]
+        prefetch = feed_settings.merge_prefetch
+        return [
+            _get_author_posts(author_id, after, prefetch, session)
+            for author_id in authors_ids
+        ]
+
+    @staticmethod
+    def _get_posts(keys: List[PostKey], session: Session) -> List[Post]:
+        return FeedDAL.get_posts_by_ids([post_id for _, post_id in keys], session)
+
+    @staticmethod
+    def get_page(user_id: int, page: int, size: int, session: Session) -> List[Post]:
+        offset = get_offset(page, size)
+        streams = MergeFeedDAL._get_streams(user_id, None, session)
+        keys = merge_streams(streams, offset, size)
+        if not keys and offset and FeedDAL.is_feed_not_empty(user_id, session):
+            raise PaginationError(Message.INVALID_PAGINATION_PARAMS.value)
+        return MergeFeedDAL._get_posts(keys, session)
+
+    @staticmethod
+    def _get_posts_after(
+        user_id: int, cursor: Optional[PostKey], size: int, session: Session
+    ) -> List[Post]:
+        streams = MergeFeedDAL._get_streams(user_id, cursor, session)
+        return MergeFeedDAL._get_posts(merge_streams(streams, 0, size), session)
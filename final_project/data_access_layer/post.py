@@ -1,31 +1,46 @@
 from http import HTTPStatus
-from typing import Awaitable, List
+from typing import Awaitable, List, Optional
 
-from final_project import storage_client
+from final_project import storage_batch
 from final_project.data_access_layer.serialization import serialize
 from final_project.database.database import create_session, run_in_threadpool
 from final_project.database.models import Post as DBPost
 from final_project.database.models import User
 from final_project.exceptions import DALError, StorageError
 from final_project.messages import Message
-from final_project.models import Base64, OutUser, Post, PostWithImage
+from final_project.models import OutUser, Post, PostWithImage, RawImagesBatch
+from final_project.single_flight import SingleFlight
+from final_project.utils import encode_bytes_to_base64, get_variant_path
 from sqlalchemy.orm import Session
 
+post_flight: SingleFlight[PostWithImage] = SingleFlight('post_lookup')
+
 
 class PostDAL:
     @staticmethod
-    async def get_post(post_id: int) -> PostWithImage:
+    async def get_post(post_id: int, variant: Optional[str] = None) -> PostWithImage:
+        '''
+        Одновременные запросы одного поста выполняются одной загрузкой
+        '''
+        return await post_flight.do(
+            (post_id, variant), lambda: PostDAL._load_post(post_id, variant)
+        )
+
+    @staticmethod
+    async def _load_post(post_id: int, variant: Optional[str]) -> PostWithImage:
         with create_session() as session:
             post = await PostDAL._get_post(post_id, session)
+            path = get_variant_path(post, variant)
             try:
-                image: Base64 = (
-                    await storage_client.get_image_from_storage_async(post.image_path)
-                ).image
+                batch = await storage_batch.get_images_batch([path])
             except StorageError:
+                batch = RawImagesBatch()
+            if path not in batch.images:
                 raise DALError(
                     HTTPStatus.NOT_FOUND.value,
                     Message.IMAGE_DOES_NOT_EXISTS_ON_STORAGE.value,
                 )
+            image = encode_bytes_to_base64(batch.images[path])
             serialized_post: Post = serialize(post)  # type: ignore
         return PostWithImage(**serialized_post.dict(), image=image)
 
@@ -1,24 +1,35 @@
+from binascii import Error
 from http import HTTPStatus
-from typing import List, Optional
+from typing import Awaitable, List, Optional
 from uuid import uuid4
 
-from final_project import storage_client
+from final_project import storage_batch
+from final_project.config import worker_settings
+from final_project.data_access_layer.feed import FeedDAL
 from final_project.data_access_layer.users import UsersDataAccessLayer
-from final_project.database.database import create_session
-from final_project.database.models import User
-from final_project.exceptions import DALError, StorageError
+from final_project.database.database import create_session, run_in_threadpool
+from final_project.database.models import Post, User
+from final_project.exceptions import DALError, PaginationError, StorageError
 from final_project.image_processor.worker import process_image
 from final_project.messages import Message
 from final_project.models import (
-    ImageWithPath,
+    ImagePath,
     InPost,
-    PostWithImage,
+    PostsPage,
+    PostWithImagePath,
+    QueuedPost,
     TaskResponse,
     WorkerResult,
 )
 from final_project.redis import RedisInstances
 from final_project.redis_keys import RedisKey
-from final_project.utils import join_posts_with_images
+from final_project.utils import (
+    decode_base64_to_bytes,
+    get_offset,
+    get_variant_path,
+    join_posts_with_images,
+)
+from sqlalchemy.orm import Session
 
 
 class PostsDAL:
@@ -36,9 +47,20 @@ class PostsDAL:
             raise DALError(
                 HTTPStatus.BAD_REQUEST.value, Message.INCORRECTLY_MARKED_USERS.value
             )
+        try:
+            image = decode_base64_to_bytes(post.image)
+        except Error:
+            raise DALError(
+                HTTPStatus.BAD_REQUEST.value, Message.INVALID_BASE64_PADDING.value
+            )
+        queued_post = QueuedPost(**post.dict(exclude={'image'}), image=image)
         task_id = str(uuid4())
         job = RedisInstances.redis_queue().enqueue(
-            process_image, user_id, post, task_id
+            process_image,
+            user_id,
+            queued_post,
+            task_id,
+            failure_ttl=worker_settings.worker_failure_ttl,
         )
         async_redis = await RedisInstances.async_redis()
         async_redis.sadd(RedisKey.TASKS_IN_PROGRESS.value, task_id)
@@ -99,22 +121,55 @@ class PostsDAL:
         raise DALError(HTTPStatus.NOT_FOUND.value, Message.TASK_NOT_EXISTS.value)
 
     @staticmethod
-    async def get_posts(user_id: int) -> List[PostWithImage]:
+    async def get_posts(
+        user_id: int, page: int, size: int, variant: Optional[str] = None
+    ) -> PostsPage:
+        '''
+        Страница постов пользователя с изображениями в варианте variant.
+        Из хранилища запрашиваются только изображения постов страницы
+        '''
+        posts = await PostsDAL.get_posts_with_paths(user_id, page, size)
+        try:
+            images = await storage_batch.get_images(
+                [ImagePath(path=get_variant_path(post, variant)) for post in posts]
+            )
+        except StorageError as e:
+            raise DALError(HTTPStatus.BAD_REQUEST.value, str(e))
+        posts_with_images, missing_ids = join_posts_with_images(posts, images, variant)
+        return PostsPage(posts=posts_with_images, missing_posts_ids=missing_ids)
+
+    @staticmethod
+    async def get_posts_with_paths(
+        user_id: int, page: int, size: int
+    ) -> List[PostWithImagePath]:
         with create_session() as session:
-            user = session.query(User).filter(User.id == user_id).first()
-            if not user:
-                raise DALError(
-                    HTTPStatus.NOT_FOUND.value, Message.USER_DOES_NOT_EXISTS.value
-                )
-            posts = user.posts
-            if not posts:
-                raise DALError(
-                    HTTPStatus.NOT_FOUND.value, Message.POSTS_DO_NOT_EXIST.value
-                )
-            try:
-                images: List[ImageWithPath] = await storage_client.get_all_user_images(
-                    user_id
-                )
-            except StorageError as e:
-                raise DALError(HTTPStatus.BAD_REQUEST.value, e)
-            return join_posts_with_images(posts, images)
+            return await PostsDAL._get_posts_page(user_id, page, size, session)
+
+    @staticmethod
+    @run_in_threadpool
+    def _get_posts_page(
+        user_id: int, page: int, size: int, session: Session
+    ) -> Awaitable[List[PostWithImagePath]]:
+        if not session.query(User.id).filter(User.id == user_id).first():
+            raise DALError(
+                HTTPStatus.NOT_FOUND.value, Message.USER_DOES_NOT_EXISTS.value
+            )
+        try:
+            offset = get_offset(page, size)
+        except PaginationError as e:
+            raise DALError(HTTPStatus.BAD_REQUEST.value, str(e))
+        query = session.query(Post).filter(Post.user_id == user_id)
+        posts = (
+            FeedDAL.get_feed_options(query)
+            .order_by(Post.created_at, Post.id)
+            .offset(offset)
+            .limit(size)
+            .all()
+        )
+        if not posts and not offset:
+            raise DALError(HTTPStatus.NOT_FOUND.value, Message.POSTS_DO_NOT_EXIST.value)
+        if not posts:
+            raise DALError(
+                HTTPStatus.BAD_REQUEST.value, Message.INVALID_PAGINATION_PARAMS.value
+            )
+        return [PostWithImagePath.from_orm(post) for post in posts]  # type: ignore
@@ -0,0 +1,163 @@
+import mmap
+import os
+import uuid
+from pathlib import Path
+from threading import Lock
+from typing import BinaryIO, Dict, List, NamedTuple, Optional
+
+INDEX_FILE_NAME = 'index'
+SEGMENT_SUFFIX = '.segment'
+# строка индекса для удаленного изображения
+TOMBSTONE = '-'
+
+
+class Entry(NamedTuple):
+    segment: int
+    offset: int
+    length: int
+
+
+class SegmentStore:
+    '''
+    Дописывает изображения в большие файлы-сегменты.
+    Смещение и длина каждого изображения хранятся в журнале index,
+    который целиком читается в память при открытии
+    '''
+
+    def __init__(self, root: Path, segment_max_size: int) -> None:
+        self._root = root
+        self._segment_max_size = segment_max_size
+        self._lock = Lock()
+        self._entries: Dict[str, Entry] = {}
+        self._dead_bytes: Dict[int, int] = {}
+        self._maps: Dict[int, mmap.mmap] = {}
+        root.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+        segments = self._get_segments()
+        self._active = segments[-1] if segments else 0
+        self._writer: BinaryIO = self._get_segment_path(self._active).open('ab')
+        self._index: BinaryIO = (root / INDEX_FILE_NAME).open('ab')
+
+    def _get_segment_path(self, segment: int) -> Path:
+        return self._root / f'{segment:06d}{SEGMENT_SUFFIX}'
+
+    def _get_segments(self) -> List[int]:
+        return sorted(int(path.stem) for path in self._root.glob(f'*{SEGMENT_SUFFIX}'))
+
+    def _load_index(self) -> None:
+        index_path = self._root / INDEX_FILE_NAME
+        if not index_path.exists():
+            return
+        for line in index_path.read_text().splitlines():
+            key, *location = line.split()
+            old = self._entries.pop(key, None)
+            if old:
+                self._add_dead_bytes(old)
+            if location != [TOMBSTONE]:
+                self._entries[key] = Entry(*map(int, location))
+
+    def _add_dead_bytes(self, entry: Entry) -> None:
+        self._dead_bytes[entry.segment] = (
+            self._dead_bytes.get(entry.segment, 0) + entry.length
+        )
+
+    def _write_index(self, line: str) -> None:
+        self._index.write(f'{line}\n'.encode())
+        self._index.flush()
+
+    def _rotate(self) -> None:
+        self._writer.close()
+        self._active += 1
+        self._writer = self._get_segment_path(self._active).open('ab')
+
+    def _append(self, key: str, data: bytes) -> None:
+        if (
+            self._writer.tell()
+            and self._writer.tell() + len(data) > self._segment_max_size
+        ):
+            self._rotate()
+        entry = Entry(self._active, self._writer.tell(), len(data))
+        self._writer.write(data)
+        self._writer.flush()
+        self._entries[key] = entry
+        self._write_index(f'{key} {entry.segment} {entry.offset} {entry.length}')
+
+    def add(self, data: bytes) -> str:
+        '''
+        :return: ключ изображения
+        '''
+        key = uuid.uuid4().hex
+        with self._lock:
+            self._append(key, data)
+        return key
+
+    def _get_map(self, entry: Entry) -> mmap.mmap:
+        segment_map = self._maps.get(entry.segment)
+        # активный сегмент растет, его отображение пересоздается при необходимости
+        if segment_map is None or len(segment_map) < entry.offset + entry.length:
+            if segment_map is not None:
+                segment_map.close()
+            with self._get_segment_path(entry.segment).open('rb') as f:
+                segment_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[entry.segment] = segment_map
+        return segment_map
+
+    def read(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return self._get_map(entry)[entry.offset : entry.offset + entry.length]
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            self._add_dead_bytes(entry)
+            self._write_index(f'{key} {TOMBSTONE}')
+            return True
+
+    def compact(self) -> int:
+        '''
+        Переписывает живые изображения из закрытых сегментов с удаленными
+        записями в активный сегмент, удаляет старые сегменты и сжимает индекс
+        :return: освобожденное место в байтах
+        '''
+        with self._lock:
+            segments = [s for s in self._dead_bytes if s != self._active]
+            reclaimed = 0
+            for segment in segments:
+                for key, entry in list(self._entries.items()):
+                    if entry.segment == segment:
+                        data = self._get_map(entry)[
+                            entry.offset : entry.offset + entry.length
+                        ]
+                        self._append(key, data)
+                segment_map = self._maps.pop(segment, None)
+                if segment_map is not None:
+                    segment_map.close()
+                reclaimed += self._dead_bytes.pop(segment)
+                try:
+                    self._get_segment_path(segment).unlink()
+                except FileNotFoundError:
+                    pass
+            self._rewrite_index()
+            return reclaimed
+
+    def _rewrite_index(self) -> None:
+        self._index.close()
+        tmp_path = self._root / f'{INDEX_FILE_NAME}.tmp'
+        with tmp_path.open('w') as f:
+            for key, entry in self._entries.items():
+                f.write(f'{key} {entry.segment} {entry.offset} {entry.length}\n')
+        os.replace(tmp_path, self._root / INDEX_FILE_NAME)
+        self._index = (self._root / INDEX_FILE_NAME).open('ab')
+
+    def close(self) -> None:
+        with self._lock:
+            for segment_map in self._maps.values():
+                segment_map.close()
+            self._maps.clear()
+            self._writer.close()
+            self._index.close()
@@ -1,14 +1,25 @@
 import uuid
+from functools import lru_cache
 from http import HTTPStatus
+from io import BytesIO
 from pathlib import Path
-from typing import List
+from typing import Dict, List, NoReturn
 
-from final_project.config import image_storage_settings
+from final_project.config import StorageBackend, image_storage_settings
+from final_project.data_access_layer.content_store import ContentStore
+from final_project.data_access_layer.segment_store import SegmentStore
 from final_project.exceptions import DALError
+from final_project.image_formats import encode_image
 from final_project.messages import Message
-from final_project.models import Base64, ImageWithPath
-from final_project.utils import encode_bytes_to_base64
+from final_project.models import Base64, ImagesBatch, ImageWithPath, RawImagesBatch
+from final_project.utils import MEGABYTE, encode_bytes_to_base64
+from PIL import UnidentifiedImageError
 from PIL.Image import Image
+from PIL.Image import open as open_image
+
+
+CONTENT_FOLDER_NAME = 'sha256'
+SEGMENTS_FOLDER_NAME = 'segments'
 
 
 def _get_project_root() -> Path:
@@ -43,7 +54,35 @@ def _get_path(user_id: int) -> Path:
     grouping_ids = _get_name_for_grouping_id(user_id)
     grouping_ids_dir = _make_dir_if_not_exists(root, grouping_ids)
     id_dir = _make_dir_if_not_exists(grouping_ids_dir, str(user_id))
-    return id_dir / f'{(uuid.uuid4())}.png'
+    return id_dir / f'{(uuid.uuid4())}.{image_storage_settings.image_format.value}'
+
+
+@lru_cache()
+def _get_content_store() -> ContentStore:
+    return ContentStore(
+        _get_project_root() / CONTENT_FOLDER_NAME,
+        f'.{image_storage_settings.image_format.value}',
+    )
+
+
+@lru_cache()
+def get_segment_store() -> SegmentStore:
+    return SegmentStore(
+        _get_project_root() / SEGMENTS_FOLDER_NAME,
+        image_storage_settings.segment_max_size_mb * MEGABYTE,
+    )
+
+
+def _write_image_bytes(user_id: int, image_bytes: bytes) -> Path:
+    backend = image_storage_settings.backend
+    if backend == StorageBackend.CONTENT_ADDRESSED:
+        return _get_content_store().add(image_bytes)
+    if backend == StorageBackend.SEGMENTS:
+        key = get_segment_store().add(image_bytes)
+        return _get_project_root() / SEGMENTS_FOLDER_NAME / key
+    path = _get_path(user_id)
+    path.write_bytes(image_bytes)
+    return path
 
 
 def save_image(user_id: int, image: Image) -> Path:
@@ -51,36 +90,94 @@ def save_image(user_id: int, image: Image) -> Path:
         Сохраняет изображение в хранилище
         :return: Путь к изображению
         '''
-    path = _get_path(user_id)
-    image.save(path, format='png')
-    return path
+    image_bytes = encode_image(
+        image, image_storage_settings.image_format, image_storage_settings.image_quality
+    )
+    return _write_image_bytes(user_id, image_bytes)
 
 
-def get_image(image_path: Path) -> Base64:
-    if not image_path.exists():
-        raise DALError(
-            HTTPStatus.NOT_FOUND.value, Message.IMAGE_DOES_NOT_EXISTS_ON_STORAGE.value
-        )
-    with image_path.open('rb') as f:
-        image_bytes = f.read()
-        return encode_bytes_to_base64(image_bytes)
-
-
-def _get_all_images_from_folder(path: Path) -> List[ImageWithPath]:
-    res = []
-    for img in path.iterdir():
-        with img.open('rb') as f:
-            res.append(
-                ImageWithPath(path=str(img), image=encode_bytes_to_base64(f.read()))
-            )
-    return res
+def _raise_image_not_found() -> NoReturn:
+    raise DALError(
+        HTTPStatus.NOT_FOUND.value, Message.IMAGE_DOES_NOT_EXISTS_ON_STORAGE.value
+    )
 
 
-def get_all_user_images(user_id: int) -> List[ImageWithPath]:
-    users_folder = _get_project_root() / _get_name_for_grouping_id(user_id)
-    user_folder = users_folder / str(user_id)
-    if not user_folder.exists():
+def delete_image(image_path: Path) -> None:
+    '''
+    Изображение из content-addressed хранилища удаляется с последней ссылкой на него,
+    место удаленных из сегментов изображений освобождает компактификация
+    '''
+    if image_storage_settings.backend == StorageBackend.SEGMENTS:
+        if not get_segment_store().delete(image_path.name):
+            _raise_image_not_found()
+        return
+    path = get_image_file(image_path)
+    if image_storage_settings.backend == StorageBackend.CONTENT_ADDRESSED:
+        _get_content_store().release(path)
+    else:
+        path.unlink()
+
+
+def save_image_bytes(user_id: int, image_bytes: bytes) -> Path:
+    '''
+    Изображение в формате хранилища записывается как есть: проверяется
+    только его заголовок. Перекодируются лишь изображения в другом формате
+    '''
+    try:
+        image = open_image(BytesIO(image_bytes))
+    except UnidentifiedImageError:
         raise DALError(
-            HTTPStatus.NOT_FOUND.value, Message.USER_DOES_NOT_HAVE_IMAGES.value
+            HTTPStatus.BAD_REQUEST.value, Message.BYTES_ARE_NOT_A_IMAGE.value
         )
-    return _get_all_images_from_folder(user_folder)
+    if (image.format or '').lower() != image_storage_settings.image_format:
+        return save_image(user_id, image)
+    return _write_image_bytes(user_id, image_bytes)
+
+
+def get_image_file(image_path: Path) -> Path:
+    '''
+    Путь из запроса не должен вести за пределы хранилища
+    '''
+    path = image_path.resolve()
+    if _get_project_root() not in path.parents or not path.is_file():
+        _raise_image_not_found()
+    return path
+
+
+def read_image(image_path: Path) -> bytes:
+    if image_storage_settings.backend == StorageBackend.SEGMENTS:
+        image = get_segment_store().read(image_path.name)
+        if image is None:
+            _raise_image_not_found()
+        return image
+    with get_image_file(image_path).open('rb') as f:
+        return f.read()
+
+
+def get_image(image_path: Path) -> Base64:
+    return encode_bytes_to_base64(read_image(image_path))
+
+
+def read_images(paths: List[str]) -> RawImagesBatch:
+    '''
+    Отдает все найденные изображения, для ненайденных - причину ошибки
+    '''
+    images: Dict[str, bytes] = {}
+    errors: Dict[str, str] = {}
+    for path in paths:
+        if path in images or path in errors:
+            continue
+        try:
+            images[path] = read_image(Path(path))
+        except DALError as e:
+            errors[path] = e.detail
+    return RawImagesBatch(images=images, errors=errors)
+
+
+def get_images(paths: List[str]) -> ImagesBatch:
+    batch = read_images(paths)
+    images = [
+        ImageWithPath(path=path, image=encode_bytes_to_base64(image))
+        for path, image in batch.images.items()
+    ]
+    return ImagesBatch(images=images, errors=batch.errors)
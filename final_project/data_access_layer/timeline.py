@@ -0,0 +1,300 @@
+from datetime import datetime
+from typing import List, Optional, Tuple, Union
+
+from final_project.config import feed_settings
+from final_project.data_access_layer.feed import get_feed_criterion
+from final_project.database.models import Post, User, user_subsriptions
+from final_project.redis_keys import get_timeline_key
+from redis import Redis
+from sqlalchemy.orm import Session
+
+EPOCH = datetime(1970, 1, 1)
+# Лента читается от старых постов к новым, поэтому таймлайн хранит её начало:
+# не больше timeline_max_size самых старых постов. Метка в конце таймлайна:
+# пока она есть, таймлайн содержит ленту до последнего поста.
+# Обрезка по timeline_max_size удаляет её вместе с самыми новыми постами
+TAIL = 'TAIL'
+TAIL_SCORE = float('inf')
+
+# KEYS[1] - таймлайн, ARGV: max_size, score1, member1, ...
+# Холодный таймлайн не трогается: он будет целиком перестроен при чтении.
+# В обрезанный таймлайн попадают только посты до его последнего поста,
+# иначе в нём появился бы пропуск
+_ADD_TO_TIMELINE_SCRIPT = '''
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local max_size = tonumber(ARGV[1])
+local complete = redis.call('ZSCORE', KEYS[1], 'TAIL')
+local last = nil
+if not complete then
+    last = redis.call('ZRANGE', KEYS[1], -1, -1)[1]
+end
+for i = 2, #ARGV, 2 do
+    redis.call('ZADD', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+if last then
+    redis.call('ZREMRANGEBYRANK', KEYS[1], redis.call('ZRANK', KEYS[1], last) + 1, -1)
+end
+local size = redis.call('ZCARD', KEYS[1])
+if complete then
+    size = size - 1
+end
+if size > max_size then
+    redis.call('ZREM', KEYS[1], 'TAIL')
+    redis.call('ZREMRANGEBYRANK', KEYS[1], max_size, -1)
+end
+return 1
+'''
+
+TimelineItem = Tuple[Union[bytes, str], float]
+# score поста и его id: в таком порядке записи сортируются в таймлайне
+FeedEntry = Tuple[float, int]
+
+
+def get_score(created_at: datetime) -> float:
+    return (created_at - EPOCH).total_seconds()
+
+
+def to_entry(created_at: datetime, post_id: int) -> FeedEntry:
+    return get_score(created_at), post_id
+
+
+def _get_member(post_id: int) -> str:
+    # при равных score redis сортирует члены лексикографически
+    return f'{post_id:020d}'
+
+
+def _to_script_args(posts: List[Tuple[int, datetime]]) -> List[Union[str, float]]:
+    args: List[Union[str, float]] = []
+    for post_id, created_at in posts:
+        args.extend((get_score(created_at), _get_member(post_id)))
+    return args
+
+
+def is_pull_author(subscribers_count: int) -> bool:
+    return subscribers_count > feed_settings.fan_out_followers_threshold
+
+
+def get_pull_authors_ids(user_id: int, session: Session) -> List[int]:
+    '''
+    Подписки пользователя, чьи посты не раскладываются по таймлайнам
+    '''
+    authors = (
+        session.query(User.id)
+        .join(user_subsriptions, user_subsriptions.c.followed_id == User.id)
+        .filter(user_subsriptions.c.follower_id == user_id)
+        .filter(User.subscribers_count > feed_settings.fan_out_followers_threshold)
+    )
+    return [id_ for id_, in authors]
+
+
+def _to_entries(items: List[TimelineItem]) -> List[FeedEntry]:
+    return [
+        (score, int(member))
+        for member, score in items
+        if member not in (TAIL, TAIL.encode())
+    ]
+
+
+class TimelineDAL:
+    '''
+    Материализованная лента пользователя в sorted set redis:
+    id постов с score, равным времени создания поста
+    '''
+
+    @staticmethod
+    def _get_posts(user_id: int, session: Session) -> List[Tuple[int, datetime]]:
+        query = session.query(Post.id, Post.created_at).filter(
+            get_feed_criterion(user_id)
+        )
+        pull_authors_ids = get_pull_authors_ids(user_id, session)
+        if pull_authors_ids:
+            query = query.filter(Post.user_id.notin_(pull_authors_ids))
+        max_size = feed_settings.timeline_max_size
+        return query.order_by(Post.created_at, Post.id).limit(max_size).all()
+
+    @staticmethod
+    def rebuild(redis: Redis, user_id: int, session: Session) -> int:
+        '''
+        Перестраивает таймлайн по БД, без постов авторов,
+        которые подмешиваются при чтении.
+        Пост, сохраненный после чтения БД, мог разойтись по таймлайнам раньше
+        записи таймлайна: fan_out пропускает холодный таймлайн, а запись стирает
+        уже добавленный пост. Такие посты находит повторное чтение после записи
+        :return: количество постов в таймлайне
+        '''
+        max_size = feed_settings.timeline_max_size
+        posts = TimelineDAL._get_posts(user_id, session)
+        mapping = {_get_member(id_): get_score(created_at) for id_, created_at in posts}
+        if len(posts) < max_size:
+            mapping[TAIL] = TAIL_SCORE
+        key = get_timeline_key(user_id)
+        pipeline = redis.pipeline()
+        pipeline.delete(key)
+        pipeline.zadd(key, mapping)
+        pipeline.execute()
+        written = set(posts)
+        missed = [
+            post
+            for post in TimelineDAL._get_posts(user_id, session)
+            if post not in written
+        ]
+        if missed:
+            script = redis.register_script(_ADD_TO_TIMELINE_SCRIPT)
+            script(keys=[key], args=[max_size, *_to_script_args(missed)])
+        return len(posts) + len(missed)
+
+    @staticmethod
+    def fan_out(redis: Redis, post_id: int, session: Session) -> int:
+        '''
+        Добавляет пост в таймлайны автора и всех его подписчиков.
+        Подписчики авторов с числом подписчиков выше порога получат пост при чтении
+        :return: количество обновленных таймлайнов
+        '''
+        author_id, created_at, subscribers_count = (
+            session.query(Post.user_id, Post.created_at, User.subscribers_count)
+            .join(Post.user)
+            .filter(Post.id == post_id)
+            .one()
+        )
+        users_ids = [author_id]
+        if not is_pull_author(subscribers_count):
+            followers = session.query(user_subsriptions.c.follower_id).filter(
+                user_subsriptions.c.followed_id == author_id
+            )
+            users_ids.extend(follower_id for follower_id, in followers)
+        args = [
+            feed_settings.timeline_max_size,
+            *_to_script_args([(post_id, created_at)]),
+        ]
+        script = redis.register_script(_ADD_TO_TIMELINE_SCRIPT)
+        pipeline = redis.pipeline(transaction=False)
+        for user_id in users_ids:
+            script(keys=[get_timeline_key(user_id)], args=args, client=pipeline)
+        pipeline.execute()
+        return len(users_ids)
+
+    @staticmethod
+    def backfill(redis: Redis, user_id: int, author_id: int, session: Session) -> None:
+        '''
+        Добавляет в таймлайн посты новой подписки.
+        В обрезанный таймлайн попадут только посты до его последнего поста
+        '''
+        author = session.query(User).filter(User.id == author_id).one()
+        if is_pull_author(author.subscribers_count):
+            return
+        posts = (
+            session.query(Post.id, Post.created_at)
+            .filter(Post.user_id == author_id)
+            .order_by(Post.created_at, Post.id)
+            .limit(feed_settings.timeline_max_size)
+            .all()
+        )
+        if not posts:
+            return
+        args = [feed_settings.timeline_max_size, *_to_script_args(posts)]
+        script = redis.register_script(_ADD_TO_TIMELINE_SCRIPT)
+        script(keys=[get_timeline_key(user_id)], args=args)
+
+    @staticmethod
+    def prune(redis: Redis, user_id: int, author_id: int, session: Session) -> None:
+        '''
+        Убирает из таймлайна посты пользователя, от которого отписались
+        '''
+        ids = session.query(Post.id).filter(Post.user_id == author_id)
+        members = [_get_member(id_) for id_, in ids]
+        if members:
+            redis.zrem(get_timeline_key(user_id), *members)
+
+    @staticmethod
+    def invalidate_followers(redis: Redis, author_id: int, session: Session) -> int:
+        '''
+        Удаляет таймлайны подписчиков автора, они будут перестроены при чтении
+        :return: количество удаленных таймлайнов
+        '''
+        followers = session.query(user_subsriptions.c.follower_id).filter(
+            user_subsriptions.c.followed_id == author_id
+        )
+        keys = [get_timeline_key(follower_id) for follower_id, in followers]
+        if keys:
+            redis.delete(*keys)
+        return len(keys)
+
+    @staticmethod
+    def unsubscribe(
+        redis: Redis,
+        user_id: int,
+        author_id: int,
+        subscribers_count: int,
+        session: Session,
+    ) -> None:
+        '''
+        Убирает посты автора из таймлайна отписавшегося пользователя.
+        Посты, созданные автором выше порога подписчиков, не раскладывались
+        по таймлайнам: когда он опускается до порога, они перестают
+        подмешиваться при чтении, поэтому таймлайны подписчиков перестраиваются
+        :param subscribers_count: число подписчиков автора до отписки
+        '''
+        TimelineDAL.prune(redis, user_id, author_id, session)
+        if is_pull_author(subscribers_count) and not is_pull_author(
+            subscribers_count - 1
+        ):
+            TimelineDAL.invalidate_followers(redis, author_id, session)
+
+    @staticmethod
+    def get_entries(
+        redis: Redis, user_id: int, offset: int, count: int, session: Session
+    ) -> Optional[List[FeedEntry]]:
+        '''
+        :return: count записей таймлайна, начиная с offset, или None,
+        если таймлайн обрезан раньше
+        '''
+        key = get_timeline_key(user_id)
+        pipeline = redis.pipeline()
+        pipeline.exists(key)
+        pipeline.zscore(key, TAIL)
+        pipeline.zrange(key, offset, offset + count - 1, withscores=True)
+        exists, tail, items = pipeline.execute()
+        if not exists:
+            TimelineDAL.rebuild(redis, user_id, session)
+            return TimelineDAL.get_entries(redis, user_id, offset, count, session)
+        entries = _to_entries(items)
+        if len(entries) < count and tail is None:
+            return None
+        return entries
+
+    @staticmethod
+    def get_entries_after(
+        redis: Redis,
+        user_id: int,
+        after: Optional[FeedEntry],
+        count: int,
+        session: Session,
+    ) -> Optional[List[FeedEntry]]:
+        '''
+        :return: count записей таймлайна после after или None, если таймлайн
+        обрезан раньше
+        '''
+        if after is None:
+            return TimelineDAL.get_entries(redis, user_id, 0, count, session)
+        key = get_timeline_key(user_id)
+        pipeline = redis.pipeline()
+        pipeline.exists(key)
+        pipeline.zscore(key, TAIL)
+        exists, tail = pipeline.execute()
+        if not exists:
+            TimelineDAL.rebuild(redis, user_id, session)
+            return TimelineDAL.get_entries_after(redis, user_id, after, count, session)
+        # записи с тем же score, что и у after, отсекаются по id
+        limit = count + 1
+        while True:
+            items = redis.zrangebyscore(
+                key, after[0], '+inf', start=0, num=limit, withscores=True
+            )
+            entries = [entry for entry in _to_entries(items) if entry > after]
+            if len(entries) >= count:
+                return entries[:count]
+            if len(items) < limit:
+                return None if tail is None else entries
+            limit *= 2
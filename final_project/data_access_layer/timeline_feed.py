@@ -0,0 +1,85 @@
+import heapq
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
+
+from final_project.data_access_layer.feed import FeedDAL, KeysetFeed, PostKey
+from final_project.data_access_layer.timeline import (
+    FeedEntry,
+    TimelineDAL,
+    get_pull_authors_ids,
+    to_entry,
+)
+from final_project.database.models import Post
+from final_project.exceptions import PaginationError
+from final_project.messages import Message
+from final_project.metrics import metrics
+from final_project.redis import RedisInstances
+from final_project.utils import get_offset
+from sqlalchemy.orm import Session
+
+
+def _merge(
+    entries: List[FeedEntry], posts: List[Tuple[datetime, int]]
+) -> List[FeedEntry]:
+    pulled = [to_entry(created_at, post_id) for created_at, post_id in posts]
+    res: List[FeedEntry] = []
+    seen: Set[int] = set()
+    # пост мог попасть в таймлайн, пока у автора было меньше подписчиков
+    for entry in heapq.merge(entries, pulled):
+        if entry[1] not in seen:
+            seen.add(entry[1])
+            res.append(entry)
+    return res
+
+
+def _get_pull_authors_ids(user_id: int, session: Session) -> List[int]:
+    authors_ids = get_pull_authors_ids(user_id, session)
+    metrics.observe('feed_pull_merged_authors', len(authors_ids))
+    return authors_ids
+
+
+def _get_posts(entries: List[FeedEntry], session: Session) -> List[Post]:
+    return FeedDAL.get_posts_by_ids([post_id for _, post_id in entries], session)
+
+
+class TimelineFeedDAL(KeysetFeed):
+    '''
+    Лента из таймлайна redis. Посты авторов с числом подписчиков выше порога
+    не хранятся в таймлайнах и подмешиваются из БД при чтении
+    '''
+
+    @staticmethod
+    def get_page(user_id: int, page: int, size: int, session: Session) -> List[Post]:
+        offset = get_offset(page, size)
+        redis = RedisInstances.sync_redis()
+        authors_ids = _get_pull_authors_ids(user_id, session)
+        if authors_ids:
+            entries = TimelineDAL.get_entries(redis, user_id, 0, offset + size, session)
+            if entries is not None:
+                posts = FeedDAL.get_authors_posts_after(
+                    authors_ids, None, offset + size, session
+                )
+                entries = _merge(entries, posts)[offset:]
+        else:
+            entries = TimelineDAL.get_entries(redis, user_id, offset, size, session)
+        if entries is None:
+            return FeedDAL.get_page(user_id, page, size, session)
+        if not entries and offset and FeedDAL.is_feed_not_empty(user_id, session):
+            raise PaginationError(Message.INVALID_PAGINATION_PARAMS.value)
+        return _get_posts(entries[:size], session)
+
+    @staticmethod
+    def _get_posts_after(
+        user_id: int, cursor: Optional[PostKey], size: int, session: Session
+    ) -> List[Post]:
+        after = to_entry(*cursor) if cursor else None
+        entries = TimelineDAL.get_entries_after(
+            RedisInstances.sync_redis(), user_id, after, size, session
+        )
+        if entries is None:
+            return FeedDAL.get_page_after(user_id, cursor, size, session)
+        authors_ids = _get_pull_authors_ids(user_id, session)
+        if authors_ids:
+            posts = FeedDAL.get_authors_posts_after(authors_ids, cursor, size, session)
+            entries = _merge(entries, posts)
+        return _get_posts(entries[:size], session)
@@ -1,25 +1,39 @@
 from http import HTTPStatus
-from typing import Awaitable, List, Union
+from typing import Awaitable, Dict, List, Optional, Type, Union
 
-from final_project import storage_client, utils
+from final_project import storage_batch, utils
+from final_project.config import FeedMode, feed_settings
+from final_project.data_access_layer.feed import FeedDAL
+from final_project.data_access_layer.merge_feed import MergeFeedDAL
 from final_project.data_access_layer.serialization import serialize
+from final_project.data_access_layer.timeline import TimelineDAL
+from final_project.data_access_layer.timeline_feed import TimelineFeedDAL
 from final_project.database.database import create_session, run_in_threadpool
-from final_project.database.models import Post as DB_Post
 from final_project.database.models import User
 from final_project.exceptions import DALError, PaginationError
 from final_project.messages import Message
 from final_project.models import (
+    FeedPage,
+    FeedPageWithPaths,
     ImagePath,
     InUser,
     OutUser,
-    PostWithImage,
     PostWithImagePath,
     UserInDetailOut,
     UserWithTokens,
 )
 from final_project.password import get_password_hash
+from final_project.redis import RedisInstances
 from sqlalchemy.orm import Session
 
+FEEDS: Dict[
+    FeedMode, Union[Type[FeedDAL], Type[TimelineFeedDAL], Type[MergeFeedDAL]]
+] = {
+    FeedMode.QUERY: FeedDAL,
+    FeedMode.TIMELINE: TimelineFeedDAL,
+    FeedMode.MERGE: MergeFeedDAL,
+}
+
 
 class UsersDataAccessLayer:
     @staticmethod
@@ -97,9 +111,17 @@ class UsersDataAccessLayer:
                     Message.USER_ALREADY_SUBSCRIBED_ON_THIS_USER.value,
                 )
             user_who_wants_subscribe.subscriptions.append(another_user)
-            return UsersDataAccessLayer._serialize_to_list_out_users(
+            another_user.subscribers_count = User.subscribers_count + 1
+            subscriptions = UsersDataAccessLayer._serialize_to_list_out_users(
                 user_who_wants_subscribe.subscriptions
             )
+        # таймлайн меняется только после коммита подписки: при откате
+        # в нём не должно остаться постов автора
+        if feed_settings.feed_mode == FeedMode.TIMELINE:
+            await UsersDataAccessLayer._backfill_timeline(
+                user_id, want_subscribe_on_user_with_id
+            )
+        return subscriptions
 
     @staticmethod
     def _serialize_to_list_out_users(db_objs: List[User]) -> List[OutUser]:
@@ -129,8 +151,39 @@ class UsersDataAccessLayer:
                     HTTPStatus.BAD_REQUEST.value,
                     Message.USER_NOT_SUBSCRIBED_ON_THIS_USER.value,
                 )
+            subscribers_count = another_user.subscribers_count
             subscriptions.remove(another_user)
-            return UsersDataAccessLayer._serialize_to_list_out_users(subscriptions)
+            another_user.subscribers_count = User.subscribers_count - 1
+            out_subscriptions = UsersDataAccessLayer._serialize_to_list_out_users(
+                subscriptions
+            )
+        if feed_settings.feed_mode == FeedMode.TIMELINE:
+            await UsersDataAccessLayer._prune_timeline(
+                user_id, want_unsubscribe_on_user_with_id, subscribers_count
+            )
+        return out_subscriptions
+
+    @staticmethod
+    @run_in_threadpool
+    def _backfill_timeline(user_id: int, author_id: int) -> Awaitable[None]:
+        with create_session() as session:
+            return TimelineDAL.backfill(  # type: ignore
+                RedisInstances.sync_redis(), user_id, author_id, session
+            )
+
+    @staticmethod
+    @run_in_threadpool
+    def _prune_timeline(
+        user_id: int, author_id: int, subscribers_count: int
+    ) -> Awaitable[None]:
+        with create_session() as session:
+            return TimelineDAL.unsubscribe(  # type: ignore
+                RedisInstances.sync_redis(),
+                user_id,
+                author_id,
+                subscribers_count,
+                session,
+            )
 
     @staticmethod
     @run_in_threadpool
@@ -148,36 +201,66 @@ class UsersDataAccessLayer:
             return serialize(user)  # type: ignore
 
     @staticmethod
-    def _get_sorted_posts_of_all_subscriptions(user: User) -> List[DB_Post]:
-        res = list(user.posts)
-        for subscription in user.subscriptions:
-            res.extend(subscription.posts)
-        res.sort(key=lambda post: post.created_at)
-        return res
-
-    @staticmethod
-    async def get_feed(user_id: int, page: int, size: int) -> List[PostWithImage]:
-        posts = await UsersDataAccessLayer.get_feed_posts_with_paths(
-            user_id, page, size
+    async def get_feed(
+        user_id: int,
+        page: Optional[int],
+        size: int,
+        cursor: Optional[str] = None,
+        variant: Optional[str] = None,
+    ) -> FeedPage:
+        page_with_paths = await UsersDataAccessLayer.get_feed_posts_with_paths(
+            user_id, page, size, cursor
+        )
+        posts = page_with_paths.posts
+        images = await storage_batch.get_images(
+            [ImagePath(path=utils.get_variant_path(p, variant)) for p in posts]
+        )
+        posts_with_images, missing_ids = utils.join_posts_with_images(
+            posts, images, variant
         )
-        images = await storage_client.get_images(
-            list(map(lambda p: ImagePath(path=p.image_path), posts))
+        return FeedPage(
+            posts=posts_with_images,
+            next_cursor=page_with_paths.next_cursor,
+            missing_posts_ids=missing_ids,
         )
-        return utils.join_posts_with_images(posts, images)
 
     @staticmethod
     async def get_feed_posts_with_paths(
-        user_id: int, page: int, size: int
-    ) -> List[PostWithImagePath]:
+        user_id: int, page: Optional[int], size: int, cursor: Optional[str] = None
+    ) -> FeedPageWithPaths:
+        '''
+        Если передан page, то лента выдается по номеру страницы,
+        иначе - начиная с поста, закодированного в cursor.
+        Курсор следующей страницы строится по последнему посту из бд,
+        а не по постам, для которых нашлись изображения
+        '''
         with create_session() as session:
-            user = await UsersDataAccessLayer._get_user(user_id, session)
-            posts = UsersDataAccessLayer._get_sorted_posts_of_all_subscriptions(user)
-            if posts:
-                try:
-                    return [
-                        PostWithImagePath.from_orm(p)
-                        for p in utils.get_pagination(posts, page, size)
-                    ]
-                except PaginationError as e:
-                    raise DALError(HTTPStatus.BAD_REQUEST.value, str(e))
-            return []
+            await UsersDataAccessLayer._get_user(user_id, session)
+            try:
+                posts = await UsersDataAccessLayer._get_feed_page(
+                    user_id, page, size, cursor, session
+                )
+            except PaginationError as e:
+                raise DALError(HTTPStatus.BAD_REQUEST.value, str(e))
+        next_cursor = None
+        if page is None and len(posts) == size:
+            last = posts[-1]
+            next_cursor = utils.encode_feed_cursor(last.created_at, last.id)
+        return FeedPageWithPaths(posts=posts, next_cursor=next_cursor)
+
+    @staticmethod
+    @run_in_threadpool
+    def _get_feed_page(
+        user_id: int,
+        page: Optional[int],
+        size: int,
+        cursor: Optional[str],
+        session: Session,
+    ) -> Awaitable[List[PostWithImagePath]]:
+        feed = FEEDS[feed_settings.feed_mode]
+        if page is not None:
+            posts = feed.get_page(user_id, page, size, session)
+        else:
+            after = utils.decode_feed_cursor(cursor) if cursor else None
+            posts = feed.get_page_after(user_id, after, size, session)
+        return [PostWithImagePath.from_orm(p) for p in posts]  # type: ignore
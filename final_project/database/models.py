@@ -26,8 +26,8 @@ post_comments_likes_association_table = sa.Table(
 user_subsriptions = sa.Table(
     'user_subsriptions_association',
     Base.metadata,
-    sa.Column('follower_id', sa.Integer, sa.ForeignKey('user.id')),
-    sa.Column('followed_id', sa.Integer, sa.ForeignKey('user.id')),
+    sa.Column('follower_id', sa.Integer, sa.ForeignKey('user.id'), index=True),
+    sa.Column('followed_id', sa.Integer, sa.ForeignKey('user.id'), index=True),
 )
 
 
@@ -38,6 +38,7 @@ class User(Base):
     password_hash = sa.Column(sa.String)
     access_token = sa.Column(sa.String)
     refresh_token = sa.Column(sa.String)
+    subscribers_count = sa.Column(sa.Integer, nullable=False, server_default='0')
 
     subscriptions = so.relationship(
         'User',
@@ -65,9 +66,15 @@ class User(Base):
 
 class Post(Base):
     __tablename__ = 'post'
+    __table_args__ = (
+        sa.Index('ix_post_created_at_id', 'created_at', 'id'),
+        sa.Index('ix_post_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+    )
     id = sa.Column(sa.Integer, primary_key=True, index=True)
     user_id = sa.Column(sa.Integer, sa.ForeignKey(User.id), nullable=False, index=True)
     image_path = sa.Column(sa.String)
+    # пути к уменьшенным вариантам изображения по их названиям
+    image_variants = sa.Column(sa.JSON)
     description = sa.Column(sa.String)
     location = sa.Column(sa.String)
     created_at = sa.Column(sa.DateTime)
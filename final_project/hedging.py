@@ -0,0 +1,25 @@
+from collections import deque
+from typing import Deque
+
+# меньше задержек для перцентиля недостаточно
+MIN_SAMPLES = 20
+
+
+class LatencyWindow:
+    '''
+    Задержки последних запросов к хранилищу.
+    По их перцентилю выбирается, когда отправить запрос к следующей реплике
+    '''
+
+    def __init__(self, size: int, default_delay: float) -> None:
+        self._latencies: Deque[float] = deque(maxlen=size)
+        self._default_delay = default_delay
+
+    def observe(self, seconds: float) -> None:
+        self._latencies.append(seconds)
+
+    def get_delay(self, percentile: float) -> float:
+        if len(self._latencies) < MIN_SAMPLES:
+            return self._default_delay
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional
+
+from final_project.config import image_cache_settings
+from final_project.utils import MEGABYTE
+
+
+class ImageCache:
+    '''
+    LRU-кэш изображений по пути, ограниченный суммарным размером в байтах.
+    Содержимое по пути не меняется, поэтому записи не инвалидируются
+    '''
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._size = 0
+        self._images: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, path: str) -> Optional[bytes]:
+        with self._lock:
+            image = self._images.get(path)
+            if image is None:
+                self._misses += 1
+                return None
+            self._images.move_to_end(path)
+            self._hits += 1
+            return image
+
+    def put(self, path: str, image: bytes) -> None:
+        '''
+        Изображения больше всего кэша не сохраняются
+        '''
+        size = len(image)
+        with self._lock:
+            if size > self._max_size or path in self._images:
+                return
+            self._images[path] = image
+            self._size += size
+            while self._size > self._max_size:
+                _, evicted = self._images.popitem(last=False)
+                self._size -= len(evicted)
+                self._evictions += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'items': len(self._images),
+                'size': self._size,
+                'max_size': self._max_size,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._images.clear()
+            self._size = 0
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+
+image_cache = ImageCache(image_cache_settings.image_cache_max_size_mb * MEGABYTE)
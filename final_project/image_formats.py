@@ -0,0 +1,120 @@
+from http import HTTPStatus
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from final_project.config import ImageFormat, image_storage_settings
+from final_project.exceptions import DALError
+from final_project.messages import Message
+from PIL.Image import Image
+from PIL.Image import open as open_image
+
+# при равных весах в Accept выбирается формат, идущий раньше
+MEDIA_TYPES = {
+    ImageFormat.WEBP: 'image/webp',
+    ImageFormat.JPEG: 'image/jpeg',
+    ImageFormat.PNG: 'image/png',
+}
+# байт в начале файла, по которым определяется формат изображения
+HEADER_SIZE = 12
+# режимы изображений, которые jpeg хранит без преобразования
+JPEG_MODES = {'RGB', 'L', 'CMYK'}
+
+
+def get_media_type(image_format: ImageFormat) -> str:
+    return MEDIA_TYPES[image_format]
+
+
+def detect_format(header: bytes) -> Optional[ImageFormat]:
+    '''
+    Определяет формат изображения по сигнатуре в его первых HEADER_SIZE байтах
+    '''
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return ImageFormat.PNG
+    if header.startswith(b'\xff\xd8\xff'):
+        return ImageFormat.JPEG
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return ImageFormat.WEBP
+    return None
+
+
+def encode_image(image: Image, image_format: ImageFormat, quality: int) -> bytes:
+    '''
+    Кодирует изображение в image_format. Jpeg сохраняется прогрессивным,
+    прозрачность при этом теряется
+    '''
+    image_bytes = BytesIO()
+    if image_format == ImageFormat.JPEG:
+        if image.mode not in JPEG_MODES:
+            image = image.convert('RGB')
+        image.save(
+            image_bytes, 'jpeg', quality=quality, optimize=True, progressive=True
+        )
+    elif image_format == ImageFormat.WEBP:
+        image.save(image_bytes, 'webp', quality=quality)
+    else:
+        image.save(image_bytes, image_format.value)
+    return image_bytes.getvalue()
+
+
+def transcode_image(image: bytes, image_format: ImageFormat) -> bytes:
+    return encode_image(
+        open_image(BytesIO(image)), image_format, image_storage_settings.image_quality
+    )
+
+
+def _parse_quality(params: List[str]) -> float:
+    '''
+    :return: вес q из параметров media type, без него - 1
+    '''
+    quality = 1.0
+    for param in params:
+        name, _, value = param.partition('=')
+        if name.strip() == 'q':
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0
+    return quality
+
+
+def _parse_accept(accept: str) -> Dict[str, float]:
+    '''
+    :return: media type -> его вес q из заголовка Accept
+    '''
+    res = {}
+    for item in accept.split(','):
+        media_type, *params = (part.strip() for part in item.split(';'))
+        if media_type:
+            res[media_type.lower()] = _parse_quality(params)
+    return res
+
+
+def _get_quality(accepted: Dict[str, float], image_format: ImageFormat) -> float:
+    return accepted.get(
+        get_media_type(image_format), accepted.get('image/*', accepted.get('*/*', 0))
+    )
+
+
+def negotiate_format(
+    accept: str, stored_format: Optional[ImageFormat]
+) -> Optional[ImageFormat]:
+    '''
+    Выбирает формат ответа по заголовку Accept. Формат хранилища выбирается всегда,
+    когда клиент его принимает, чтобы не перекодировать изображение на чтении,
+    иначе - принимаемый формат с наибольшим весом
+    :return: формат ответа или None, если клиент не перечисляет форматы изображений
+    или формат хранимого изображения неизвестен: тогда оно отдается как есть
+    :raises DALError если клиент не принимает ни один из форматов
+    '''
+    accepted = _parse_accept(accept)
+    if stored_format is None or not any(t.startswith('image/') for t in accepted):
+        return None
+    if _get_quality(accepted, stored_format) > 0:
+        return stored_format
+    image_format = max(MEDIA_TYPES, key=lambda f: _get_quality(accepted, f))
+    if _get_quality(accepted, image_format) <= 0:
+        raise DALError(
+            HTTPStatus.NOT_ACCEPTABLE.value,
+            Message.IMAGE_FORMAT_IS_NOT_ACCEPTABLE.value,
+        )
+    return image_format
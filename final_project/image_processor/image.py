@@ -1,14 +1,21 @@
 from io import BytesIO
+from math import ceil
+from typing import Dict, Optional, Tuple
 
-from final_project.config import image_storage_settings
+from final_project.config import image_cutting_settings, image_storage_settings
 from final_project.exceptions import MyImageError
+from final_project.image_formats import encode_image
 from final_project.messages import Message
-from final_project.storage_client import save_image_to_storage
-from final_project.utils import encode_bytes_to_base64
+from final_project.storage_replication import save_image_to_storage
 from PIL import UnidentifiedImageError
-from PIL.Image import Image
+from PIL.Image import LANCZOS, Image  # type: ignore
 from PIL.Image import open as open_image
 
+Box = Tuple[float, float, float, float]
+# изображение уменьшается через reduce или draft не больше, чем до
+# REDUCING_GAP итоговых размеров, остальное уменьшение - ресэмплированием
+REDUCING_GAP = 2.0
+
 
 class MyImage:
     def __init__(self, image: bytes) -> None:
@@ -16,6 +23,8 @@ class MyImage:
             self.image: Image = open_image(BytesIO(image))
         except UnidentifiedImageError:
             raise MyImageError(Message.BYTES_ARE_NOT_A_IMAGE.value)
+        # исходный квадрат в масштабе декодирования, из него строятся варианты
+        self._square: Optional[Tuple[Image, Box]] = None
 
     @property
     def height(self) -> int:
@@ -26,25 +35,40 @@ class MyImage:
         return self.image.width
 
     @staticmethod
-    def _increase_proportionally(image: Image, increase_ratio: int) -> Image:
-        width, height = image.width * increase_ratio, image.height * increase_ratio
-        return image.resize((width, height))
+    def _get_square_box(width: int, height: int) -> Box:
+        side = min(width, height)
+        x, y = (width - side) // 2, (height - side) // 2
+        return x, y, x + side, y + side
 
     @staticmethod
-    def _crop_image(image: Image, aspect_resolution: int) -> Image:
-        x1, y1, x2, y2 = (
-            image.width // 2,
-            image.height // 2,
-            image.width // 2 + 1,
-            image.height // 2 + 1,
+    def _draft(image: Image, box: Box, size: int) -> Tuple[Image, Box]:
+        '''
+        Jpeg декодируется сразу в уменьшенном в 2, 4 или 8 раз масштабе так,
+        чтобы сторона box осталась не меньше size * REDUCING_GAP
+        :return: изображение и box в его масштабе
+        '''
+        ratio = size * REDUCING_GAP / (box[2] - box[0])
+        if image.format != 'JPEG' or ratio >= 1:
+            return image, box
+        width = image.width
+        drafted = image.draft(
+            None, (ceil(image.width * ratio), ceil(image.height * ratio))
         )
-        shift = aspect_resolution // 2
-        return image.crop((x1 - shift, y1 - shift, x2 + shift, y2 + shift))
+        if drafted is None:
+            return image, box
+        scale = drafted[1][2] / width
+        x1, y1, x2, y2 = box
+        return image, (x1 * scale, y1 * scale, x2 * scale, y2 * scale)
 
-    def cut(self, aspect_resolution: int) -> Image:
+    def cut(self, aspect_resolution: int, max_variant_size: int = 0) -> Image:
         '''
-        Обрезает изображение до квадратного, так,
+        Обрезает изображение до квадратного по центру, так,
         чтобы разрешение стороны соотвествовало aspect_resolution.
+        Квадрат вычисляется до декодирования: jpeg декодируется в уменьшенном
+        масштабе, остальные форматы уменьшаются через Image.reduce, и квадрат
+        пересэмплируется в итоговый размер один раз.
+        Масштаб декодирования подходит и для вариантов до max_variant_size,
+        которые make_variants строит из того же квадрата.
         Если image уже квадратное и в заданном разерешении, то возваращет image без изменений
         '''
         width = self.width
@@ -53,15 +77,73 @@ class MyImage:
             raise MyImageError(Message.INVALID_IMAGE.value)
         if height == width == aspect_resolution:
             return self.image
-        if height < aspect_resolution or width < aspect_resolution:
-            self.image = MyImage._increase_proportionally(
-                self.image, aspect_resolution // min(height, width) + 1
-            )
-        self.image = MyImage._crop_image(self.image, aspect_resolution)
+        box = MyImage._get_square_box(width, height)
+        image, box = MyImage._draft(
+            self.image, box, max(aspect_resolution, max_variant_size)
+        )
+        self._square = image, box
+        self.image = image.resize(
+            (aspect_resolution, aspect_resolution),
+            LANCZOS,
+            box=box,
+            reducing_gap=REDUCING_GAP,
+        )
         return self.image
 
+    def make_variants(self, sizes: Dict[str, int]) -> Dict[str, Image]:
+        '''
+        Уменьшенные копии квадрата исходного изображения, а не результата cut,
+        чтобы не терять четкость. Каждая копия строится из предыдущей, большей
+        копии, так что исходное изображение уменьшается один раз.
+        Размеры не меньше стороны изображения или квадрата пропускаются:
+        вариант не может быть больше полного изображения
+        '''
+        res = {}
+        image, box = self._square or (
+            self.image,
+            MyImage._get_square_box(self.width, self.height),
+        )
+        max_size = min(self.width, box[2] - box[0])
+        for name, size in sorted(sizes.items(), key=lambda item: -item[1]):
+            if size >= max_size:
+                continue
+            image = image.resize(
+                (size, size), LANCZOS, box=box, reducing_gap=REDUCING_GAP
+            )
+            box = 0, 0, size, size
+            res[name] = image
+        return res
+
+    @staticmethod
+    def _encode(image: Image, quality: int) -> bytes:
+        return encode_image(image, image_storage_settings.image_format, quality)
+
+    def encode(self) -> bytes:
+        return MyImage._encode(self.image, image_storage_settings.image_quality)
+
+    @staticmethod
+    def encode_variants(variants: Dict[str, Image]) -> Dict[str, bytes]:
+        '''
+        Варианты сжимаются с качеством из variants_quality,
+        если оно для них задано
+        '''
+        res = {}
+        for name, image in variants.items():
+            quality = image_cutting_settings.variants_quality.get(
+                name, image_storage_settings.image_quality
+            )
+            res[name] = MyImage._encode(image, quality)
+        return res
+
     def save(self, user_id: int) -> str:
-        bytes_ = BytesIO()
-        self.image.save(bytes_, image_storage_settings.image_format)
-        image = encode_bytes_to_base64(bytes_.getvalue())
-        return save_image_to_storage(image, user_id)
+        return save_image_to_storage(self.encode(), user_id)
+
+    @staticmethod
+    def save_variants(user_id: int, variants: Dict[str, Image]) -> Dict[str, str]:
+        '''
+        :return: пути к вариантам изображения по их названиям
+        '''
+        return {
+            name: save_image_to_storage(image, user_id)
+            for name, image in MyImage.encode_variants(variants).items()
+        }
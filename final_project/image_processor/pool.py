@@ -0,0 +1,257 @@
+import os
+import time
+from argparse import ArgumentParser
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from types import TracebackType
+from typing import Dict, List, Optional, Tuple, Type
+
+from final_project.config import worker_settings
+from final_project.database import database
+from final_project.image_processor.worker import (
+    Processor,
+    process_image,
+    process_posts,
+    warm_up,
+)
+from final_project.models import QueuedPost, WorkerResult
+from final_project.redis import RedisInstances
+from rq import Queue, SimpleWorker
+from rq.defaults import DEFAULT_RESULT_TTL
+from rq.exceptions import DequeueTimeout, NoSuchJobError
+from rq.job import Job, JobStatus
+from rq.registry import FailedJobRegistry, FinishedJobRegistry, StartedJobRegistry
+from rq.utils import current_timestamp
+
+PROCESS_IMAGE = f'{process_image.__module__}.{process_image.__name__}'
+# как часто супервизор проверяет очередь, пока процессы заняты
+POLL_INTERVAL = 0.05
+# как часто дозаполняется пачка задач
+BATCH_POLL_INTERVAL = 0.005
+# как часто супервизор ищет задачи, брошенные упавшим супервизором
+ABANDONED_CHECK_INTERVAL = 60
+ABANDONED_JOB_ERROR = 'Worker pool stopped before the job was processed'
+
+
+def get_processes_count() -> int:
+    return worker_settings.worker_processes or os.cpu_count() or 1
+
+
+class WorkerPool:
+    '''
+    Супервизор, который один забирает задачи process_image из очереди rq
+    и ведет их состояние, а обработку изображений отдает процессам пула,
+    чтобы Pillow работал на всех ядрах. Задачи отдаются процессам пачками
+    до worker_batch_size штук. Если процесс пула аварийно завершился,
+    его задачи отмечаются проваленными, а пул пересоздается
+    '''
+
+    def __init__(self, processes: Optional[int] = None) -> None:
+        self.processes = processes or get_processes_count()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._worker: Optional[SimpleWorker] = None
+
+    def _start_executor(self) -> None:
+        # процессы создают свои соединения с бд, а не делят соединения супервизора
+        database.engine.dispose()
+        self._executor = ProcessPoolExecutor(self.processes, initializer=warm_up)
+
+    def __enter__(self) -> 'WorkerPool':
+        self._start_executor()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
+
+    def submit(
+        self, posts: List[Tuple[int, QueuedPost]]
+    ) -> 'Future[List[WorkerResult]]':
+        if self._executor is None:
+            raise RuntimeError('Worker pool is not started')
+        try:
+            return self._executor.submit(process_posts, posts)
+        except BrokenProcessPool:
+            # сломанный пул не принимает задачи, его задачи в работе уже провалены
+            self._executor.shutdown(wait=False)
+            self._start_executor()
+            return self._executor.submit(process_posts, posts)
+
+    def _start(self, jobs: List[Job], queue: Queue) -> 'Future[List[WorkerResult]]':
+        '''
+        Переносит пачку задач в реестр выполняемых и отдает процессам пула.
+        Если супервизор упадет, задачи останутся в реестре до истечения
+        своего таймаута, после чего их провалит _fail_abandoned
+        :return: результат пачки, если пул не удалось пересоздать - с ошибкой,
+        чтобы задачи не остались в статусе STARTED
+        '''
+        registry = StartedJobRegistry(queue=queue)
+        with queue.connection.pipeline() as pipeline:
+            for job in jobs:
+                timeout = job.timeout or Queue.DEFAULT_TIMEOUT
+                registry.add(job, timeout, pipeline=pipeline)
+                job.set_status(JobStatus.STARTED, pipeline=pipeline)
+            pipeline.execute()
+        try:
+            return self.submit([(job.args[0], job.args[1]) for job in jobs])
+        except BrokenProcessPool as e:
+            res: 'Future[List[WorkerResult]]' = Future()
+            res.set_exception(e)
+            return res
+
+    @staticmethod
+    def _dequeue(queue: Queue, block: bool) -> Optional[Job]:
+        timeout = worker_settings.worker_dequeue_timeout if block else None
+        try:
+            res = Queue.dequeue_any([queue], timeout, connection=queue.connection)
+        except DequeueTimeout:
+            return None
+        return res[0] if res else None
+
+    @staticmethod
+    def _dequeue_batch(queue: Queue, block: bool) -> List[Job]:
+        '''
+        Забирает задачи, пока их не наберется worker_batch_size
+        или не пройдет worker_batch_wait_ms после первой
+        '''
+        job = WorkerPool._dequeue(queue, block)
+        if job is None:
+            return []
+        jobs = [job]
+        deadline = time.monotonic() + worker_settings.worker_batch_wait_ms / 1000
+        while len(jobs) < worker_settings.worker_batch_size:
+            job = WorkerPool._dequeue(queue, block=False)
+            if job is not None:
+                jobs.append(job)
+            elif time.monotonic() < deadline:
+                time.sleep(BATCH_POLL_INTERVAL)
+            else:
+                break
+        return jobs
+
+    @staticmethod
+    def _finish(
+        jobs: List[Job], future: 'Future[List[WorkerResult]]', queue: Queue
+    ) -> None:
+        '''
+        Записывает результаты задач и, как воркер rq, переносит задачи
+        в реестр выполненных или проваленных с истечением их ключей
+        через result_ttl или failure_ttl
+        '''
+        try:
+            results = future.result()
+        except Exception as e:  # pylint: disable=broad-except
+            results = [WorkerResult(error=str(e))] * len(jobs)
+        started = StartedJobRegistry(queue=queue)
+        finished = FinishedJobRegistry(queue=queue)
+        failed = FailedJobRegistry(queue=queue)
+        with queue.connection.pipeline() as pipeline:
+            for job, result in zip(jobs, results):
+                _, _, task_id = job.args
+                Processor.on_result(task_id, result)
+                started.remove(job, pipeline=pipeline)
+                if result.post_id is None:
+                    job.set_status(JobStatus.FAILED, pipeline=pipeline)
+                    failed.add(
+                        job, job.failure_ttl, result.error or '', pipeline=pipeline
+                    )
+                    continue
+                result_ttl = job.get_result_ttl(DEFAULT_RESULT_TTL)
+                if result_ttl != 0:
+                    job.set_status(JobStatus.FINISHED, pipeline=pipeline)
+                    finished.add(job, result_ttl, pipeline=pipeline)
+                job.cleanup(result_ttl, pipeline=pipeline, remove_from_queue=False)
+            pipeline.execute()
+
+    @staticmethod
+    def _fail_abandoned(queue: Queue) -> None:
+        '''
+        Отмечает проваленными задачи, которые не завершились до истечения
+        таймаута, например, потому что супервизор упал, и переносит их
+        в реестр проваленных
+        '''
+        registry = StartedJobRegistry(queue=queue)
+        timestamp = current_timestamp()
+        for job_id in registry.get_expired_job_ids(timestamp):
+            try:
+                job = Job.fetch(job_id, connection=queue.connection)
+            except NoSuchJobError:
+                continue
+            if job.func_name == PROCESS_IMAGE:
+                Processor.on_failure(job.args[2], ABANDONED_JOB_ERROR)
+        registry.cleanup(timestamp)
+
+    def _perform_others(self, jobs: List[Job], queue: Queue) -> List[Job]:
+        '''
+        Выполняет в супервизоре задачи, кроме process_image, воркером rq,
+        который ведет их статус и переносит упавшие в реестр проваленных
+        :return: задачи process_image
+        '''
+        res = []
+        for job in jobs:
+            if job.func_name == PROCESS_IMAGE:
+                res.append(job)
+                continue
+            if self._worker is None:
+                self._worker = SimpleWorker([queue], connection=queue.connection)
+            self._worker.perform_job(job, queue)
+        return res
+
+    def run(self, queue: Queue, burst: bool = False) -> int:
+        '''
+        Забирает задачи, пока на каждый процесс их приходится не больше
+        worker_prefetch, и отмечает выполненные. Другие задачи очереди
+        выполняются в самом супервизоре
+        :param burst: завершиться, когда очередь опустеет
+        :return: количество выполненных задач
+        '''
+        in_flight: Dict['Future[List[WorkerResult]]', List[Job]] = {}
+        limit = self.processes * worker_settings.worker_prefetch
+        done_count = 0
+        checked_at = 0.0
+        while True:
+            if time.monotonic() - checked_at >= ABANDONED_CHECK_INTERVAL:
+                WorkerPool._fail_abandoned(queue)
+                checked_at = time.monotonic()
+            while len(in_flight) < limit:
+                jobs = WorkerPool._dequeue_batch(
+                    queue, block=not in_flight and not burst
+                )
+                if not jobs:
+                    break
+                batch = self._perform_others(jobs, queue)
+                done_count += len(jobs) - len(batch)
+                if batch:
+                    in_flight[self._start(batch, queue)] = batch
+            if not in_flight:
+                if burst:
+                    return done_count
+                continue
+            timeout = None if len(in_flight) >= limit else POLL_INTERVAL
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                jobs = in_flight.pop(future)
+                WorkerPool._finish(jobs, future, queue)
+                done_count += len(jobs)
+
+
+def start_worker_pool() -> None:
+    parser = ArgumentParser(
+        description='Processes queued images in a pool of processes'
+    )
+    parser.add_argument(
+        '--processes', type=int, help='default: WORKER_PROCESSES or CPU count'
+    )
+    parser.add_argument(
+        '--burst', action='store_true', help='exit when the queue is empty'
+    )
+    args = parser.parse_args()
+    with WorkerPool(args.processes) as pool:
+        done_count = pool.run(RedisInstances.redis_queue(), args.burst)
+    print(f'Processed jobs: {done_count}')
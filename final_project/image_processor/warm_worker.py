@@ -0,0 +1,101 @@
+import os
+import signal
+import sys
+from argparse import ArgumentParser
+from multiprocessing import Process
+from types import FrameType
+from typing import Any, Optional
+
+from final_project.config import worker_settings
+from final_project.image_processor.worker import warm_up
+from final_project.redis import RedisInstances
+from rq import Queue, SimpleWorker
+from rq.defaults import DEFAULT_LOGGING_DATE_FORMAT, DEFAULT_LOGGING_FORMAT
+from rq.job import Job
+
+# код выхода процесса воркера, выполнившего max_jobs задач
+RECYCLE_EXIT_CODE = 3
+
+
+class WarmWorker(SimpleWorker):  # pylint: disable=abstract-method
+    '''
+    Выполняет задачи в своем процессе, без fork рабочего процесса rq на каждую
+    задачу: загруженный Pillow, пул соединений бд, клиент redis и сессия
+    хранилища переиспользуются задачами. Считает выполненные задачи, чтобы
+    процесс, остановленный по max_jobs, можно было перезапустить
+    '''
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.jobs_count = 0
+
+    def work(  # pylint: disable=too-many-arguments
+        self,
+        burst: bool = False,
+        logging_level: str = 'INFO',
+        date_format: str = DEFAULT_LOGGING_DATE_FORMAT,
+        log_format: str = DEFAULT_LOGGING_FORMAT,
+        max_jobs: Optional[int] = None,
+        with_scheduler: bool = False,
+    ) -> bool:
+        warm_up()
+        return super().work(
+            burst, logging_level, date_format, log_format, max_jobs, with_scheduler
+        )
+
+    def execute_job(self, job: Job, queue: Queue) -> None:
+        super().execute_job(job, queue)
+        self.jobs_count += 1
+
+
+def _run_worker(burst: bool) -> None:
+    worker = WarmWorker(
+        [RedisInstances.redis_queue()], connection=RedisInstances.sync_redis()
+    )
+    max_jobs = worker_settings.worker_max_jobs or None
+    worker.work(burst=burst, max_jobs=max_jobs)
+    exhausted = max_jobs is not None and worker.jobs_count >= max_jobs
+    sys.exit(RECYCLE_EXIT_CODE if exhausted else 0)
+
+
+def run_recycled(burst: bool = False) -> Optional[int]:
+    '''
+    Запускает воркер в дочернем процессе и перезапускает его каждый раз,
+    когда тот останавливается после worker_max_jobs задач.
+    SIGTERM передается воркеру, который завершает текущую задачу,
+    после чего воркер больше не перезапускается
+    :return: код выхода последнего процесса воркера
+    '''
+    process: Optional[Process] = None
+    stopping = False
+
+    def stop(signum: int, _frame: Optional[FrameType]) -> None:
+        nonlocal stopping
+        stopping = True
+        # is_alive не дает послать сигнал процессу, которого уже дождались:
+        # его pid мог достаться другому процессу
+        if process is not None and process.is_alive() and process.pid:
+            os.kill(process.pid, signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    # Ctrl+C получает вся группа процессов, воркер обработает его сам
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    exitcode: Optional[int] = None
+    while not stopping:
+        process = Process(target=_run_worker, args=(burst,))
+        process.start()
+        process.join()
+        exitcode = process.exitcode
+        if exitcode != RECYCLE_EXIT_CODE:
+            break
+    return exitcode
+
+
+def start_warm_worker() -> None:
+    parser = ArgumentParser(
+        description='Processes queued images without forking a process per job'
+    )
+    parser.add_argument(
+        '--burst', action='store_true', help='exit when the queue is empty'
+    )
+    sys.exit(run_recycled(parser.parse_args().burst))
@@ -1,42 +1,73 @@
-from binascii import Error
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from final_project.config import image_cutting_settings, redis_settings
+from final_project import storage_batch, storage_client
+from final_project.config import FeedMode, feed_settings, image_cutting_settings
+from final_project.data_access_layer.timeline import TimelineDAL
+from final_project.database import database
 from final_project.database.database import create_session
-from final_project.database.models import Post, User
+from final_project.database.models import (
+    Post,
+    User,
+    post_marked_users_association_table,
+)
 from final_project.exceptions import MyImageError, StorageError
 from final_project.image_processor.image import MyImage
-from final_project.messages import Message
-from final_project.models import InPost, WorkerResult
-from final_project.redis_keys import RedisKey
-from final_project.utils import decode_base64_to_bytes
-from redis import Redis
-
-redis = Redis(redis_settings.redis_address)
+from final_project.metrics import metrics
+from final_project.models import QueuedPost, WorkerResult
+from final_project.redis import RedisInstances
+from final_project.redis_keys import RedisKey, get_timeline_key
+from PIL.Image import Image  # type: ignore
+from PIL.Image import init as init_pillow
+from redis.exceptions import RedisError
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
 
 
 class Processor:
     @staticmethod
     def on_success(task_id: str, post_id: int) -> WorkerResult:
+        redis = RedisInstances.sync_redis()
         redis.hmset(RedisKey.SOLVED_TASKS.value, {task_id: post_id})
         redis.srem(RedisKey.TASKS_IN_PROGRESS.value, task_id)
         return WorkerResult(post_id=post_id)
 
     @staticmethod
     def on_failure(task_id: str, error: str) -> WorkerResult:
+        redis = RedisInstances.sync_redis()
         redis.hmset(RedisKey.FALLEN_TASKS.value, {task_id: error})
         redis.srem(RedisKey.TASKS_IN_PROGRESS.value, task_id)
         return WorkerResult(error=error)
 
+    @staticmethod
+    def on_result(task_id: str, result: WorkerResult) -> WorkerResult:
+        if result.post_id is None:
+            return Processor.on_failure(task_id, result.error or '')
+        return Processor.on_success(task_id, result.post_id)
+
+
+def warm_up() -> None:
+    '''
+    Загружает плагины Pillow и открывает соединения с бд и узлами хранилища,
+    которые затем переиспользуются задачами процесса
+    '''
+    init_pillow()
+    database.engine.connect().close()
+    storage_client.client.warm_up()
+
 
 def _add_post_to_db(
-    user_id: int, image_path: str, description: str, location: Optional[str]
+    user_id: int,
+    image_path: str,
+    description: str,
+    location: Optional[str],
+    image_variants: Optional[Dict[str, str]] = None,
 ) -> int:
     with create_session() as session:
         post = Post(
             user_id=user_id,
             image_path=image_path,
+            image_variants=image_variants,
             description=description,
             location=location,
             created_at=datetime.utcnow(),
@@ -55,28 +86,215 @@ def _add_marked_users(ids: List[int], post_id: int) -> None:
         session.add(post)
 
 
-def process_image(user_id: int, post: InPost, task_id: str) -> WorkerResult:
+def _invalidate_timelines(post_id: int) -> None:
     '''
-    Обрезает изображение до квадратного, сохраняет в файловое хранилище
-    и фиксирует путь к изображению в бд
+    Удаляет таймлайны автора поста и подписчиков, они перестроятся при чтении
     '''
     try:
-        bytes_ = decode_base64_to_bytes(post.image)
-    except Error:
-        return Processor.on_failure(task_id, Message.INVALID_BASE64_PADDING.value)
+        with create_session() as session:
+            author_id = session.query(Post.user_id).filter(Post.id == post_id).scalar()
+            redis = RedisInstances.sync_redis()
+            redis.delete(get_timeline_key(author_id))
+            TimelineDAL.invalidate_followers(redis, author_id, session)
+    except (RedisError, SQLAlchemyError):
+        metrics.inc('timelines_invalidation_failed')
+
+
+def _fan_out_post(post_id: int) -> None:
+    '''
+    Раскладывает уже сохраненный пост по таймлайнам. Ошибка не меняет
+    результат поста: таймлайны, которые могли не получить пост, удаляются
+    '''
+    try:
+        with create_session() as session:
+            TimelineDAL.fan_out(RedisInstances.sync_redis(), post_id, session)
+    except (RedisError, SQLAlchemyError):
+        metrics.inc('posts_fan_out_failed')
+        _invalidate_timelines(post_id)
+
+
+def _cut(image: MyImage) -> Dict[str, Image]:
+    '''
+    Обрезает изображение и строит из него варианты из настроек
+    '''
+    sizes = image_cutting_settings.variants
+    image.cut(image_cutting_settings.aspect_resolution, max(sizes.values(), default=0))
+    return image.make_variants(sizes)
+
+
+def process_post(user_id: int, post: QueuedPost) -> WorkerResult:
+    '''
+    Обрезает изображение до квадратного, уменьшает его до вариантов
+    из настроек, сохраняет все в файловое хранилище
+    и фиксирует пути к изображениям в бд. Состояние задачи не меняется
+    '''
     try:
-        image = MyImage(bytes_)
-        image.cut(image_cutting_settings.aspect_resolution)
+        image = MyImage(post.image)
+        variants = _cut(image)
         image_path = image.save(user_id)
+        variants_paths = image.save_variants(user_id, variants)
     except (MyImageError, StorageError) as e:
-        return Processor.on_failure(task_id, str(e))
+        return WorkerResult(error=str(e))
     post_id = _add_post_to_db(
         user_id=user_id,
         image_path=image_path,
         description=post.description,
         location=post.location,
+        image_variants=variants_paths,
     )
     ids = post.marked_users_ids
     if ids:
         _add_marked_users(ids, post_id)
-    return Processor.on_success(task_id, post_id)
+    if feed_settings.feed_mode == FeedMode.TIMELINE:
+        _fan_out_post(post_id)
+    return WorkerResult(post_id=post_id)
+
+
+def _add_posts_to_db(
+    rows: List[Dict[str, Any]], marked_users_ids: List[List[int]]
+) -> List[int]:
+    '''
+    Добавляет посты одним INSERT из нескольких строк, а отметки
+    пользователей на них - одним INSERT в таблицу связи
+    :return: id постов в порядке rows
+    '''
+    with create_session() as session:
+        # порядок строк RETURNING не гарантирован, поэтому id постов
+        # берутся из последовательности заранее и вставляются явно
+        sequence = func.pg_get_serial_sequence(Post.__tablename__, Post.id.name)
+        ids = select([func.nextval(sequence)]).select_from(
+            func.generate_series(1, len(rows))
+        )
+        posts_ids = [id_ for id_, in session.execute(ids)]
+        session.execute(
+            insert(Post).values(
+                [dict(row, id=id_) for row, id_ in zip(rows, posts_ids)]
+            )
+        )
+        # в таблице связи названия колонок перепутаны местами:
+        # 'post.id' ссылается на пользователя, 'user.id' - на пост
+        marks = [
+            {'post.id': user_id, 'user.id': post_id}
+            for post_id, ids in zip(posts_ids, marked_users_ids)
+            for user_id in ids
+        ]
+        if marks:
+            session.execute(insert(post_marked_users_association_table).values(marks))
+    return posts_ids
+
+
+def _encode_posts_images(
+    posts: List[Tuple[int, QueuedPost]], results: List[Optional[WorkerResult]]
+) -> Tuple[List[Tuple[bytes, int]], List[Tuple[int, Optional[str]]]]:
+    '''
+    Обрезает изображения постов и сжимает их вместе с вариантами,
+    ошибки изображений записываются в results
+    :return: изображения с id их авторов, а также пост и вариант
+    каждого изображения, None - исходное изображение
+    '''
+    images: List[Tuple[bytes, int]] = []
+    owners: List[Tuple[int, Optional[str]]] = []
+    for i, (user_id, post) in enumerate(posts):
+        try:
+            image = MyImage(post.image)
+            variants = _cut(image)
+            encoded: Dict[Optional[str], bytes] = {None: image.encode()}
+            encoded.update(image.encode_variants(variants).items())
+        except MyImageError as e:
+            results[i] = WorkerResult(error=str(e))
+            continue
+        for name, image_bytes in encoded.items():
+            images.append((image_bytes, user_id))
+            owners.append((i, name))
+    return images, owners
+
+
+def _delete_images(paths: Iterable[str]) -> None:
+    for path in paths:
+        try:
+            storage_client.delete_image_from_storage(path)
+        except StorageError:
+            pass
+
+
+def _save_posts_images(
+    posts: List[Tuple[int, QueuedPost]], results: List[Optional[WorkerResult]]
+) -> Dict[int, Dict[Optional[str], str]]:
+    '''
+    Сохраняет изображения всех постов одним запросом на шард хранилища,
+    ошибки сохранения записываются в results. Сохраненные изображения постов
+    с ошибками удаляются
+    :return: пути изображений по вариантам для постов без ошибок
+    '''
+    images, owners = _encode_posts_images(posts, results)
+    paths: Dict[int, Dict[Optional[str], str]] = {}
+    saved = storage_batch.save_images_to_storage(images) if images else []
+    for (i, name), path in zip(owners, saved):
+        if isinstance(path, StorageError):
+            results[i] = WorkerResult(error=str(path))
+        else:
+            paths.setdefault(i, {})[name] = path
+    for i, post_paths in paths.items():
+        if results[i] is not None:
+            _delete_images(post_paths.values())
+    return {i: post_paths for i, post_paths in paths.items() if results[i] is None}
+
+
+def _add_posts(
+    posts: List[Tuple[int, QueuedPost]], paths: Dict[int, Dict[Optional[str], str]]
+) -> Dict[int, int]:
+    '''
+    Добавляет в бд посты с сохраненными изображениями
+    :param paths: пути изображений по вариантам для индексов постов
+    :return: id добавленных постов по их индексам
+    '''
+    rows = []
+    for i, post_paths in paths.items():
+        user_id, post = posts[i]
+        variants_paths = dict(post_paths)
+        rows.append(
+            {
+                'user_id': user_id,
+                'image_path': variants_paths.pop(None),
+                'image_variants': variants_paths,
+                'description': post.description,
+                'location': post.location,
+                'created_at': datetime.utcnow(),
+            }
+        )
+    marked_users_ids = [posts[i][1].marked_users_ids or [] for i in paths]
+    return dict(zip(paths, _add_posts_to_db(rows, marked_users_ids)))
+
+
+def process_posts(posts: List[Tuple[int, QueuedPost]]) -> List[WorkerResult]:
+    '''
+    Обрабатывает пачку постов как process_post, но изображения всех постов
+    сохраняются одним запросом на шард хранилища, а посты и отметки
+    пользователей - двумя запросами к бд. Ошибка изображения не прерывает
+    обработку остальных постов, а ошибка бд проваливает все посты пачки
+    :param posts: посты и id их авторов
+    :return: результаты в порядке posts
+    '''
+    results: List[Optional[WorkerResult]] = [None] * len(posts)
+    paths = _save_posts_images(posts, results)
+    try:
+        posts_ids = _add_posts(posts, paths) if paths else {}
+    except SQLAlchemyError as e:
+        # посты не добавлены, их изображения больше не нужны
+        for i, post_paths in paths.items():
+            _delete_images(post_paths.values())
+            results[i] = WorkerResult(error=str(e))
+        posts_ids = {}
+    for i, post_id in posts_ids.items():
+        results[i] = WorkerResult(post_id=post_id)
+        if feed_settings.feed_mode == FeedMode.TIMELINE:
+            _fan_out_post(post_id)
+    return [result or WorkerResult() for result in results]
+
+
+def process_image(user_id: int, post: QueuedPost, task_id: str) -> WorkerResult:
+    '''
+    Задача очереди: обрабатывает пост и отмечает задачу task_id решенной
+    или упавшей
+    '''
+    return Processor.on_result(task_id, process_post(user_id, post))
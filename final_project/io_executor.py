@@ -0,0 +1,37 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional, TypeVar
+
+from final_project.config import image_storage_settings
+
+T = TypeVar('T')
+
+
+class IOExecutor:
+    '''
+    Ограниченный пул потоков хранилища: чтение и запись на диск,
+    декодирование и кодирование изображений не блокируют цикл событий
+    '''
+
+    def __init__(self) -> None:
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                image_storage_settings.io_threads, thread_name_prefix='storage-io'
+            )
+        return self._executor
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), partial(func, *args))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+io_executor = IOExecutor()
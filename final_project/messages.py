@@ -22,7 +22,6 @@ class Message(Enum):
     POST_NOT_EXISTS = 'Post not exists'
     POSTS_DO_NOT_EXIST = 'Posts do not exist'
     IMAGE_DOES_NOT_EXISTS_ON_STORAGE = 'Image does not exists on storage'
-    USER_DOES_NOT_HAVE_IMAGES = 'User does not have images'
     USER_HAS_ALREADY_LIKE_THIS_POST = 'user has already like this post'
     USER_DID_NOT_LIKE_THIS_POST = 'User did not like this post'
     USER_CANNOT_SUBSCRIBE_ON_HIMSELF = 'User cannot subscribe on himself'
@@ -30,3 +29,8 @@ class Message(Enum):
     USER_ALREADY_SUBSCRIBED_ON_THIS_USER = 'User already subscribed on this user'
     USER_NOT_SUBSCRIBED_ON_THIS_USER = 'User not subscribed on this user'
     INVALID_PAGINATION_PARAMS = 'Invalid page or size params'
+    INVALID_FEED_CURSOR = 'Invalid feed cursor'
+    SEGMENTS_BACKEND_IS_NOT_USED = 'Segments storage backend is not used'
+    INVALID_MULTIPART_BODY = 'Invalid multipart body'
+    UNKNOWN_IMAGE_VARIANT = 'Unknown image variant'
+    IMAGE_FORMAT_IS_NOT_ACCEPTABLE = 'None of accepted image formats is supported'
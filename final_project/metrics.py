@@ -0,0 +1,62 @@
+from threading import Lock
+from typing import Any, Dict, Union
+
+Number = Union[int, float]
+
+
+class Distribution:
+    def __init__(self) -> None:
+        self.count = 0
+        self.total: Number = 0
+        self.max: Number = 0
+        self.last: Number = 0
+
+    def observe(self, value: Number) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.last = value
+
+    def snapshot(self) -> Dict[str, Number]:
+        mean = self.total / self.count if self.count else 0
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': mean,
+            'max': self.max,
+            'last': self.last,
+        }
+
+
+class Metrics:
+    '''
+    Счетчики и распределения процесса, их снимок отдается по /metrics
+    '''
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._counters: Dict[str, Number] = {}
+        self._distributions: Dict[str, Distribution] = {}
+
+    def inc(self, name: str, value: Number = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: Number) -> None:
+        with self._lock:
+            self._distributions.setdefault(name, Distribution()).observe(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            res: Dict[str, Any] = dict(self._counters)
+            for name, distribution in self._distributions.items():
+                res[name] = distribution.snapshot()
+            return res
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._distributions.clear()
+
+
+metrics = Metrics()
@@ -1,6 +1,6 @@
 import re
 from datetime import datetime
-from typing import Any, Callable, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
 from final_project.messages import Message
 from pydantic import BaseModel
@@ -86,6 +86,7 @@ class Post(BaseModel):
 
 class PostWithImagePath(Post):
     image_path: str
+    image_variants: Optional[Dict[str, str]] = None
 
     class Config:
         orm_mode = True
@@ -95,6 +96,24 @@ class PostWithImage(Post):
     image: Base64
 
 
+class FeedPageWithPaths(BaseModel):
+    posts: List[PostWithImagePath]
+    next_cursor: Optional[str] = None
+
+
+class FeedPage(BaseModel):
+    posts: List[PostWithImage]
+    next_cursor: Optional[str] = None
+    # посты страницы, изображения которых не нашлись в хранилище
+    missing_posts_ids: List[int] = []
+
+
+class PostsPage(BaseModel):
+    posts: List[PostWithImage]
+    # посты страницы, изображения которых не нашлись в хранилище
+    missing_posts_ids: List[int] = []
+
+
 class TaskResponse(BaseModel):
     status: str
     task_id: str
@@ -109,6 +128,17 @@ class InPost(BaseModel):
     location: Optional[str] = None
 
 
+class QueuedPost(BaseModel):
+    '''
+    Пост в очереди на обработку: изображение уже декодировано из base64
+    '''
+
+    image: bytes
+    description: str
+    marked_users_ids: Optional[List[int]] = None
+    location: Optional[str] = None
+
+
 class WorkerResult(BaseModel):
     post_id: Optional[int] = None
     error: Optional[str] = None
@@ -126,6 +156,30 @@ class ImagePath(BaseModel):
     path: str
 
 
+class SavedImage(BaseModel):
+    path: Optional[str] = None
+    error: Optional[str] = None
+
+
+class ImagePaths(BaseModel):
+    paths: List[str]
+
+
+class ImagesBatch(BaseModel):
+    images: List[ImageWithPath]
+    # путь -> причина, по которой изображение не отдано
+    errors: Dict[str, str] = {}
+
+
+class RawImagesBatch(BaseModel):
+    images: Dict[str, bytes] = {}
+    errors: Dict[str, str] = {}
+
+
+class CompactionResult(BaseModel):
+    reclaimed: int
+
+
 class ImageIn(BaseModel):
     user_id: int
     image: Base64
@@ -0,0 +1,57 @@
+from typing import List, Optional
+
+from final_project import storage_client, storage_replication
+from final_project.config import image_storage_settings
+from final_project.database.database import create_session
+from final_project.database.models import Post
+from final_project.sharding import split_replicas
+
+
+def _copy_image(path: str, user_id: int, shards: List[str]) -> Optional[str]:
+    '''
+    :return: новый путь изображения или None, если оно уже лежит в shards
+    '''
+    if [shard for shard, _ in split_replicas(path)] == shards:
+        return None
+    image = storage_client.read_image_from_storage(path)
+    return storage_replication.save_image_to_storage(image, user_id)
+
+
+def rebalance_images() -> int:
+    '''
+    Переносит изображения постов и их вариантов в шарды, которым они принадлежат
+    по кольцу хеширования, например после добавления узлов хранилища,
+    и восстанавливает недостающие реплики.
+    Изображение удаляется из старых шардов после сохранения нового пути поста
+    :return: количество перенесенных изображений
+    '''
+    ring = storage_client.client.ring
+    replication_factor = image_storage_settings.replication_factor
+    moved = 0
+    with create_session() as session:
+        posts = session.query(
+            Post.id, Post.user_id, Post.image_path, Post.image_variants
+        ).order_by(Post.id)
+        for post_id, user_id, image_path, image_variants in posts.all():
+            shards = ring.get_user_shards(user_id, replication_factor)
+            old_paths = []
+            new_path = _copy_image(image_path, user_id, shards)
+            if new_path:
+                old_paths.append(image_path)
+                image_path = new_path
+            variants = dict(image_variants or {})
+            for variant, path in variants.items():
+                new_path = _copy_image(path, user_id, shards)
+                if new_path:
+                    old_paths.append(path)
+                    variants[variant] = new_path
+            if not old_paths:
+                continue
+            session.query(Post).filter(Post.id == post_id).update(
+                {Post.image_path: image_path, Post.image_variants: variants or None}
+            )
+            session.commit()
+            for path in old_paths:
+                storage_client.delete_image_from_storage(path)
+            moved += len(old_paths)
+    return moved
@@ -5,3 +5,8 @@ class RedisKey(Enum):
     TASKS_IN_PROGRESS = 'TASKS_IN_PROGRESS'
     SOLVED_TASKS = 'SOLVED_TASKS'
     FALLEN_TASKS = 'FALLEN_TASKS'
+    TIMELINE = 'TIMELINE'
+
+
+def get_timeline_key(user_id: int) -> str:
+    return f'{RedisKey.TIMELINE.value}:{user_id}'
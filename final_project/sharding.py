@@ -0,0 +1,109 @@
+import hashlib
+from bisect import bisect
+from typing import Dict, Iterable, List, Tuple
+
+from final_project.config import image_storage_settings
+
+# шард, в котором лежат изображения, сохраненные до шардирования
+DEFAULT_SHARD = '0'
+# путь изображения в шарде хранится как '<шард>:<путь в хранилище шарда>',
+# путь реплицированного изображения - пути его реплик через '|'
+SHARD_SEPARATOR = ':'
+REPLICA_SEPARATOR = '|'
+
+# шард и путь изображения в его хранилище
+Location = Tuple[str, str]
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    '''
+    Консистентное хеширование: у каждого шарда virtual_nodes точек на кольце,
+    ключ принадлежит шарду ближайшей точки после хеша ключа.
+    При добавлении шарда к нему переходит лишь его доля ключей
+    '''
+
+    def __init__(self, shards: Iterable[str], virtual_nodes: int) -> None:
+        points = sorted(
+            (_hash(f'{shard}#{i}'), shard)
+            for shard in shards
+            for i in range(virtual_nodes)
+        )
+        self._hashes = [hash_ for hash_, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def get_shard(self, key: str) -> str:
+        index = bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._shards[index]
+
+    def get_shards(self, key: str, count: int) -> List[str]:
+        '''
+        :return: count разных шардов, следующих по кольцу после хеша ключа,
+        первый из них - шард ключа
+        '''
+        start = bisect(self._hashes, _hash(key))
+        res: List[str] = []
+        for i in range(len(self._shards)):
+            shard = self._shards[(start + i) % len(self._shards)]
+            if shard not in res:
+                res.append(shard)
+                if len(res) == count:
+                    break
+        return res
+
+    def get_user_shard(self, user_id: int) -> str:
+        return self.get_shard(str(user_id))
+
+    def get_user_shards(self, user_id: int, count: int) -> List[str]:
+        return self.get_shards(str(user_id), count)
+
+
+def get_storage_nodes() -> Dict[str, str]:
+    '''
+    :return: адреса узлов хранилища по id их шардов
+    '''
+    nodes = image_storage_settings.nodes or {
+        DEFAULT_SHARD: f'{image_storage_settings.address}:{image_storage_settings.port}'
+    }
+    return {shard: f'http://{address}' for shard, address in nodes.items()}
+
+
+def join_shard_path(shard: str, path: str) -> str:
+    return f'{shard}{SHARD_SEPARATOR}{path}'
+
+
+def split_shard_path(path: str) -> Location:
+    '''
+    :return: шард изображения и его путь в хранилище шарда
+    '''
+    shard, separator, shard_path = path.partition(SHARD_SEPARATOR)
+    if not separator:
+        return DEFAULT_SHARD, path
+    return shard, shard_path
+
+
+def join_replicas(locations: Iterable[Location]) -> str:
+    return REPLICA_SEPARATOR.join(join_shard_path(*location) for location in locations)
+
+
+def split_replicas(path: str) -> List[Location]:
+    '''
+    :return: реплики изображения, первая из них - в шарде пользователя
+    '''
+    return [split_shard_path(replica) for replica in path.split(REPLICA_SEPARATOR)]
+
+
+def group_by_shard(paths: Iterable[str], replica: int = 0) -> Dict[str, List[str]]:
+    '''
+    Группирует изображения по шардам их реплик с номером replica,
+    изображения без такой реплики пропускаются
+    '''
+    res: Dict[str, List[str]] = {}
+    for path in paths:
+        replicas = split_replicas(path)
+        if replica < len(replicas):
+            res.setdefault(replicas[replica][0], []).append(path)
+    return res
@@ -0,0 +1,58 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Iterable, List, TypeVar
+
+from final_project.metrics import metrics
+
+T = TypeVar('T')
+
+
+class SingleFlight(Generic[T]):
+    '''
+    Объединяет одновременные одинаковые запросы: пока загрузка по ключу не завершена,
+    остальные запросы по этому ключу ждут её результат, а не загружают заново.
+    Завершенные результаты не хранятся
+    '''
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._calls: Dict[Hashable, 'asyncio.Future[T]'] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        return (await self.do_many([key], lambda keys: func()))[0]
+
+    async def do_many(
+        self, keys: Iterable[Hashable], func: Callable[[List[Hashable]], Awaitable[T]]
+    ) -> List[T]:
+        '''
+        Ключи, которые уже загружаются, ждут текущих загрузок,
+        остальные загружаются одним вызовом func
+        :return: результаты всех загрузок, в которых участвуют keys
+        '''
+        futures: List['asyncio.Future[T]'] = []
+        new_keys = []
+        for key in keys:
+            future = self._calls.get(key)
+            if future is None:
+                new_keys.append(key)
+                continue
+            metrics.inc(f'{self._name}_deduplicated')
+            if future not in futures:
+                futures.append(future)
+        if new_keys:
+            futures.append(self._start(new_keys, func))
+        # отмена одного из ожидающих не должна отменять загрузку для остальных
+        return list(await asyncio.gather(*(asyncio.shield(f) for f in futures)))
+
+    def _start(
+        self, keys: List[Hashable], func: Callable[[List[Hashable]], Awaitable[T]]
+    ) -> 'asyncio.Future[T]':
+        future = asyncio.ensure_future(func(keys))
+        for key in keys:
+            self._calls[key] = future
+        future.add_done_callback(lambda _: self._forget(keys, future))
+        return future
+
+    def _forget(self, keys: List[Hashable], future: 'asyncio.Future[T]') -> None:
+        for key in keys:
+            if self._calls.get(key) is future:
+                del self._calls[key]
@@ -1,6 +1,12 @@
 import uvicorn
 from final_project.api.storage import app
+from final_project.config import image_storage_settings
+from final_project.storage_client import compact_segments
 
 
 def start_storage_app() -> None:
-    uvicorn.run(app, host='0.0.0.0', port=8001)
+    uvicorn.run(app, host='0.0.0.0', port=image_storage_settings.port)
+
+
+def start_compact_segments() -> None:
+    print(f'Reclaimed bytes: {compact_segments()}')
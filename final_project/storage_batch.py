@@ -0,0 +1,300 @@
+import asyncio
+import time
+from concurrent.futures import Future  # pylint: disable=unused-import
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, Dict, Hashable, List, Optional, Tuple, Union
+
+import aiohttp
+import requests
+from final_project import storage_client
+from final_project.config import image_storage_settings
+from final_project.exceptions import StorageClientError, StorageError
+from final_project.image_cache import image_cache
+from final_project.metrics import metrics
+from final_project.models import ImagePath, ImageWithPath, RawImagesBatch, SavedImage
+from final_project.sharding import (
+    group_by_shard,
+    join_replicas,
+    join_shard_path,
+    split_replicas,
+)
+from final_project.single_flight import SingleFlight
+from final_project.storage_client import IMAGES_BATCH, RAW_IMAGES_BATCH
+from final_project.storage_replication import fetch_latency, wait_write_quorum
+from final_project.storage_transport import (
+    MULTIPART_MIXED,
+    encode_images_upload,
+    read_images_batch,
+)
+from final_project.utils import encode_bytes_to_base64
+
+images_batch_flight: SingleFlight[RawImagesBatch] = SingleFlight('images_batch_fetch')
+# StorageError - неизвестный или устаревший префикс шарда в пути изображения
+FETCH_ERRORS = (
+    StorageError,
+    StorageClientError,
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+)
+
+
+def _add_images_to_storage(
+    node: str, images: List[Tuple[bytes, int]]
+) -> List[Dict[str, Any]]:
+    body, content_type = encode_images_upload(images)
+    return storage_client.post_images(f'{node}{RAW_IMAGES_BATCH}', body, content_type)
+
+
+def _add_shard_images(shard: str, images: List[Tuple[bytes, int]]) -> List[SavedImage]:
+    res = _add_images_to_storage(storage_client.client.get_node(shard), images)
+    return [SavedImage.parse_obj(item) for item in res]
+
+
+def _delete_late_images(shard: str, future: 'Future[List[SavedImage]]') -> None:
+    if future.exception() is not None:
+        return
+    for saved_image in future.result():
+        if saved_image.path is not None:
+            path = join_shard_path(shard, saved_image.path)
+            storage_client.delete_image_from_storage(path)
+
+
+def _collect_saved_images(
+    indexes_by_shard: Dict[str, List[int]],
+    futures: Dict[str, 'Future[List[SavedImage]]'],
+    count: int,
+) -> Tuple[List[Dict[str, str]], List[List[str]]]:
+    '''
+    :return: для каждого изображения пути на шардах и ошибки сохранения
+    '''
+    saved: List[Dict[str, str]] = [{} for _ in range(count)]
+    errors: List[List[str]] = [[] for _ in range(count)]
+    for shard, future in futures.items():
+        indexes = indexes_by_shard[shard]
+        try:
+            results = future.result()
+        except (StorageClientError, requests.RequestException) as error:
+            for i in indexes:
+                errors[i].append(str(error))
+            continue
+        for i, saved_image in zip(indexes, results):
+            if saved_image.path is None:
+                errors[i].append(saved_image.error or '')
+            else:
+                saved[i][shard] = saved_image.path
+    return saved, errors
+
+
+def _join_saved_images(
+    images_shards: List[List[str]],
+    saved: List[Dict[str, str]],
+    errors: List[List[str]],
+) -> List[Union[str, StorageError]]:
+    res: List[Union[str, StorageError]] = []
+    for shards, paths, image_errors in zip(images_shards, saved, errors):
+        # реплики перечисляются в порядке шардов пользователя
+        replicas = [(shard, paths[shard]) for shard in shards if shard in paths]
+        if len(replicas) >= min(image_storage_settings.write_quorum, len(shards)):
+            res.append(join_replicas(replicas))
+            continue
+        try:
+            if replicas:
+                storage_client.delete_image_from_storage(join_replicas(replicas))
+        except StorageError as e:
+            image_errors.append(str(e))
+        res.append(StorageError('; '.join(image_errors)))
+    return res
+
+
+def save_images_to_storage(
+    images: List[Tuple[bytes, int]]
+) -> List[Union[str, StorageError]]:
+    '''
+    Сохраняет изображения разных пользователей одним запросом на каждый шард,
+    шарды записываются параллельно. Кворум записи проверяется для каждого
+    изображения отдельно, как в save_image_to_storage
+    :param images: изображения и id их пользователей
+    :return: для каждого изображения пути к его репликам или ошибка сохранения
+    '''
+    replication_factor = image_storage_settings.replication_factor
+    images_shards = [
+        storage_client.client.ring.get_user_shards(user_id, replication_factor)
+        for _, user_id in images
+    ]
+    quorums = [
+        min(image_storage_settings.write_quorum, len(shards))
+        for shards in images_shards
+    ]
+    indexes_by_shard: Dict[str, List[int]] = {}
+    for i, shards in enumerate(images_shards):
+        for shard in shards:
+            indexes_by_shard.setdefault(shard, []).append(i)
+    executor = ThreadPoolExecutor(max(len(indexes_by_shard), 1))
+    futures = {
+        shard: executor.submit(_add_shard_images, shard, [images[i] for i in indexes])
+        for shard, indexes in indexes_by_shard.items()
+    }
+    executor.shutdown(wait=False)
+
+    def _has_quorum(done: Dict[str, 'Future[List[SavedImage]]']) -> bool:
+        saved, _ = _collect_saved_images(indexes_by_shard, done, len(images))
+        return all(len(paths) >= q for paths, q in zip(saved, quorums))
+
+    done = wait_write_quorum(futures, _has_quorum, _delete_late_images)
+    saved, errors = _collect_saved_images(indexes_by_shard, done, len(images))
+    return _join_saved_images(images_shards, saved, errors)
+
+
+async def _get_images_batch(node: str, json: Dict[str, Any]) -> RawImagesBatch:
+    session = await storage_client.client.get_session()
+    url = f'{node}{IMAGES_BATCH}'
+    headers = {'Accept': MULTIPART_MIXED}
+    async with session.post(url, json=json, headers=headers) as response:
+        status = response.status
+        if status != HTTPStatus.OK.value:
+            raise StorageClientError(await response.json())
+        return await read_images_batch(aiohttp.MultipartReader.from_response(response))
+
+
+async def _get_shard_images(
+    shard: str, paths_in_shard: Dict[str, str]
+) -> RawImagesBatch:
+    '''
+    :param paths_in_shard: пути изображений по их путям в хранилище шарда
+    :return: изображения и ошибки по путям изображений
+    '''
+    start = time.perf_counter()
+    try:
+        batch = await _get_images_batch(
+            storage_client.client.get_node(shard), {'paths': list(paths_in_shard)}
+        )
+    except FETCH_ERRORS as e:
+        return RawImagesBatch(errors={path: str(e) for path in paths_in_shard.values()})
+    fetch_latency.observe(time.perf_counter() - start)
+    return RawImagesBatch(
+        images={paths_in_shard[p]: image for p, image in batch.images.items()},
+        errors={paths_in_shard.get(p, p): error for p, error in batch.errors.items()},
+    )
+
+
+async def _join_replies(
+    paths: List[str],
+    replica: int,
+    request: 'asyncio.Future[RawImagesBatch]',
+    hedge: Optional['asyncio.Future[RawImagesBatch]'],
+) -> RawImagesBatch:
+    '''
+    Ждет ответов, пока не найдутся все изображения. Изображения, которые не нашлись
+    на узле и не запрашивались у следующей реплики, запрашиваются у нее
+    '''
+    res = RawImagesBatch()
+    pending = {request} if hedge is None else {request, hedge}
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for reply in done:
+            for path, image in reply.result().images.items():
+                res.images.setdefault(path, image)
+        if all(path in res.images for path in paths):
+            return res
+    errors = request.result().errors
+    if hedge is None:
+        hedge = asyncio.ensure_future(
+            _fetch_replicas_images(
+                [path for path in errors if path not in res.images], replica + 1
+            )
+        )
+    next_replicas = await hedge
+    res.images.update(next_replicas.images)
+    res.errors = {
+        path: next_replicas.errors.get(path, error)
+        for path, error in errors.items()
+        if path not in res.images
+    }
+    return res
+
+
+async def _fetch_shard_images(
+    shard: str, paths: List[str], replica: int
+) -> RawImagesBatch:
+    '''
+    Запрашивает изображения у узла шарда их реплик с номером replica. Если узел
+    не ответил за задержку хеджирования, ответил ошибкой или изображения на нем
+    нет, оно запрашивается у следующей реплики, а без нее попадает в errors
+    '''
+    paths_in_shard = {split_replicas(path)[replica][1]: path for path in paths}
+    request = asyncio.ensure_future(_get_shard_images(shard, paths_in_shard))
+    hedge: Optional['asyncio.Future[RawImagesBatch]'] = None
+    try:
+        if any(len(split_replicas(path)) > replica + 1 for path in paths):
+            delay = fetch_latency.get_delay(image_storage_settings.hedge_percentile)
+            done, _ = await asyncio.wait({request}, timeout=delay)
+            if not done:
+                metrics.inc('images_batch_fetch_hedged')
+                hedge = asyncio.ensure_future(
+                    _fetch_replicas_images(paths, replica + 1)
+                )
+        return await _join_replies(paths, replica, request, hedge)
+    finally:
+        request.cancel()
+        if hedge is not None:
+            hedge.cancel()
+
+
+async def _fetch_replicas_images(paths: List[str], replica: int) -> RawImagesBatch:
+    res = RawImagesBatch()
+    batches = await asyncio.gather(
+        *(
+            _fetch_shard_images(shard, shard_paths, replica)
+            for shard, shard_paths in group_by_shard(paths, replica).items()
+        )
+    )
+    for batch in batches:
+        res.images.update(batch.images)
+        res.errors.update(batch.errors)
+    return res
+
+
+async def _fetch_images(paths: List[Hashable]) -> RawImagesBatch:
+    '''
+    Запрашивает изображения у узлов шардов их первых реплик параллельно
+    '''
+    res = await _fetch_replicas_images(list(map(str, paths)), 0)
+    for path, image in res.images.items():
+        image_cache.put(path, image)
+    return res
+
+
+async def get_images_batch(paths: List[str]) -> RawImagesBatch:
+    '''
+    Получает изображения байтами за один запрос к каждому шарду хранилища,
+    запрашиваются только изображения не из кэша и не из загрузок других запросов.
+    Ненайденные изображения попадают в errors и не прерывают запрос
+    '''
+    res = RawImagesBatch()
+    missing = []
+    for path in dict.fromkeys(paths):
+        image = image_cache.get(path)
+        if image is None:
+            missing.append(path)
+        else:
+            res.images[path] = image
+    if not missing:
+        return res
+    batches = await images_batch_flight.do_many(missing, _fetch_images)
+    # в общих загрузках могут быть изображения, которые запрашивал другой запрос
+    for batch in batches:
+        for path in missing:
+            if path in batch.images:
+                res.images[path] = batch.images[path]
+            elif path in batch.errors:
+                res.errors[path] = batch.errors[path]
+    return res
+
+
+async def get_images(paths: List[ImagePath]) -> List[ImageWithPath]:
+    batch = await get_images_batch([p.path for p in paths])
+    return [
+        ImageWithPath(path=path, image=encode_bytes_to_base64(image))
+        for path, image in batch.images.items()
+    ]
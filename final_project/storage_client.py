@@ -1,70 +1,182 @@
-from asyncio import create_task
 from http import HTTPStatus
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Optional
 
 import aiohttp
 import requests
 from final_project.config import image_storage_settings
 from final_project.exceptions import StorageClientError, StorageError
-from final_project.models import Base64, ImagePath, ImageWithPath
-
-URL = f'http://{image_storage_settings.address}:{image_storage_settings.port}'
-IMAGES = f'{URL}/images'
-USER_IMAGES = f'{URL}/user-images'
-
-
-async def _get_image_from_storage_async(
-    params: Optional[Dict[str, Any]] = None
-) -> Dict[str, Any]:
-    async with aiohttp.ClientSession() as session:
-        async with session.get(IMAGES, params=params) as response:
-            status = response.status
-            if status != HTTPStatus.OK.value:
-                raise StorageClientError(await response.json())
-            return await response.json()
-
-
-async def get_image_from_storage_async(path: str) -> ImageWithPath:
-    try:
-        param = {'image_path': path}
-        return ImageWithPath.parse_obj(await _get_image_from_storage_async(param))
-    except StorageClientError as e:
-        raise StorageError(str(e))
-
-
-def _add_image_to_storage(json: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-    response = requests.post(IMAGES, json=json)
-    status = response.status_code
-    if status != HTTPStatus.CREATED.value:
+from final_project.sharding import HashRing, get_storage_nodes, split_replicas
+from requests.adapters import HTTPAdapter
+
+IMAGES = '/images'
+IMAGES_BATCH = f'{IMAGES}/batch'
+RAW_IMAGES = f'{IMAGES}/raw'
+RAW_IMAGES_BATCH = f'{RAW_IMAGES}/batch'
+SEGMENTS_COMPACTION = '/segments/compaction'
+
+
+class StorageClient:
+    '''
+    Узлы шардов хранилища и долгоживущие пулы соединений с ними:
+    асинхронный для API и синхронный для воркера
+    '''
+
+    def __init__(self, nodes: Dict[str, str]) -> None:
+        self.nodes = nodes
+        self.ring = HashRing(nodes, image_storage_settings.virtual_nodes)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._sync_session: Optional[requests.Session] = None
+
+    def get_node(self, shard: str) -> str:
+        if shard not in self.nodes:
+            raise StorageError(f'Unknown storage shard {shard}')
+        return self.nodes[shard]
+
+    async def open(self) -> None:
+        if self._session and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=image_storage_settings.connections_limit,
+            limit_per_host=image_storage_settings.connections_limit_per_host,
+            keepalive_timeout=image_storage_settings.keepalive_timeout,
+        )
+        timeout = aiohttp.ClientTimeout(total=image_storage_settings.fetch_timeout)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self) -> None:
+        if self._session:
+            await self._session.close()
+            self._session = None
+        if self._sync_session:
+            self._sync_session.close()
+            self._sync_session = None
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        '''
+        Сессия открывается при старте приложения,
+        но если этого не произошло - при первом запросе
+        '''
+        await self.open()
+        return self._session  # type: ignore
+
+    def get_sync_session(self) -> requests.Session:
+        if self._sync_session is None:
+            self._sync_session = requests.Session()
+            # у адаптера с одним пулом пул сбрасывался бы при смене узла
+            for node in self.nodes.values():
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=image_storage_settings.connections_limit_per_host,
+                )
+                self._sync_session.mount(node, adapter)
+        return self._sync_session
+
+    def warm_up(self) -> None:
+        '''
+        Открывает keep-alive соединение синхронной сессии с каждым узлом,
+        чтобы первая задача воркера не ждала установки соединений
+        '''
+        session = self.get_sync_session()
+        for node in self.nodes.values():
+            try:
+                session.head(node, timeout=image_storage_settings.request_timeout)
+            except requests.RequestException:
+                pass
+
+    def get_stats(self) -> Dict[str, int]:
+        '''
+        :return: лимиты пула, занятые и свободные keep-alive соединения
+        '''
+        stats = {
+            'limit': image_storage_settings.connections_limit,
+            'limit_per_host': image_storage_settings.connections_limit_per_host,
+            'acquired': 0,
+            'idle': 0,
+        }
+        if self._session and not self._session.closed:
+            connector = self._session.connector
+            stats['acquired'] = len(getattr(connector, '_acquired', ()))
+            idle = getattr(connector, '_conns', {}).values()
+            stats['idle'] = sum(len(conns) for conns in idle)
+        return stats
+
+
+client = StorageClient(get_storage_nodes())
+
+
+def post_images(
+    url: str, body: bytes, content_type: str, params: Optional[Dict[str, Any]] = None
+) -> Any:
+    '''
+    Отправляет изображения узлу хранилища синхронной сессией
+    :return: ответ узла о сохраненных изображениях
+    '''
+    response = client.get_sync_session().post(
+        url,
+        params=params,
+        data=body,
+        headers={'Content-Type': content_type},
+        timeout=image_storage_settings.request_timeout,
+    )
+    if response.status_code != HTTPStatus.CREATED.value:
         raise StorageClientError(response.json())
     return response.json()
 
 
-def save_image_to_storage(img: Base64, user_id: int) -> str:
-    try:
-        json = {'user_id': user_id, 'image': img.decode()}
-        return ImagePath.parse_obj(_add_image_to_storage(json)).path
-    except StorageClientError as error:
-        raise StorageError(str(error))
-
-
-async def _get_all_user_images(user_id: int) -> List[Dict[str, Any]]:
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f'{USER_IMAGES}/{user_id}') as response:
-            status = response.status
-            if status != HTTPStatus.OK.value:
-                raise StorageClientError(await response.json())
-            return await response.json()
-
-
-async def get_all_user_images(user_id: int) -> List[ImageWithPath]:
-    try:
-        res = await _get_all_user_images(user_id)
-    except StorageClientError as e:
-        raise StorageError(str(e))
-    return [ImageWithPath.parse_obj(item) for item in res]
-
-
-async def get_images(paths: List[ImagePath]) -> List[ImageWithPath]:
-    tasks = [create_task(get_image_from_storage_async(p.path)) for p in paths]
-    return [await t for t in tasks]
+def read_image_from_storage(path: str) -> bytes:
+    '''
+    Читает изображение из первой доступной реплики
+    '''
+    error = ''
+    for shard, shard_path in split_replicas(path):
+        try:
+            response = client.get_sync_session().get(
+                f'{client.get_node(shard)}{RAW_IMAGES}',
+                params={'image_path': shard_path},
+                timeout=image_storage_settings.request_timeout,
+            )
+        except requests.RequestException as e:
+            error = str(e)
+            continue
+        if response.status_code == HTTPStatus.OK.value:
+            return response.content
+        error = response.text
+    raise StorageError(error)
+
+
+def delete_image_from_storage(path: str) -> None:
+    '''
+    Удаляет все реплики изображения, даже если часть из них удалить не удалось
+    '''
+    errors = []
+    for shard, shard_path in split_replicas(path):
+        try:
+            response = client.get_sync_session().delete(
+                f'{client.get_node(shard)}{IMAGES}',
+                params={'image_path': shard_path},
+                timeout=image_storage_settings.request_timeout,
+            )
+        except requests.RequestException as e:
+            errors.append(str(e))
+            continue
+        if response.status_code != HTTPStatus.NO_CONTENT.value:
+            errors.append(response.text)
+    if errors:
+        raise StorageError('; '.join(errors))
+
+
+def compact_segments() -> int:
+    '''
+    Запускает компактификацию сегментов на всех узлах хранилища
+    :return: освобожденное место в байтах
+    '''
+    reclaimed = 0
+    for node in client.nodes.values():
+        response = client.get_sync_session().post(
+            f'{node}{SEGMENTS_COMPACTION}',
+            timeout=image_storage_settings.compaction_timeout,
+        )
+        if response.status_code != HTTPStatus.OK.value:
+            raise StorageError(response.text)
+        reclaimed += int(response.json()['reclaimed'])
+    return reclaimed
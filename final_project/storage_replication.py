@@ -0,0 +1,100 @@
+from concurrent.futures import Future  # pylint: disable=unused-import
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from functools import partial
+from typing import Any, Callable, Dict, Set, TypeVar
+
+import requests
+from final_project import storage_client
+from final_project.config import image_storage_settings
+from final_project.exceptions import StorageClientError, StorageError
+from final_project.hedging import LatencyWindow
+from final_project.models import ImagePath
+from final_project.sharding import Location, join_replicas, join_shard_path
+from final_project.storage_client import RAW_IMAGES
+from final_project.storage_transport import OCTET_STREAM
+
+T = TypeVar('T')
+
+fetch_latency = LatencyWindow(
+    image_storage_settings.hedge_window, image_storage_settings.hedge_delay_ms / 1000
+)
+
+
+def _add_image_to_storage(node: str, image: bytes, user_id: int) -> Dict[str, Any]:
+    return storage_client.post_images(
+        f'{node}{RAW_IMAGES}', image, OCTET_STREAM, {'user_id': user_id}
+    )
+
+
+def _add_replica(shard: str, image: bytes, user_id: int) -> Location:
+    res = _add_image_to_storage(storage_client.client.get_node(shard), image, user_id)
+    return shard, ImagePath.parse_obj(res).path
+
+
+def wait_write_quorum(
+    futures: Dict[str, 'Future[T]'],
+    has_quorum: Callable[[Dict[str, 'Future[T]']], bool],
+    delete_late: Callable[[str, 'Future[T]'], None],
+) -> Dict[str, 'Future[T]']:
+    '''
+    Ждет записи на шарды, пока завершенные записи не наберут кворум,
+    остальные записи ждет не дольше write_grace_ms. Для записей, которые
+    не успели, после завершения вызывается delete_late
+    :param futures: записи по id шардов
+    :return: завершенные записи по id шардов в порядке futures
+    '''
+    done: Set['Future[T]'] = set()
+    for future in as_completed(futures.values()):
+        done.add(future)
+        if has_quorum({k: f for k, f in futures.items() if f in done}):
+            break
+    grace = image_storage_settings.write_grace_ms / 1000
+    finished, _ = wait(set(futures.values()) - done, timeout=grace)
+    done |= finished
+    for shard, future in futures.items():
+        if future not in done:
+            future.add_done_callback(partial(delete_late, shard))
+    return {shard: future for shard, future in futures.items() if future in done}
+
+
+def _count_saved(futures: Dict[str, 'Future[Location]']) -> int:
+    return sum(future.exception() is None for future in futures.values())
+
+
+def _delete_late_replica(shard: str, future: 'Future[Location]') -> None:
+    if future.exception() is None:
+        _, path = future.result()
+        storage_client.delete_image_from_storage(join_shard_path(shard, path))
+
+
+def save_image_to_storage(img: bytes, user_id: int) -> str:
+    '''
+    Отправляет изображение байтами, без base64, на replication_factor шардов
+    пользователя параллельно. Сохранение успешно, если изображение записалось
+    хотя бы на write_quorum из них, медленные реплики не задерживают ответ
+    :return: пути к репликам изображения с id их шардов
+    '''
+    shards = storage_client.client.ring.get_user_shards(
+        user_id, image_storage_settings.replication_factor
+    )
+    quorum = min(image_storage_settings.write_quorum, len(shards))
+    executor = ThreadPoolExecutor(len(shards))
+    futures = {
+        shard: executor.submit(_add_replica, shard, img, user_id) for shard in shards
+    }
+    executor.shutdown(wait=False)
+    done = wait_write_quorum(
+        futures, lambda done: _count_saved(done) >= quorum, _delete_late_replica
+    )
+    saved = []
+    errors = []
+    for future in done.values():
+        try:
+            saved.append(future.result())
+        except (StorageClientError, requests.RequestException) as error:
+            errors.append(str(error))
+    if len(saved) < quorum:
+        if saved:
+            storage_client.delete_image_from_storage(join_replicas(saved))
+        raise StorageError('; '.join(errors))
+    return join_replicas(saved)
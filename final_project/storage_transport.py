@@ -0,0 +1,107 @@
+import json
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from final_project.models import RawImagesBatch
+
+OCTET_STREAM = 'application/octet-stream'
+MULTIPART_MIXED = 'multipart/mixed'
+JSON = 'application/json'
+# путь изображения в заголовке части multipart-ответа
+IMAGE_PATH_HEADER = 'X-Image-Path'
+# id пользователя в заголовке части multipart-запроса на сохранение изображений
+USER_ID_HEADER = 'X-User-Id'
+
+
+def _get_part(headers: List[Tuple[str, str]], body: bytes, boundary: str) -> bytes:
+    head = ''.join(f'{name}: {value}\r\n' for name, value in headers)
+    return f'--{boundary}\r\n{head}\r\n'.encode() + body + b'\r\n'
+
+
+def encode_multipart(batch: RawImagesBatch) -> Tuple[bytes, str]:
+    '''
+    Кодирует изображения частями multipart/mixed без base64,
+    последняя часть - json с ошибками
+    :return: тело и значение заголовка Content-Type
+    '''
+    boundary = uuid.uuid4().hex
+    parts = [
+        _get_part(
+            [('Content-Type', OCTET_STREAM), (IMAGE_PATH_HEADER, path)], image, boundary
+        )
+        for path, image in batch.images.items()
+    ]
+    errors = json.dumps(batch.errors).encode()
+    parts.append(_get_part([('Content-Type', JSON)], errors, boundary))
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'{MULTIPART_MIXED}; boundary={boundary}'
+
+
+def encode_images_upload(images: List[Tuple[bytes, int]]) -> Tuple[bytes, str]:
+    '''
+    Кодирует изображения пользователей частями multipart/mixed без base64
+    :return: тело и значение заголовка Content-Type
+    '''
+    boundary = uuid.uuid4().hex
+    parts = [
+        _get_part(
+            [('Content-Type', OCTET_STREAM), (USER_ID_HEADER, str(user_id))],
+            image,
+            boundary,
+        )
+        for image, user_id in images
+    ]
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'{MULTIPART_MIXED}; boundary={boundary}'
+
+
+async def read_images_batch(reader: AsyncIterator[Any]) -> RawImagesBatch:
+    '''
+    Читает ответ, закодированный encode_multipart, по частям
+    '''
+    res = RawImagesBatch()
+    async for part in reader:
+        path = part.headers.get(IMAGE_PATH_HEADER)
+        if path is None:
+            res.errors = await part.json()
+        else:
+            res.images[path] = await part.read()
+    return res
+
+
+def _get_boundary(content_type: str) -> str:
+    media_type, *params = content_type.split(';')
+    if media_type.strip().lower() != MULTIPART_MIXED:
+        raise ValueError(f'Not a {MULTIPART_MIXED} content type: {content_type}')
+    for param in params:
+        name, _, value = param.strip().partition('=')
+        if name.lower() == 'boundary' and value:
+            return value.strip('"')
+    raise ValueError('Multipart boundary is not set')
+
+
+def decode_multipart(
+    body: bytes, content_type: str
+) -> List[Tuple[Dict[str, str], bytes]]:
+    '''
+    Разбирает тело multipart/mixed на части
+    :return: заголовки частей с названиями в нижнем регистре и их содержимое
+    :raises ValueError: если тело не в формате multipart/mixed
+    '''
+    delimiter = f'\r\n--{_get_boundary(content_type)}'.encode()
+    sections = (b'\r\n' + body).split(delimiter)
+    if len(sections) < 2 or not sections[-1].startswith(b'--'):
+        raise ValueError('Multipart body is not closed')
+    res = []
+    for section in sections[1:-1]:
+        head, separator, content = section.partition(b'\r\n\r\n')
+        if not separator:
+            raise ValueError('Multipart part has no headers end')
+        headers = {}
+        for line in head.decode().split('\r\n'):
+            if not line:
+                continue
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        res.append((headers, content))
+    return res
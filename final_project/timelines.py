@@ -0,0 +1,58 @@
+from argparse import ArgumentParser
+from typing import List, Optional
+
+import sqlalchemy as sa
+from final_project.data_access_layer.timeline import TimelineDAL
+from final_project.database.database import create_session
+from final_project.database.models import User, user_subsriptions
+from final_project.redis import RedisInstances
+
+
+def rebuild_timelines(users_ids: Optional[List[int]] = None) -> int:
+    '''
+    Перестраивает таймлайны лент по БД, без users_ids - всех пользователей
+    :return: количество перестроенных таймлайнов
+    '''
+    redis = RedisInstances.sync_redis()
+    with create_session() as session:
+        if not users_ids:
+            users_ids = [id_ for id_, in session.query(User.id).order_by(User.id)]
+        for user_id in users_ids:
+            TimelineDAL.rebuild(redis, user_id, session)
+    return len(users_ids)
+
+
+def backfill_subscribers_count() -> int:
+    '''
+    Добавляет колонку subscribers_count в таблицу пользователей, созданную до нее,
+    и пересчитывает счетчики по подпискам. Без этого авторы, у которых уже
+    были подписчики, считались бы авторами с нулем подписчиков.
+    После пересчета таймлайны стоит перестроить rebuild_timelines
+    :return: количество обновленных пользователей
+    '''
+    with create_session() as session:
+        session.execute(
+            'ALTER TABLE "user" '
+            'ADD COLUMN IF NOT EXISTS subscribers_count INTEGER NOT NULL DEFAULT 0'
+        )
+        subscribers_count = (
+            sa.select([sa.func.count()])
+            .where(user_subsriptions.c.followed_id == User.id)
+            .as_scalar()
+        )
+        return session.query(User).update(
+            {User.subscribers_count: subscribers_count}, synchronize_session=False
+        )
+
+
+def start_rebuild_timelines() -> None:
+    parser = ArgumentParser(description='Rebuilds feed timelines stored in redis')
+    parser.add_argument('users_ids', nargs='*', type=int, help='default: all users')
+    args = parser.parse_args()
+    print(f'Rebuilt timelines: {rebuild_timelines(args.users_ids)}')
+
+
+def start_backfill_subscribers_count() -> None:
+    parser = ArgumentParser(description='Recounts subscribers of every user')
+    parser.parse_args()
+    print(f'Updated users: {backfill_subscribers_count()}')
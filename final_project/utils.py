@@ -1,10 +1,12 @@
 import base64
+from datetime import datetime
 from pathlib import Path
-from typing import List, TypeVar, Union
+from typing import Dict, List, Optional, Tuple, TypeVar, Union
 
 from final_project.database.models import Post as DB_Post
 from final_project.exceptions import PaginationError
 from final_project.messages import Message
+from final_project.metrics import metrics
 from final_project.models import (
     Base64,
     ImageWithPath,
@@ -13,6 +15,10 @@ from final_project.models import (
     PostWithImagePath,
 )
 
+MEGABYTE = 2 ** 20
+# вариант изображения поста, который хранится в image_path
+FULL_VARIANT = 'full'
+
 
 def rmtree(root: Path) -> None:
     for p in root.iterdir():
@@ -52,12 +58,61 @@ def get_pagination(objects: List[T], page: int, size: int) -> List[T]:
     return res
 
 
+def get_offset(page: int, size: int) -> int:
+    if page < 1 or size < 1:
+        raise PaginationError(Message.INVALID_PAGINATION_PARAMS.value)
+    return (page - 1) * size
+
+
+FEED_CURSOR_SEPARATOR = '|'
+
+
+def encode_feed_cursor(created_at: datetime, post_id: int) -> str:
+    raw = f'{created_at.isoformat()}{FEED_CURSOR_SEPARATOR}{post_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_feed_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, post_id = raw.split(FEED_CURSOR_SEPARATOR)
+        return datetime.fromisoformat(created_at), int(post_id)
+    except ValueError:
+        raise PaginationError(Message.INVALID_FEED_CURSOR.value)
+
+
+def get_variant_path(
+    post: Union[DB_Post, PostWithImagePath], variant: Optional[str] = None
+) -> str:
+    '''
+    Путь к варианту изображения поста. Для постов без этого варианта,
+    например сохраненных до его появления, - путь к исходному изображению
+    '''
+    if variant is None or variant == FULL_VARIANT or not post.image_variants:
+        return post.image_path
+    variants: Dict[str, str] = post.image_variants
+    return variants.get(variant, post.image_path)
+
+
 def join_posts_with_images(
-    posts: List[Union[DB_Post, PostWithImagePath]], images: List[ImageWithPath]
-) -> List[PostWithImage]:
+    posts: List[Union[DB_Post, PostWithImagePath]],
+    images: List[ImageWithPath],
+    variant: Optional[str] = None,
+) -> Tuple[List[PostWithImage], List[int]]:
+    '''
+    Добавляет к постам их изображения в варианте variant, сохраняя порядок постов.
+    Посты без изображения пропускаются и учитываются в метрике posts_without_image
+    :return: посты с изображениями и id постов, изображения которых не нашлись
+    '''
+    images_by_path = {img.path: img.image for img in images}
     res = []
-    for img in images:
-        for post in posts:
-            if post.image_path == img.path:
-                res.append(PostWithImage(**Post.from_orm(post).dict(), image=img.image))
-    return res
+    missing_ids = []
+    for post in posts:
+        image = images_by_path.get(get_variant_path(post, variant))
+        if image is None:
+            missing_ids.append(post.id)
+            continue
+        res.append(PostWithImage(**Post.from_orm(post).dict(), image=image))
+    if missing_ids:
+        metrics.inc('posts_without_image', len(missing_ids))
+    return res, missing_ids
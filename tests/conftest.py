@@ -1,15 +1,25 @@
+import os
 import pathlib
+import socket
+import subprocess
+import sys
+import time
 
 import psycopg2
 import pytest
+import requests
 import testing.postgresql
+from final_project import storage_client
 from final_project.app_creation import get_app
+from final_project.config import image_storage_settings
 from final_project.data_access_layer.users import UsersDataAccessLayer
 from final_project.database import database
+from final_project.image_cache import image_cache
 from final_project.image_processor.worker import _add_post_to_db
-from final_project.models import InPost, InUser, OutUser
+from final_project.models import InPost, InUser, OutUser, QueuedPost
 from final_project.redis import RedisInstances
-from final_project.utils import encode_bytes_to_base64
+from final_project.storage_client import StorageClient
+from final_project.utils import encode_bytes_to_base64, rmtree
 from mock import AsyncMock
 from PIL.Image import open as open_to_image
 from redis import Redis
@@ -17,6 +27,12 @@ from sqlalchemy import create_engine
 from starlette.testclient import TestClient
 
 
+@pytest.fixture(autouse=True)
+def _clear_image_cache():
+    yield
+    image_cache.clear()
+
+
 @pytest.fixture()
 def client():
     return TestClient(get_app())
@@ -164,6 +180,11 @@ def in_post():
     return InPost(image='1234', description='descr')
 
 
+@pytest.fixture()
+def queued_post():
+    return QueuedPost(image=b'1234', description='descr')
+
+
 @pytest.fixture()
 def uuid():
     return 'uuid'
@@ -177,3 +198,61 @@ def out_user_first(in_user):
 @pytest.fixture()
 def out_user_second(second_in_user):
     return OutUser(id=2, username=second_in_user.username)
+
+
+def _get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_node(url: str) -> None:
+    for _ in range(100):
+        try:
+            requests.get(f'{url}/images/raw', params={'image_path': '-'})
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Storage node {url} did not start')
+
+
+@pytest.fixture()
+def storage_nodes(resource_directory):
+    '''
+    Запускает два локальных узла хранилища, у каждого своя папка с изображениями
+    :return: адреса узлов по id их шардов
+    '''
+    nodes = {}
+    processes = []
+    folders = []
+    for shard in ('0', '1'):
+        port = _get_free_port()
+        folder_name = f'image-storage-node-{shard}'
+        env = {**os.environ, 'PORT': str(port), 'STORAGE_FOLDER_NAME': folder_name}
+        command = [sys.executable, '-m', 'uvicorn', 'final_project.api.storage:app']
+        processes.append(
+            subprocess.Popen(
+                [*command, '--port', str(port), '--log-level', 'warning'], env=env
+            )
+        )
+        folders.append(resource_directory.parent.parent / folder_name)
+        nodes[shard] = f'http://127.0.0.1:{port}'
+    try:
+        for url in nodes.values():
+            _wait_for_node(url)
+        yield nodes
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        for folder in folders:
+            if folder.exists():
+                rmtree(folder)
+
+
+@pytest.fixture()
+def _two_replicas(mocker):
+    nodes = {'0': 'http://node-0', '1': 'http://node-1'}
+    mocker.patch.object(storage_client, 'client', StorageClient(nodes))
+    mocker.patch.object(image_storage_settings, 'replication_factor', 2)
+    mocker.patch.object(image_storage_settings, 'write_quorum', 1)
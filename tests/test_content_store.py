@@ -0,0 +1,48 @@
+import pytest
+from final_project.data_access_layer.content_store import ContentStore
+
+
+@pytest.fixture()
+def store(tmp_path):
+    return ContentStore(tmp_path, '.png')
+
+
+def test_add_same_content_returns_same_path(store):
+    first = store.add(b'1234')
+    second = store.add(b'1234')
+    assert first == second
+    assert first.read_bytes() == b'1234'
+    assert store.get_refs(first) == 2
+
+
+def test_add_different_content_returns_different_paths(store):
+    assert store.add(b'1234') != store.add(b'5678')
+
+
+def test_path_is_sha256_of_content(store):
+    path = store.add(b'1234')
+    digest = '03ac674216f3e15c761ee1a5e255f067953623c8b388b4459e13f978d7c846f4'
+    assert path == store.get_path(digest)
+    assert path.name == f'{digest}.png'
+
+
+def test_release_keeps_file_while_referenced(store):
+    path = store.add(b'1234')
+    store.add(b'1234')
+    store.release(path)
+    assert path.exists()
+    assert store.get_refs(path) == 1
+
+
+def test_release_of_last_reference_deletes_file(store):
+    path = store.add(b'1234')
+    store.release(path)
+    assert not path.exists()
+    assert store.get_refs(path) == 0
+
+
+def test_release_of_file_without_refs_deletes_it(store, tmp_path):
+    path = tmp_path / 'image.png'
+    path.write_bytes(b'1234')
+    store.release(path)
+    assert not path.exists()
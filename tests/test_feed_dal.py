@@ -0,0 +1,83 @@
+import pytest
+from final_project.data_access_layer.feed import FeedDAL
+from final_project.data_access_layer.users import UsersDataAccessLayer
+from final_project.database.database import create_session
+from final_project.exceptions import PaginationError
+from final_project.image_processor.worker import _add_post_to_db
+
+
+@pytest.fixture()
+async def _add_posts_from_three_users(_add_user, _add_second_user, _add_third_user):
+    for i in range(6):
+        _add_post_to_db(i % 3 + 1, str(i), 'descr', None)
+
+
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_three_users')
+def test_get_page_returns_only_own_posts_without_subscriptions():
+    with create_session() as session:
+        posts = FeedDAL.get_page(1, 1, 10, session)
+        assert [p.image_path for p in posts] == ['0', '3']
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_three_users')
+async def test_get_page_returns_posts_of_subscriptions_in_creation_order():
+    await UsersDataAccessLayer.subscribe(1, 2)
+    with create_session() as session:
+        posts = FeedDAL.get_page(1, 1, 10, session)
+        assert [p.image_path for p in posts] == ['0', '1', '3', '4']
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_three_users')
+async def test_get_page_returns_exactly_size_posts():
+    await UsersDataAccessLayer.subscribe(1, 2)
+    await UsersDataAccessLayer.subscribe(1, 3)
+    with create_session() as session:
+        first_page = FeedDAL.get_page(1, 1, 4, session)
+        second_page = FeedDAL.get_page(1, 2, 4, session)
+        assert [p.image_path for p in first_page] == ['0', '1', '2', '3']
+        assert [p.image_path for p in second_page] == ['4', '5']
+
+
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_three_users')
+def test_get_page_after_end_of_feed_raises_error():
+    with create_session() as session, pytest.raises(PaginationError):
+        FeedDAL.get_page(1, 2, 2, session)
+
+
+@pytest.mark.usefixtures('_init_db', '_add_user')
+def test_get_page_of_empty_feed_returns_empty_list():
+    with create_session() as session:
+        assert FeedDAL.get_page(1, 2, 2, session) == []
+
+
+@pytest.mark.usefixtures('_init_db', '_add_user')
+def test_get_page_with_invalid_params_raises_error():
+    with create_session() as session, pytest.raises(PaginationError):
+        FeedDAL.get_page(1, 0, 10, session)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_three_users')
+async def test_get_page_after_cursor_continues_from_last_post():
+    await UsersDataAccessLayer.subscribe(1, 2)
+    with create_session() as session:
+        first_page = FeedDAL.get_page_after(1, None, 3, session)
+        last = first_page[-1]
+        second_page = FeedDAL.get_page_after(1, (last.created_at, last.id), 3, session)
+        assert [p.image_path for p in first_page] == ['0', '1', '3']
+        assert [p.image_path for p in second_page] == ['4']
+
+
+@pytest.mark.usefixtures('_init_db', '_add_user')
+def test_get_page_after_with_invalid_size_raises_error():
+    with create_session() as session, pytest.raises(PaginationError):
+        FeedDAL.get_page_after(1, None, 0, session)
+
+
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_three_users')
+def test_get_posts_by_ids_keeps_order_of_ids():
+    with create_session() as session:
+        posts = FeedDAL.get_posts_by_ids([5, 1, 100, 3], session)
+        assert [p.id for p in posts] == [5, 1, 3]
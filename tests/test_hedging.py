@@ -0,0 +1,24 @@
+from final_project.hedging import MIN_SAMPLES, LatencyWindow
+
+
+def test_default_delay_while_few_samples():
+    window = LatencyWindow(100, 0.05)
+    window.observe(1)
+    assert window.get_delay(0.95) == 0.05
+
+
+def test_delay_is_percentile_of_latencies():
+    window = LatencyWindow(100, 0.05)
+    for i in range(100):
+        window.observe(i / 100)
+    assert window.get_delay(0.95) == 0.95
+    assert window.get_delay(0.5) == 0.5
+
+
+def test_window_keeps_last_latencies():
+    window = LatencyWindow(MIN_SAMPLES, 0.05)
+    for _ in range(MIN_SAMPLES):
+        window.observe(1)
+    for _ in range(MIN_SAMPLES):
+        window.observe(0.1)
+    assert window.get_delay(1) == 0.1
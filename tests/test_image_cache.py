@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from final_project.image_cache import ImageCache
+
+
+@pytest.fixture()
+def cache():
+    return ImageCache(max_size=10)
+
+
+def test_get_returns_put_image(cache):
+    cache.put('path', b'1234')
+    assert cache.get('path') == b'1234'
+    assert cache.get_stats()['hits'] == 1
+
+
+def test_get_missing_image_counts_miss(cache):
+    assert cache.get('path') is None
+    assert cache.get_stats()['misses'] == 1
+
+
+def test_put_evicts_least_recently_used_image(cache):
+    cache.put('first', b'1234')
+    cache.put('second', b'1234')
+    cache.get('first')
+    cache.put('third', b'1234')
+    assert cache.get('second') is None
+    assert cache.get('first') == b'1234'
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1
+    assert stats['size'] == 8
+
+
+def test_put_skips_image_bigger_than_cache(cache):
+    cache.put('path', b'12345678901')
+    assert cache.get('path') is None
+    assert cache.get_stats()['size'] == 0
+
+
+def test_cache_with_zero_size_stores_nothing():
+    cache = ImageCache(max_size=0)
+    cache.put('path', b'1')
+    assert cache.get('path') is None
+
+
+def test_concurrent_puts_keep_size_within_limit(cache):
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda i: cache.put(str(i), b'123'), range(100)))
+    stats = cache.get_stats()
+    assert stats['size'] <= 10
+    assert stats['size'] == 3 * stats['items']
+
+
+def test_clear_resets_cache(cache):
+    cache.put('path', b'1234')
+    cache.clear()
+    assert cache.get_stats()['items'] == 0
+    assert cache.get('path') is None
@@ -0,0 +1,73 @@
+import os
+from io import BytesIO
+
+import pytest
+from final_project.config import ImageFormat
+from final_project.exceptions import DALError
+from final_project.image_formats import (
+    HEADER_SIZE,
+    detect_format,
+    encode_image,
+    negotiate_format,
+    transcode_image,
+)
+from PIL.Image import frombytes
+from PIL.Image import open as open_image
+
+
+@pytest.mark.parametrize('image_format', list(ImageFormat))
+def test_encode_image_detects_format(image_2x2, image_format):
+    image = encode_image(image_2x2, image_format, 80)
+    assert detect_format(image[:HEADER_SIZE]) == image_format
+
+
+def test_detect_format_of_unknown_bytes():
+    assert detect_format(b'1234') is None
+
+
+def test_encode_image_saves_progressive_jpeg(image_2x2, tmp_path):
+    path = tmp_path / 'image.jpeg'
+    path.write_bytes(encode_image(image_2x2.convert('RGBA'), ImageFormat.JPEG, 80))
+    image = open_image(path)
+    assert image.format == 'JPEG'
+    assert image.info.get('progressive')
+
+
+def test_lower_quality_encodes_smaller_image():
+    image = frombytes('RGB', (64, 64), os.urandom(64 * 64 * 3))
+    assert len(encode_image(image, ImageFormat.WEBP, 10)) < len(
+        encode_image(image, ImageFormat.WEBP, 100)
+    )
+
+
+def test_transcode_image(image_2x2_in_bytes):
+    image = transcode_image(image_2x2_in_bytes, ImageFormat.WEBP)
+    assert open_image(BytesIO(image)).format == 'WEBP'
+
+
+@pytest.mark.parametrize(
+    ('accept', 'expected'),
+    [
+        ('', None),
+        ('*/*', None),
+        ('application/octet-stream', None),
+        ('image/png', ImageFormat.PNG),
+        ('image/webp,image/*;q=0.8', ImageFormat.PNG),
+        ('image/webp, image/png;q=0', ImageFormat.WEBP),
+        ('image/jpeg;q=0.5, image/webp;q=0.9', ImageFormat.WEBP),
+        ('image/png;q=0, image/*', ImageFormat.WEBP),
+        ('image/jpeg, image/webp', ImageFormat.WEBP),
+    ],
+)
+def test_negotiate_format(accept, expected):
+    assert negotiate_format(accept, ImageFormat.PNG) == expected
+
+
+def test_negotiate_format_of_unknown_stored_format():
+    assert negotiate_format('image/webp', None) is None
+
+
+@pytest.mark.parametrize('accept', ['image/gif', 'image/png;q=0', 'image/webp;q=x'])
+def test_negotiate_format_when_nothing_is_acceptable(accept):
+    with pytest.raises(DALError):
+        negotiate_format(accept, ImageFormat.PNG)
@@ -0,0 +1,38 @@
+import threading
+
+import pytest
+from final_project.io_executor import IOExecutor
+
+
+@pytest.fixture()
+def executor():
+    executor = IOExecutor()
+    yield executor
+    executor.shutdown()
+
+
+def _get_thread_name() -> str:
+    return threading.current_thread().name
+
+
+@pytest.mark.asyncio
+async def test_run_returns_result(executor):
+    assert await executor.run(pow, 2, 3) == 8
+
+
+@pytest.mark.asyncio
+async def test_run_in_storage_io_thread(executor):
+    assert (await executor.run(_get_thread_name)).startswith('storage-io')
+
+
+@pytest.mark.asyncio
+async def test_run_raises_error_of_func(executor):
+    with pytest.raises(ZeroDivisionError):
+        await executor.run(divmod, 1, 0)
+
+
+@pytest.mark.asyncio
+async def test_run_after_shutdown(executor):
+    await executor.run(_get_thread_name)
+    executor.shutdown()
+    assert await executor.run(pow, 2, 3) == 8
@@ -0,0 +1,73 @@
+from itertools import count
+
+import pytest
+from final_project.config import FeedMode, feed_settings
+from final_project.data_access_layer.merge_feed import MergeFeedDAL, merge_streams
+from final_project.data_access_layer.users import UsersDataAccessLayer
+from final_project.database.database import create_session
+from final_project.exceptions import PaginationError
+from final_project.image_processor.worker import _add_post_to_db
+
+
+@pytest.fixture()
+async def _add_posts_from_three_users(_add_user, _add_second_user, _add_third_user):
+    for i in range(6):
+        _add_post_to_db(i % 3 + 1, str(i), 'descr', None)
+
+
+@pytest.fixture()
+def _prefetch_one(mocker):
+    mocker.patch.object(feed_settings, 'merge_prefetch', 1)
+
+
+def test_merge_streams_reads_only_requested_items_of_infinite_streams():
+    res = merge_streams([count(0, 2), count(1, 2)], 3, 4)
+    assert res == [3, 4, 5, 6]
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_three_users', '_prefetch_one')
+async def test_get_page_merges_streams_of_subscriptions():
+    await UsersDataAccessLayer.subscribe(1, 2)
+    await UsersDataAccessLayer.subscribe(1, 3)
+    with create_session() as session:
+        first_page = MergeFeedDAL.get_page(1, 1, 4, session)
+        second_page = MergeFeedDAL.get_page(1, 2, 4, session)
+        assert [p.image_path for p in first_page] == ['0', '1', '2', '3']
+        assert [p.image_path for p in second_page] == ['4', '5']
+
+
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_three_users')
+def test_get_page_after_end_of_merged_feed_raises_error():
+    with create_session() as session, pytest.raises(PaginationError):
+        MergeFeedDAL.get_page(1, 2, 2, session)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_three_users', '_prefetch_one')
+async def test_get_page_after_cursor_continues_merged_feed():
+    await UsersDataAccessLayer.subscribe(1, 2)
+    with create_session() as session:
+        first_page = MergeFeedDAL.get_page_after(1, None, 3, session)
+        last = first_page[-1]
+        cursor = last.created_at, last.id
+        second_page = MergeFeedDAL.get_page_after(1, cursor, 3, session)
+        assert [p.image_path for p in first_page] == ['0', '1', '3']
+        assert [p.image_path for p in second_page] == ['4']
+
+
+@pytest.mark.usefixtures('_init_db', '_add_user')
+def test_merged_get_page_after_with_invalid_size_raises_error():
+    with create_session() as session, pytest.raises(PaginationError):
+        MergeFeedDAL.get_page_after(1, None, 0, session)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_three_users')
+async def test_feed_in_merge_mode_uses_merged_streams(mocker):
+    mocker.patch.object(feed_settings, 'feed_mode', FeedMode.MERGE)
+    get_page = mocker.spy(MergeFeedDAL, 'get_page')
+    await UsersDataAccessLayer.subscribe(1, 3)
+    feed_page = await UsersDataAccessLayer.get_feed_posts_with_paths(1, 1, 10)
+    assert [p.image_path for p in feed_page.posts] == ['0', '2', '3', '5']
+    get_page.assert_called_once()
@@ -0,0 +1,36 @@
+from http import HTTPStatus
+
+import pytest
+from final_project.metrics import Metrics, metrics
+
+
+@pytest.fixture()
+def registry():
+    return Metrics()
+
+
+def test_counter_sums_increments(registry):
+    registry.inc('requests')
+    registry.inc('requests', 2)
+    assert registry.snapshot() == {'requests': 3}
+
+
+def test_distribution_snapshot(registry):
+    for value in [1, 3, 2]:
+        registry.observe('size', value)
+    assert registry.snapshot()['size'] == {
+        'count': 3,
+        'total': 6,
+        'mean': 2,
+        'max': 3,
+        'last': 2,
+    }
+
+
+def test_metrics_endpoint_returns_snapshot(client):
+    metrics.clear()
+    metrics.inc('requests')
+    response = client.get('/metrics/')
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['requests'] == 1
+    assert response.json()['storage_pool']['acquired'] == 0
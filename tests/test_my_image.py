@@ -1,6 +1,10 @@
+from io import BytesIO
+
 import pytest
+from final_project.config import image_cutting_settings, image_storage_settings
 from final_project.exceptions import MyImageError
 from final_project.image_processor.image import MyImage
+from PIL.Image import new
 
 
 @pytest.mark.parametrize('image_in_bytes', ['1x2.png', '1x1.png'], indirect=True)
@@ -18,6 +22,91 @@ def test_cut_image(image_in_bytes, aspect_resolution):
     assert my_image.height == my_image.width == aspect_resolution
 
 
+def _encode(image, image_format):
+    image_bytes = BytesIO()
+    image.save(image_bytes, image_format)
+    return image_bytes.getvalue()
+
+
+def test_cut_takes_center_square():
+    image = new('L', (6, 2))
+    image.paste(255, (2, 0, 4, 2))
+    my_image = MyImage(_encode(image, 'png'))
+    assert my_image.cut(2).tobytes() == b'\xff' * 4
+
+
+def test_cut_decodes_jpeg_in_reduced_scale(mocker):
+    draft = mocker.spy(MyImage, '_draft')
+    my_image = MyImage(_encode(new('RGB', (800, 400)), 'jpeg'))
+    assert my_image.cut(10).size == (10, 10)
+    image, box = draft.spy_return
+    assert image.size == (100, 50)
+    assert box == (25, 0, 75, 50)
+
+
+def test_make_variants_from_source_square_after_cut():
+    my_image = MyImage(_encode(new('RGB', (800, 400)), 'jpeg'))
+    my_image.cut(200, max_variant_size=150)
+    variants = my_image.make_variants({'thumbnail': 150, 'feed': 640})
+    assert {name: image.size for name, image in variants.items()} == {
+        'thumbnail': (150, 150)
+    }
+    assert my_image.width == 200
+
+
+def test_make_variants_are_smaller_than_full_image():
+    image = new('RGB', (400, 400))
+    image.putdata([(i % 256, i * 7 % 256, i * 13 % 256) for i in range(400 * 400)])
+    my_image = MyImage(_encode(image, 'png'))
+    my_image.cut(100, max_variant_size=150)
+    variants = my_image.make_variants({'thumbnail': 50, 'feed': 150})
+    assert {name: image.size for name, image in variants.items()} == {
+        'thumbnail': (50, 50)
+    }
+    encoded = my_image.encode_variants(variants)
+    assert len(encoded['thumbnail']) < len(my_image.encode())
+
+
+def test_make_variants_takes_center_square():
+    image = new('L', (60, 20))
+    image.paste(255, (20, 0, 40, 20))
+    my_image = MyImage(_encode(image, 'png'))
+    my_image.cut(20, max_variant_size=10)
+    feed = my_image.make_variants({'feed': 10})['feed']
+    assert feed.size == (10, 10)
+    assert min(feed.getpixel((0, 5)), feed.getpixel((9, 5))) > 200
+
+
 def test_image_constructor_will_fail_if_bytes_is_not_a_image():
     with pytest.raises(MyImageError):
         MyImage(b'123')
+
+
+@pytest.mark.parametrize('image_in_bytes', ['image_4x4.png'], indirect=True)
+def test_make_variants_skips_sizes_not_less_than_image(image_in_bytes):
+    my_image = MyImage(image_in_bytes)
+    variants = my_image.make_variants({'thumbnail': 1, 'feed': 2, 'big': 4})
+    assert {name: image.size for name, image in variants.items()} == {
+        'feed': (2, 2),
+        'thumbnail': (1, 1),
+    }
+    assert my_image.width == 4
+
+
+def test_save_variants(mocker, image_2x2):
+    save = mocker.patch(
+        'final_project.image_processor.image.save_image_to_storage',
+        side_effect=['path1', 'path2'],
+    )
+    res = MyImage.save_variants(1, {'thumbnail': image_2x2, 'feed': image_2x2})
+    assert res == {'thumbnail': 'path1', 'feed': 'path2'}
+    assert save.call_count == 2
+
+
+def test_save_variants_with_variant_quality(mocker, image_2x2):
+    mocker.patch('final_project.image_processor.image.save_image_to_storage')
+    encode = mocker.patch('final_project.image_processor.image.encode_image')
+    mocker.patch.object(image_cutting_settings, 'variants_quality', {'thumbnail': 10})
+    mocker.patch.object(image_storage_settings, 'image_quality', 90)
+    MyImage.save_variants(1, {'thumbnail': image_2x2, 'feed': image_2x2})
+    assert [call[0][2] for call in encode.call_args_list] == [10, 90]
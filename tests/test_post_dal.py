@@ -1,10 +1,12 @@
+import asyncio
+
 import pytest
 from final_project.data_access_layer.post import PostDAL
 from final_project.database.database import create_session
 from final_project.database.models import Post
 from final_project.exceptions import DALError, StorageError
 from final_project.messages import Message
-from final_project.models import ImageWithPath
+from final_project.models import RawImagesBatch
 from mock import AsyncMock
 
 
@@ -24,13 +26,13 @@ def _mocked_get_image(mocker):
 
 @pytest.fixture()
 def patched_storage_client(mocker):
-    return mocker.patch('final_project.data_access_layer.post.storage_client')
+    return mocker.patch('final_project.data_access_layer.post.storage_batch')
 
 
 @pytest.fixture()
-def mock_get_image_from_storage(patched_storage_client):
-    patched_storage_client.get_image_from_storage_async = AsyncMock(
-        return_value=ImageWithPath(image=b'1234', path='path')
+def mock_get_image_from_storage(patched_storage_client, image_path):
+    patched_storage_client.get_images_batch = AsyncMock(
+        return_value=RawImagesBatch(images={image_path: b'1234'})
     )
     return patched_storage_client
 
@@ -49,13 +51,35 @@ async def test_get_post_when_post_exists():
 @pytest.mark.asyncio
 @pytest.mark.usefixtures('_init_db', '_add_user', '_add_post')
 async def test__get_post_when_image_does_not_exists_on_storage(patched_storage_client):
-    patched_storage_client.get_image_from_storage_async = AsyncMock(
+    patched_storage_client.get_images_batch = AsyncMock(
         side_effect=StorageError(Message.IMAGE_DOES_NOT_EXISTS_ON_STORAGE.value)
     )
     with pytest.raises(DALError):
         await PostDAL.get_post(1)
 
 
+@pytest.mark.asyncio
+@pytest.mark.usefixtures(
+    '_init_db', '_add_user', '_add_post', 'mock_get_image_from_storage'
+)
+async def test_concurrent_get_post_loads_post_once(patched_storage_client):
+    first, second = await asyncio.gather(PostDAL.get_post(1), PostDAL.get_post(1))
+    assert first == second
+    patched_storage_client.get_images_batch.assert_called_once()
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_user', '_add_post')
+async def test_get_post_when_image_is_missing_in_batch(patched_storage_client):
+    patched_storage_client.get_images_batch = AsyncMock(
+        return_value=RawImagesBatch(
+            errors={'path': Message.IMAGE_DOES_NOT_EXISTS_ON_STORAGE.value}
+        )
+    )
+    with pytest.raises(DALError):
+        await PostDAL.get_post(1)
+
+
 @pytest.mark.asyncio
 @pytest.mark.usefixtures(
     '_init_db', '_add_user', '_add_post', 'mock_get_image_from_storage', '_add_like'
@@ -0,0 +1,76 @@
+from http import HTTPStatus
+
+import pytest
+from final_project.api.utils import MISSING_POSTS_HEADER
+from final_project.data_access_layer.posts import PostsDAL
+from final_project.image_processor.worker import _add_post_to_db
+from final_project.models import ImagePath, ImageWithPath, PostsPage
+from mock import AsyncMock
+from starlette.testclient import TestClient
+
+
+@pytest.fixture()
+def _add_posts(_add_user):
+    for i in range(3):
+        _add_post_to_db(
+            1,
+            str(i),
+            description='descr',
+            location=None,
+            image_variants={'thumbnail': f'thumbnail{i}'},
+        )
+
+
+@pytest.fixture()
+def mocked_get_images(mocker):
+    return mocker.patch(
+        'final_project.data_access_layer.posts.storage_batch.get_images',
+        AsyncMock(return_value=[ImageWithPath(path='0', image=b'1234')]),
+    )
+
+
+@pytest.mark.usefixtures('_init_db', '_add_posts')
+def test_get_posts_returns_page_with_images(client: TestClient, mocked_get_images):
+    response = client.get('/users/1/posts/?page=1&size=1')
+    assert response.status_code == HTTPStatus.OK
+    assert [post['image'] for post in response.json()] == ['1234']
+    assert MISSING_POSTS_HEADER not in response.headers
+
+
+@pytest.mark.usefixtures('_init_db', '_add_posts')
+def test_get_posts_lists_posts_without_images(client: TestClient, mocked_get_images):
+    response = client.get('/users/1/posts/?page=1&size=3')
+    assert response.status_code == HTTPStatus.OK
+    assert [post['id'] for post in response.json()] == [1]
+    assert response.headers[MISSING_POSTS_HEADER] == '2,3'
+
+
+@pytest.mark.usefixtures('_init_db', '_add_posts')
+def test_get_posts_without_images_returns_paths(client: TestClient, mocked_get_images):
+    response = client.get('/users/1/posts/?size=2&with_images=false')
+    assert response.status_code == HTTPStatus.OK
+    assert [post['image_path'] for post in response.json()] == ['0', '1']
+    assert 'image' not in response.json()[0]
+    mocked_get_images.assert_not_called()
+
+
+def test_get_posts_uses_default_page(client: TestClient, mocker):
+    get_posts = mocker.patch.object(
+        PostsDAL, 'get_posts', AsyncMock(return_value=PostsPage(posts=[]))
+    )
+    client.get('/users/1/posts/')
+    get_posts.assert_called_once_with(1, 1, 20, None)
+
+
+@pytest.mark.usefixtures('_init_db', '_add_posts')
+def test_get_posts_fetches_images_of_variant(client: TestClient, mocked_get_images):
+    mocked_get_images.return_value = [ImageWithPath(path='thumbnail0', image=b'1234')]
+    response = client.get('/users/1/posts/?size=1&variant=thumbnail')
+    assert response.status_code == HTTPStatus.OK
+    assert [post['image'] for post in response.json()] == ['1234']
+    assert mocked_get_images.call_args[0][0] == [ImagePath(path='thumbnail0')]
+
+
+def test_get_posts_with_unknown_variant(client: TestClient):
+    response = client.get('/users/1/posts/?variant=unknown')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
@@ -1,12 +1,16 @@
+from http import HTTPStatus
+
 import pytest
 from aioredis import Redis
+from final_project.config import worker_settings
 from final_project.data_access_layer.posts import PostsDAL
-from final_project.exceptions import DALError
+from final_project.exceptions import DALError, StorageError
 from final_project.image_processor.worker import _add_post_to_db, process_image
 from final_project.messages import Message
-from final_project.models import ImageWithPath
+from final_project.models import ImagePath, ImageWithPath, QueuedPost
 from final_project.redis import RedisInstances
 from final_project.redis_keys import RedisKey
+from final_project.utils import decode_base64_to_bytes
 from mock import AsyncMock
 from rq import Queue
 
@@ -57,7 +61,16 @@ async def test_add_post_raises_error_if_marked_himself(in_post):
 )
 async def test_add_post_add_task_to_redis_queue(in_post, uuid):
     await PostsDAL.add_post(1, in_post)
-    Queue.enqueue.assert_called_once_with(process_image, 1, in_post, uuid)
+    queued_post = QueuedPost(
+        image=decode_base64_to_bytes(in_post.image), description=in_post.description
+    )
+    Queue.enqueue.assert_called_once_with(
+        process_image,
+        1,
+        queued_post,
+        uuid,
+        failure_ttl=worker_settings.worker_failure_ttl,
+    )
 
 
 @pytest.mark.asyncio
@@ -126,19 +139,19 @@ async def test_get_task_status_when_task_not_exists(async_redis):
 @pytest.mark.usefixtures('_init_db', '_add_user')
 async def test_get_posts_when_user_does_not_have_posts():
     with pytest.raises(DALError):
-        await PostsDAL.get_posts(1)
+        await PostsDAL.get_posts(1, 1, 10)
 
 
 @pytest.mark.asyncio
 @pytest.mark.usefixtures('_init_db')
 async def test_get_posts_when_user_does_not_exists():
     with pytest.raises(DALError):
-        await PostsDAL.get_posts(1)
+        await PostsDAL.get_posts(1, 1, 10)
 
 
 @pytest.fixture()
 def mocked_storage_client(mocker):
-    return mocker.patch('final_project.data_access_layer.posts.storage_client')
+    return mocker.patch('final_project.data_access_layer.posts.storage_batch')
 
 
 @pytest.mark.asyncio
@@ -146,7 +159,7 @@ def mocked_storage_client(mocker):
 async def test_get_posts(mocked_storage_client, base64_2x2_image, base64_4x4_image):
     path1 = 'path1'
     path2 = 'path2'
-    mocked_storage_client.get_all_user_images = AsyncMock(
+    mocked_storage_client.get_images = AsyncMock(
         return_value=[
             ImageWithPath(image=base64_2x2_image, path=path1),
             ImageWithPath(image=base64_4x4_image, path=path2),
@@ -154,7 +167,47 @@ async def test_get_posts(mocked_storage_client, base64_2x2_image, base64_4x4_ima
     )
     _add_post_to_db(1, path1, description='with_2x2_image', location='1')
     _add_post_to_db(1, path2, description='wth_4x4_image', location='2')
-    posts = await PostsDAL.get_posts(1)
-    posts.sort(key=lambda post: post.id)
-    assert posts[0].image == base64_2x2_image
-    assert posts[1].image == base64_4x4_image
+    posts_page = await PostsDAL.get_posts(1, 1, 10)
+    assert posts_page.posts[0].image == base64_2x2_image
+    assert posts_page.posts[1].image == base64_4x4_image
+    assert posts_page.missing_posts_ids == []
+
+
+@pytest.fixture()
+def _add_five_posts(_add_user):
+    for i in range(5):
+        _add_post_to_db(1, str(i), description='descr', location=None)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_five_posts')
+async def test_get_posts_requests_only_images_of_page(mocked_storage_client):
+    mocked_storage_client.get_images = AsyncMock(return_value=[])
+    await PostsDAL.get_posts(1, 2, 2)
+    mocked_storage_client.get_images.assert_called_once_with(
+        [ImagePath(path='2'), ImagePath(path='3')]
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_five_posts')
+async def test_get_posts_with_paths_returns_page():
+    posts = await PostsDAL.get_posts_with_paths(1, 3, 2)
+    assert [post.image_path for post in posts] == ['4']
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_five_posts')
+@pytest.mark.parametrize(('page', 'size'), [(4, 2), (0, 2), (1, 0)])
+async def test_get_posts_with_paths_with_invalid_page(page, size):
+    with pytest.raises(DALError) as error:
+        await PostsDAL.get_posts_with_paths(1, page, size)
+    assert error.value.status_code == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_five_posts')
+async def test_get_posts_when_storage_fails(mocked_storage_client):
+    mocked_storage_client.get_images = AsyncMock(side_effect=StorageError('error'))
+    with pytest.raises(DALError):
+        await PostsDAL.get_posts(1, 1, 2)
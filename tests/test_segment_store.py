@@ -0,0 +1,64 @@
+import pytest
+from final_project.data_access_layer.segment_store import SegmentStore
+
+
+@pytest.fixture()
+def store(tmp_path):
+    store = SegmentStore(tmp_path, 8)
+    yield store
+    store.close()
+
+
+def test_read_added_data(store):
+    first = store.add(b'1234')
+    second = store.add(b'5678')
+    assert store.read(first) == b'1234'
+    assert store.read(second) == b'5678'
+
+
+def test_read_not_existing_key(store):
+    assert store.read('missing') is None
+
+
+def test_add_rotates_full_segment(store, tmp_path):
+    for _ in range(3):
+        store.add(b'12345')
+    assert len(list(tmp_path.glob('*.segment'))) == 3
+
+
+def test_delete(store):
+    key = store.add(b'1234')
+    assert store.delete(key)
+    assert store.read(key) is None
+    assert not store.delete(key)
+
+
+def test_index_is_loaded_on_open(store, tmp_path):
+    kept = store.add(b'1234')
+    deleted = store.add(b'5678')
+    store.delete(deleted)
+    store.close()
+    reopened = SegmentStore(tmp_path, 8)
+    assert reopened.read(kept) == b'1234'
+    assert reopened.read(deleted) is None
+    reopened.close()
+
+
+def test_compact_reclaims_deleted_entries(store, tmp_path):
+    kept = store.add(b'1234')
+    deleted = store.add(b'5678')
+    store.add(b'12345678')
+    store.delete(deleted)
+    assert store.compact() == 4
+    assert store.read(kept) == b'1234'
+    assert not (tmp_path / '000000.segment').exists()
+    store.close()
+    reopened = SegmentStore(tmp_path, 8)
+    assert reopened.read(kept) == b'1234'
+    reopened.close()
+
+
+def test_compact_skips_active_segment(store):
+    key = store.add(b'1234')
+    store.delete(key)
+    assert store.compact() == 0
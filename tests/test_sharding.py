@@ -0,0 +1,156 @@
+from collections import Counter
+
+import pytest
+from final_project import storage_client
+from final_project.config import image_storage_settings
+from final_project.database.database import create_session
+from final_project.database.models import Post, User
+from final_project.exceptions import StorageError
+from final_project.rebalance import rebalance_images
+from final_project.sharding import (
+    DEFAULT_SHARD,
+    HashRing,
+    group_by_shard,
+    join_replicas,
+    join_shard_path,
+    split_replicas,
+    split_shard_path,
+)
+from final_project.storage_batch import get_images_batch
+from final_project.storage_client import (
+    StorageClient,
+    delete_image_from_storage,
+    read_image_from_storage,
+)
+from final_project.storage_replication import save_image_to_storage
+
+USERS_COUNT = 10
+
+
+def test_ring_returns_same_shard_for_key():
+    ring = HashRing(['0', '1'], 100)
+    assert ring.get_shard('key') == HashRing(['1', '0'], 100).get_shard('key')
+
+
+def test_ring_spreads_users_over_shards():
+    ring = HashRing(['0', '1', '2'], 100)
+    shards = Counter(ring.get_user_shard(user_id) for user_id in range(3000))
+    assert set(shards) == {'0', '1', '2'}
+    assert min(shards.values()) > 500
+
+
+def test_adding_shard_moves_only_its_keys():
+    old = HashRing(['0', '1'], 100)
+    new = HashRing(['0', '1', '2'], 100)
+    for user_id in range(1000):
+        if old.get_user_shard(user_id) != new.get_user_shard(user_id):
+            assert new.get_user_shard(user_id) == '2'
+
+
+def test_ring_returns_distinct_shards():
+    ring = HashRing(['0', '1', '2'], 100)
+    shards = ring.get_shards('key', 2)
+    assert len(set(shards)) == 2
+    assert shards[0] == ring.get_shard('key')
+    assert sorted(ring.get_shards('key', 5)) == ['0', '1', '2']
+
+
+def test_split_replicas():
+    locations = [('0', '/a.png'), ('1', '/b.png')]
+    assert split_replicas(join_replicas(locations)) == locations
+
+
+def test_split_shard_path():
+    assert split_shard_path(join_shard_path('1', '/a/b.png')) == ('1', '/a/b.png')
+
+
+def test_path_without_shard_belongs_to_default_shard():
+    assert split_shard_path('/a/b.png') == (DEFAULT_SHARD, '/a/b.png')
+
+
+def test_group_by_shard():
+    assert group_by_shard(['0:a', '1:b|0:b', 'c']) == {
+        '0': ['0:a', 'c'],
+        '1': ['1:b|0:b'],
+    }
+
+
+def test_group_by_shard_of_next_replica():
+    assert group_by_shard(['0:a', '1:b|0:b', '0:c|1:c'], replica=1) == {
+        '0': ['1:b|0:b'],
+        '1': ['0:c|1:c'],
+    }
+
+
+@pytest.fixture()
+def _sharded_client(mocker, storage_nodes):
+    mocker.patch.object(storage_client, 'client', StorageClient(storage_nodes))
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_sharded_client')
+async def test_images_are_saved_to_user_shards(image_2x2_in_bytes):
+    users_ids = range(1, USERS_COUNT + 1)
+    paths = [save_image_to_storage(image_2x2_in_bytes, i) for i in users_ids]
+    for user_id, path in zip(users_ids, paths):
+        shard = storage_client.client.ring.get_user_shard(user_id)
+        assert split_shard_path(path)[0] == shard
+    assert {split_shard_path(path)[0] for path in paths} == {'0', '1'}
+    batch = await get_images_batch(paths)
+    assert batch.images == {path: image_2x2_in_bytes for path in paths}
+    await storage_client.client.close()
+
+
+@pytest.fixture()
+def _users():
+    with create_session() as session:
+        session.add_all(User(username=str(i)) for i in range(USERS_COUNT))
+
+
+@pytest.mark.usefixtures('_init_db', '_users')
+def test_rebalance_moves_images_to_added_shard(
+    mocker, storage_nodes, image_2x2_in_bytes
+):
+    mocker.patch.object(
+        storage_client, 'client', StorageClient({'0': storage_nodes['0']})
+    )
+    with create_session() as session:
+        for user in session.query(User):
+            path = save_image_to_storage(image_2x2_in_bytes, user.id)
+            variant_path = save_image_to_storage(image_2x2_in_bytes, user.id)
+            session.add(
+                Post(
+                    user_id=user.id,
+                    image_path=path,
+                    image_variants={'thumbnail': variant_path},
+                )
+            )
+    mocker.patch.object(storage_client, 'client', StorageClient(storage_nodes))
+    ring = storage_client.client.ring
+    with create_session() as session:
+        expected_moves = sum(
+            ring.get_user_shard(user_id) != DEFAULT_SHARD
+            for user_id, in session.query(User.id)
+        )
+    assert expected_moves
+    assert rebalance_images() == 2 * expected_moves
+    assert rebalance_images() == 0
+    with create_session() as session:
+        posts = session.query(Post.user_id, Post.image_path, Post.image_variants)
+        for user_id, path, variants in posts:
+            for image_path in (path, variants['thumbnail']):
+                assert split_shard_path(image_path)[0] == ring.get_user_shard(user_id)
+                assert read_image_from_storage(image_path) == image_2x2_in_bytes
+
+
+@pytest.mark.usefixtures('_sharded_client')
+def test_replicated_image_is_readable_from_each_replica(mocker, image_2x2_in_bytes):
+    mocker.patch.object(image_storage_settings, 'replication_factor', 2)
+    path = save_image_to_storage(image_2x2_in_bytes, 1)
+    replicas = split_replicas(path)
+    assert {shard for shard, _ in replicas} == {'0', '1'}
+    for replica in replicas:
+        assert read_image_from_storage(join_replicas([replica])) == image_2x2_in_bytes
+    delete_image_from_storage(path)
+    with pytest.raises(StorageError):
+        read_image_from_storage(path)
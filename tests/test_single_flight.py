@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from final_project.metrics import metrics
+from final_project.single_flight import SingleFlight
+
+
+@pytest.fixture()
+def flight():
+    metrics.clear()
+    return SingleFlight('test')
+
+
+@pytest.fixture()
+def calls():
+    return []
+
+
+@pytest.fixture()
+def load(calls):
+    async def _load(keys):
+        calls.append(keys)
+        await asyncio.sleep(0.01)
+        return {key: f'value {key}' for key in keys}
+
+    return _load
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_load(flight, load, calls):
+    res = await asyncio.gather(
+        *[flight.do('key', lambda: load(['key'])) for _ in range(5)]
+    )
+    assert res == [{'key': 'value key'}] * 5
+    assert calls == [['key']]
+    assert metrics.snapshot()['test_deduplicated'] == 4
+
+
+@pytest.mark.asyncio
+async def test_sequential_calls_load_again(flight, load, calls):
+    await flight.do('key', lambda: load(['key']))
+    await flight.do('key', lambda: load(['key']))
+    assert calls == [['key'], ['key']]
+
+
+@pytest.mark.asyncio
+async def test_do_many_loads_only_keys_not_in_flight(flight, load, calls):
+    first = asyncio.ensure_future(flight.do_many(['a', 'b'], load))
+    await asyncio.sleep(0)
+    second = await flight.do_many(['b', 'c'], load)
+    assert calls == [['a', 'b'], ['c']]
+    assert second == [{'a': 'value a', 'b': 'value b'}, {'c': 'value c'}]
+    await first
+
+
+@pytest.mark.asyncio
+async def test_error_is_shared_and_not_remembered(flight, calls):
+    async def _fail():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError()
+
+    res = await asyncio.gather(
+        flight.do('key', _fail), flight.do('key', _fail), return_exceptions=True
+    )
+    assert all(isinstance(error, ValueError) for error in res)
+    with pytest.raises(ValueError):
+        await flight.do('key', _fail)
+    assert calls == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_load(flight, load):
+    first = asyncio.ensure_future(flight.do('key', lambda: load(['key'])))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(flight.do('key', lambda: load(['key'])))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == {'key': 'value key'}
@@ -0,0 +1,326 @@
+import asyncio
+import threading
+from asyncio import get_event_loop
+from http import HTTPStatus
+
+import aiohttp
+import pytest
+import requests
+from final_project import storage_client
+from final_project.config import image_storage_settings
+from final_project.exceptions import StorageClientError, StorageError
+from final_project.image_cache import image_cache
+from final_project.metrics import metrics
+from final_project.messages import Message
+from final_project.models import ImagePath, ImageWithPath, RawImagesBatch
+from final_project.storage_batch import (
+    _add_images_to_storage,
+    get_images,
+    get_images_batch,
+    save_images_to_storage,
+)
+from final_project.storage_transport import (
+    USER_ID_HEADER,
+    decode_multipart,
+    encode_multipart,
+    read_images_batch,
+)
+from mock import MagicMock
+
+NODE = 'http://storage:8001'
+
+
+@pytest.fixture()
+def mock_get_images_batch(mocker):
+    return mocker.patch('final_project.storage_batch._get_images_batch')
+
+
+@pytest.mark.asyncio
+async def test_get_images_makes_one_request_and_skips_missing(
+    mock_get_images_batch, image_2x2_in_bytes, base64_2x2_image
+):
+    mock_get_images_batch.return_value = RawImagesBatch(
+        images={'path': image_2x2_in_bytes},
+        errors={'missing': Message.IMAGE_DOES_NOT_EXISTS_ON_STORAGE.value},
+    )
+    res = await get_images([ImagePath(path='path'), ImagePath(path='missing')])
+    assert res == [ImageWithPath(image=base64_2x2_image, path='path')]
+    mock_get_images_batch.assert_called_once_with(NODE, {'paths': ['path', 'missing']})
+
+
+@pytest.mark.asyncio
+async def test_get_images_batch_without_paths_does_not_make_request(
+    mock_get_images_batch,
+):
+    res = await get_images_batch([])
+    assert res.images == {}
+    mock_get_images_batch.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_images_batch_when_got_unexpecting_response_status(
+    mock_get_images_batch,
+):
+    mock_get_images_batch.side_effect = StorageClientError('error')
+    res = await get_images_batch(['path'])
+    assert res.images == {}
+    assert res.errors == {'path': 'error'}
+
+
+def test_add_images_to_storage_sends_multipart(mocker):
+    session = mocker.patch(
+        'final_project.storage_client.client.get_sync_session'
+    ).return_value
+    session.post.return_value.status_code = HTTPStatus.CREATED.value
+    session.post.return_value.json.return_value = [{'path': 'a'}, {'path': 'b'}]
+    res = _add_images_to_storage(NODE, [(b'1234', 1), (b'5678', 2)])
+    assert res == [{'path': 'a'}, {'path': 'b'}]
+    parts = decode_multipart(
+        session.post.call_args[1]['data'],
+        session.post.call_args[1]['headers']['Content-Type'],
+    )
+    assert [(headers[USER_ID_HEADER.lower()], body) for headers, body in parts] == [
+        ('1', b'1234'),
+        ('2', b'5678'),
+    ]
+
+
+def test_add_images_to_storage_when_got_unexpecting_response_status(mocker):
+    session = mocker.patch(
+        'final_project.storage_client.client.get_sync_session'
+    ).return_value
+    session.post.return_value.status_code = HTTPStatus.BAD_REQUEST.value
+    with pytest.raises(StorageClientError):
+        _add_images_to_storage(NODE, [(b'1234', 1)])
+
+
+@pytest.mark.asyncio
+async def test_read_images_batch_decodes_multipart(image_2x2_in_bytes):
+    batch = RawImagesBatch(
+        images={'path': image_2x2_in_bytes},
+        errors={'missing': Message.IMAGE_DOES_NOT_EXISTS_ON_STORAGE.value},
+    )
+    body, content_type = encode_multipart(batch)
+    stream = aiohttp.StreamReader(MagicMock(), limit=2 ** 16, loop=get_event_loop())
+    stream.feed_data(body)
+    stream.feed_eof()
+    reader = aiohttp.MultipartReader({'Content-Type': content_type}, stream)
+    assert await read_images_batch(reader) == batch
+
+
+@pytest.mark.asyncio
+async def test_get_images_batch_requests_only_not_cached_images(
+    mock_get_images_batch, image_2x2_in_bytes
+):
+    image_cache.put('cached', b'1234')
+    mock_get_images_batch.return_value = RawImagesBatch(
+        images={'path': image_2x2_in_bytes}
+    )
+    res = await get_images_batch(['cached', 'path'])
+    assert res.images == {'cached': b'1234', 'path': image_2x2_in_bytes}
+    mock_get_images_batch.assert_called_once_with(NODE, {'paths': ['path']})
+    assert image_cache.get('path') == image_2x2_in_bytes
+
+
+@pytest.mark.asyncio
+async def test_get_images_batch_when_all_images_cached(mock_get_images_batch):
+    image_cache.put('cached', b'1234')
+    res = await get_images_batch(['cached'])
+    assert res.images == {'cached': b'1234'}
+    mock_get_images_batch.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_get_images_batch_fetch_each_image_once(
+    mock_get_images_batch,
+):
+    async def _get_images_batch(node, json):
+        await asyncio.sleep(0.01)
+        return RawImagesBatch(images={path: b'1234' for path in json['paths']})
+
+    mock_get_images_batch.side_effect = _get_images_batch
+    first, second = await asyncio.gather(
+        get_images_batch(['a', 'b']), get_images_batch(['b', 'c'])
+    )
+    assert first.images == {'a': b'1234', 'b': b'1234'}
+    assert second.images == {'b': b'1234', 'c': b'1234'}
+    requested = [call[0][1]['paths'] for call in mock_get_images_batch.call_args_list]
+    assert requested == [['a', 'b'], ['c']]
+
+
+@pytest.mark.usefixtures('_two_replicas')
+@pytest.mark.asyncio
+async def test_get_images_batch_from_next_replica_when_node_is_unavailable(
+    mock_get_images_batch,
+):
+    async def _get_images_batch(node, json):
+        if node == 'http://node-0':
+            raise aiohttp.ClientConnectionError('error')
+        return RawImagesBatch(images={path: b'1234' for path in json['paths']})
+
+    mock_get_images_batch.side_effect = _get_images_batch
+    res = await get_images_batch(['0:a|1:b', '1:c|0:c'])
+    assert res.images == {'0:a|1:b': b'1234', '1:c|0:c': b'1234'}
+    mock_get_images_batch.assert_any_call('http://node-1', {'paths': ['b']})
+
+
+@pytest.mark.usefixtures('_two_replicas')
+@pytest.mark.asyncio
+async def test_get_images_batch_from_next_replica_when_image_is_missing(
+    mock_get_images_batch,
+):
+    async def _get_images_batch(node, json):
+        if node == 'http://node-0':
+            return RawImagesBatch(errors={'a': 'error', 'b': 'error'})
+        return RawImagesBatch(images={'c': b'1234'}, errors={'d': 'not found'})
+
+    mock_get_images_batch.side_effect = _get_images_batch
+    res = await get_images_batch(['0:a|1:c', '0:b|1:d'])
+    assert res.images == {'0:a|1:c': b'1234'}
+    assert res.errors == {'0:b|1:d': 'not found'}
+
+
+@pytest.mark.usefixtures('_two_replicas')
+@pytest.mark.asyncio
+async def test_get_images_batch_when_all_replicas_are_unavailable(
+    mock_get_images_batch,
+):
+    mock_get_images_batch.side_effect = aiohttp.ClientConnectionError('error')
+    res = await get_images_batch(['0:a|1:b'])
+    assert res.images == {}
+    assert res.errors == {'0:a|1:b': 'error'}
+
+
+@pytest.mark.usefixtures('_two_replicas')
+@pytest.mark.asyncio
+async def test_get_images_batch_keeps_images_of_available_shards(
+    mock_get_images_batch,
+):
+    async def _get_images_batch(node, json):
+        if node == 'http://node-0':
+            raise aiohttp.ClientConnectionError('error')
+        return RawImagesBatch(images={path: b'1234' for path in json['paths']})
+
+    mock_get_images_batch.side_effect = _get_images_batch
+    res = await get_images_batch(['0:a', '1:b'])
+    assert res.images == {'1:b': b'1234'}
+    assert res.errors == {'0:a': 'error'}
+
+
+@pytest.mark.usefixtures('_two_replicas')
+@pytest.mark.asyncio
+async def test_get_images_batch_records_unknown_shard_as_error(mock_get_images_batch,):
+    mock_get_images_batch.return_value = RawImagesBatch(images={'a': b'1234'})
+    res = await get_images_batch(['0:a', '9:b'])
+    assert res.images == {'0:a': b'1234'}
+    assert res.errors == {'9:b': 'Unknown storage shard 9'}
+    mock_get_images_batch.assert_called_once_with('http://node-0', {'paths': ['a']})
+
+
+@pytest.fixture()
+def mock_get_images_from_replicas(mock_get_images_batch):
+    def _mock(delays):
+        async def _get_images_batch(node, json):
+            await asyncio.sleep(delays[node])
+            return RawImagesBatch(
+                images={path: node.encode() for path in json['paths']}
+            )
+
+        mock_get_images_batch.side_effect = _get_images_batch
+
+    return _mock
+
+
+@pytest.mark.usefixtures('_two_replicas')
+@pytest.mark.asyncio
+async def test_get_images_batch_hedges_slow_node(mock_get_images_from_replicas):
+    metrics.clear()
+    mock_get_images_from_replicas({'http://node-0': 1, 'http://node-1': 0})
+    res = await get_images_batch(['0:a|1:b', '0:c'])
+    assert res.images == {'0:a|1:b': b'http://node-1', '0:c': b'http://node-0'}
+    assert metrics.snapshot()['images_batch_fetch_hedged'] == 1
+
+
+@pytest.mark.usefixtures('_two_replicas')
+@pytest.mark.asyncio
+async def test_get_images_batch_does_not_hedge_fast_node(
+    mock_get_images_from_replicas, mock_get_images_batch
+):
+    metrics.clear()
+    mock_get_images_from_replicas({'http://node-0': 0, 'http://node-1': 0})
+    res = await get_images_batch(['0:a|1:b'])
+    assert res.images == {'0:a|1:b': b'http://node-0'}
+    assert 'images_batch_fetch_hedged' not in metrics.snapshot()
+    mock_get_images_batch.assert_called_once()
+
+
+@pytest.mark.usefixtures('_two_replicas')
+@pytest.mark.asyncio
+async def test_get_images_batch_from_next_replica_after_timeout(mock_get_images_batch,):
+    async def _get_images_batch(node, json):
+        if node == 'http://node-0':
+            raise asyncio.TimeoutError()
+        return RawImagesBatch(images={path: b'1234' for path in json['paths']})
+
+    mock_get_images_batch.side_effect = _get_images_batch
+    res = await get_images_batch(['0:a|1:b'])
+    assert res.images == {'0:a|1:b': b'1234'}
+
+
+@pytest.fixture()
+def mock_add_images_to_storage(mocker):
+    return mocker.patch('final_project.storage_batch._add_images_to_storage')
+
+
+@pytest.mark.usefixtures('_two_replicas')
+def test_save_images_to_storage_sends_one_request_per_shard(
+    mocker, mock_add_images_to_storage
+):
+    mocker.patch.object(image_storage_settings, 'write_quorum', 2)
+    delete = mocker.patch('final_project.storage_client.delete_image_from_storage')
+    results = {
+        'http://node-0': [{'path': 'a'}, {'error': 'error'}],
+        'http://node-1': [{'path': 'b'}, {'path': 'c'}],
+    }
+    mock_add_images_to_storage.side_effect = lambda node, images: results[node]
+    first, second = save_images_to_storage([(b'1', 1), (b'2', 1)])
+    assert mock_add_images_to_storage.call_count == 2
+    shards = storage_client.client.ring.get_user_shards(1, 2)
+    paths = {'0': 'a', '1': 'b'}
+    assert first == '|'.join(f'{shard}:{paths[shard]}' for shard in shards)
+    assert isinstance(second, StorageError)
+    delete.assert_called_once_with('1:c')
+
+
+@pytest.mark.usefixtures('_two_replicas')
+def test_save_images_to_storage_when_shard_is_unavailable(mock_add_images_to_storage):
+    def _add_images(node, images):
+        if node == 'http://node-0':
+            raise requests.ConnectionError('error')
+        return [{'path': 'path'} for _ in images]
+
+    mock_add_images_to_storage.side_effect = _add_images
+    assert save_images_to_storage([(b'1', 1), (b'2', 1)]) == ['1:path', '1:path']
+
+
+@pytest.mark.usefixtures('_two_replicas')
+def test_save_images_to_storage_does_not_wait_slow_shard(
+    mocker, mock_add_images_to_storage
+):
+    mocker.patch.object(image_storage_settings, 'write_grace_ms', 0)
+    slow_shard = threading.Event()
+    deleted = threading.Event()
+    delete = mocker.patch('final_project.storage_client.delete_image_from_storage')
+    delete.side_effect = lambda path: deleted.set()
+
+    def _add_images(node, images):
+        if node == 'http://node-1':
+            slow_shard.wait()
+            return [{'path': 'late'} for _ in images]
+        return [{'path': 'path'} for _ in images]
+
+    mock_add_images_to_storage.side_effect = _add_images
+    assert save_images_to_storage([(b'1', 1)]) == ['0:path']
+    slow_shard.set()
+    assert deleted.wait(1)
+    delete.assert_called_once_with('1:late')
@@ -1,87 +1,101 @@
 from http import HTTPStatus
 
 import pytest
+import requests
+from final_project import storage_client as storage_client_module
+from final_project.config import image_storage_settings
 from final_project.exceptions import StorageClientError, StorageError
 from final_project.messages import Message
 from final_project.models import ImageWithPath
+from final_project.sharding import get_storage_nodes
 from final_project.storage_client import (
-    get_all_user_images,
-    get_image_from_storage_async,
-    save_image_to_storage,
+    RAW_IMAGES,
+    StorageClient,
+    compact_segments,
 )
 
+NODE = 'http://storage:8001'
+
 
 @pytest.fixture()
-def mock_get_image_from_storage_async(mocker):
-    return mocker.patch('final_project.storage_client._get_image_from_storage_async')
+async def storage_client():
+    res = StorageClient(get_storage_nodes())
+    yield res
+    await res.close()
 
 
 @pytest.mark.asyncio
-async def test_get_image_from_storage_returns_image_when_success_async(
-    mock_get_image_from_storage_async, base64_2x2_image
-):
-    mock_get_image_from_storage_async.return_value = ImageWithPath(
-        image=base64_2x2_image, path='path'
+async def test_storage_client_reuses_session(storage_client):
+    session = await storage_client.get_session()
+    assert await storage_client.get_session() is session
+    assert (
+        session.connector.limit_per_host == storage_client.get_stats()['limit_per_host']
     )
-    res = await get_image_from_storage_async('path')
-    assert res
 
 
 @pytest.mark.asyncio
-async def test_get_image_from_storage_when_got_unexpecting_response_status_async(
-    mock_get_image_from_storage_async, base64_2x2_image
-):
-    mock_get_image_from_storage_async.side_effect = StorageClientError(
-        HTTPStatus.NOT_FOUND.value, Message.IMAGE_DOES_NOT_EXISTS_ON_STORAGE.value
-    )
-    with pytest.raises(StorageError):
-        await get_image_from_storage_async('path')
+async def test_storage_client_session_has_fetch_timeout(storage_client):
+    session = await storage_client.get_session()
+    assert session._timeout.total == image_storage_settings.fetch_timeout
 
 
-@pytest.fixture()
-def mock__get_all_user_images(mocker):
-    return mocker.patch('final_project.storage_client._get_all_user_images')
+@pytest.mark.asyncio
+async def test_storage_client_close_closes_session(storage_client):
+    session = await storage_client.get_session()
+    await storage_client.close()
+    assert session.closed
+    assert await storage_client.get_session() is not session
 
 
 @pytest.mark.asyncio
-async def test_get_all_user_(mock__get_all_user_images, base64_2x2_image):
-    mock__get_all_user_images.return_value = [
-        {'image': base64_2x2_image, 'path': 'path'}
-    ]
-    res = await get_all_user_images(1)
-    assert len(res) == 1
-    assert res[0] == ImageWithPath(image=base64_2x2_image, path='path')
+async def test_storage_client_stats_without_connections(storage_client):
+    await storage_client.open()
+    stats = storage_client.get_stats()
+    assert stats['acquired'] == 0
+    assert stats['idle'] == 0
 
 
-@pytest.mark.asyncio
-async def test_get_all_user_posts_when_user_does_not_have_images(
-    mock__get_all_user_images, base64_2x2_image
-):
-    mock__get_all_user_images.side_effect = StorageClientError(
-        HTTPStatus.NOT_FOUND.value, Message.USER_DOES_NOT_HAVE_IMAGES.value
-    )
-    with pytest.raises(StorageError):
-        await get_all_user_images(1)
+def test_storage_client_reuses_sync_session(storage_client):
+    assert storage_client.get_sync_session() is storage_client.get_sync_session()
 
 
-def test_save_image_to_storage_when_got_unexpecting_response_status(
-    mock_add_image_to_storage, base64_2x2_image
-):
-    mock_add_image_to_storage.side_effect = StorageClientError(
-        HTTPStatus.BAD_REQUEST.value, Message.BYTES_ARE_NOT_A_IMAGE.value
-    )
-    with pytest.raises(StorageError):
-        save_image_to_storage(base64_2x2_image, 1)
+def test_storage_client_sync_session_has_pool_per_node():
+    client = StorageClient({'0': 'http://node-0', '1': 'http://node-1'})
+    session = client.get_sync_session()
+    first = session.get_adapter(f'http://node-0{RAW_IMAGES}')
+    second = session.get_adapter(f'http://node-1{RAW_IMAGES}')
+    assert first is not second
 
 
-def test_save_image_to_storage_returns_path_when_success(
-    mock_add_image_to_storage, base64_2x2_image
-):
-    mock_add_image_to_storage.return_value = {'path': 'path'}
-    res = save_image_to_storage(base64_2x2_image, user_id=1)
-    assert res == 'path'
+def test_storage_client_warm_up_ignores_unavailable_nodes(mocker, storage_client):
+    session = mocker.patch.object(storage_client, 'get_sync_session').return_value
+    session.head.side_effect = requests.ConnectionError()
+    storage_client.warm_up()
+    assert session.head.call_count == len(storage_client.nodes)
 
 
-@pytest.fixture()
-def mock_add_image_to_storage(mocker):
-    return mocker.patch('final_project.storage_client._add_image_to_storage')
+def test_compact_segments(mocker):
+    session = mocker.patch(
+        'final_project.storage_client.client.get_sync_session'
+    ).return_value
+    session.post.return_value.status_code = HTTPStatus.OK.value
+    session.post.return_value.json.return_value = {'reclaimed': 10}
+    assert compact_segments() == 10
+    timeout = image_storage_settings.compaction_timeout
+    assert session.post.call_args[1]['timeout'] == timeout
+
+
+def test_compact_segments_when_got_unexpecting_response_status(mocker):
+    session = mocker.patch(
+        'final_project.storage_client.client.get_sync_session'
+    ).return_value
+    session.post.return_value.status_code = HTTPStatus.BAD_REQUEST.value
+    with pytest.raises(StorageError):
+        compact_segments()
+
+
+def test_app_opens_and_closes_storage_client(client):
+    with client:
+        session = storage_client_module.client._session
+        assert session is not None
+    assert session.closed
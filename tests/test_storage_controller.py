@@ -0,0 +1,252 @@
+from http import HTTPStatus
+
+import pytest
+from final_project.api.storage import app
+from final_project.config import StorageBackend, image_storage_settings
+from final_project.data_access_layer.storage import get_segment_store
+from final_project.messages import Message
+from final_project.storage_transport import (
+    IMAGE_PATH_HEADER,
+    MULTIPART_MIXED,
+    encode_images_upload,
+)
+from final_project.utils import encode_bytes_to_base64, rmtree
+from starlette.testclient import TestClient
+
+
+@pytest.fixture()
+def storage_client():
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def _delete_image_directory(resource_directory):
+    yield
+    directory = (
+        resource_directory.parent.parent / image_storage_settings.storage_folder_name
+    )
+    if directory.exists():
+        rmtree(directory)
+
+
+@pytest.fixture()
+def saved_path(storage_client, image_2x2_in_bytes):
+    response = storage_client.post(
+        '/images/raw', params={'user_id': 1}, data=image_2x2_in_bytes
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    return response.json()['path']
+
+
+def test_raw_image_roundtrip(storage_client, saved_path):
+    response = storage_client.get('/images/raw', params={'image_path': saved_path})
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'] == 'application/octet-stream'
+    assert response.content.startswith(b'\x89PNG')
+
+
+def test_raw_image_has_cache_headers(storage_client, saved_path):
+    response = storage_client.get('/images/raw', params={'image_path': saved_path})
+    assert int(response.headers['content-length']) == len(response.content)
+    assert response.headers['etag']
+    assert response.headers['last-modified']
+
+
+def test_raw_image_not_modified_by_etag(storage_client, saved_path):
+    params = {'image_path': saved_path}
+    etag = storage_client.get('/images/raw', params=params).headers['etag']
+    response = storage_client.get(
+        '/images/raw', params=params, headers={'If-None-Match': f'"{etag}"'}
+    )
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.content == b''
+
+
+def test_raw_image_not_modified_since_last_modified(storage_client, saved_path):
+    params = {'image_path': saved_path}
+    last_modified = storage_client.get('/images/raw', params=params).headers[
+        'last-modified'
+    ]
+    response = storage_client.get(
+        '/images/raw', params=params, headers={'If-Modified-Since': last_modified}
+    )
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_raw_image_modified_for_other_etag(storage_client, saved_path):
+    response = storage_client.get(
+        '/images/raw',
+        params={'image_path': saved_path},
+        headers={'If-None-Match': '"other"'},
+    )
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_raw_image_when_image_does_not_exist(storage_client):
+    response = storage_client.get('/images/raw', params={'image_path': 'missing'})
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_raw_image_in_accepted_stored_format(storage_client, saved_path):
+    response = storage_client.get(
+        '/images/raw',
+        params={'image_path': saved_path},
+        headers={'Accept': 'image/webp,image/*;q=0.8'},
+    )
+    assert response.headers['content-type'] == 'image/png'
+    assert response.headers['vary'] == 'Accept'
+    assert response.content.startswith(b'\x89PNG')
+
+
+def test_raw_image_transcoded_to_accepted_format(storage_client, saved_path):
+    params = {'image_path': saved_path}
+    headers = {'Accept': 'image/webp'}
+    response = storage_client.get('/images/raw', params=params, headers=headers)
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'] == 'image/webp'
+    assert response.content[8:12] == b'WEBP'
+    etag = response.headers['etag']
+    assert etag != storage_client.get('/images/raw', params=params).headers['etag']
+    response = storage_client.get(
+        '/images/raw', params=params, headers={**headers, 'If-None-Match': etag}
+    )
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_raw_image_when_format_is_not_acceptable(storage_client, saved_path):
+    response = storage_client.get(
+        '/images/raw',
+        params={'image_path': saved_path},
+        headers={'Accept': 'image/gif'},
+    )
+    assert response.status_code == HTTPStatus.NOT_ACCEPTABLE
+
+
+def test_add_raw_image_when_bytes_are_not_image(storage_client):
+    response = storage_client.post('/images/raw', params={'user_id': 1}, data=b'1234')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_add_raw_images_saves_each_image(storage_client, image_2x2_in_bytes):
+    body, content_type = encode_images_upload(
+        [(image_2x2_in_bytes, 1), (b'1234', 1), (image_2x2_in_bytes, 2)]
+    )
+    response = storage_client.post(
+        '/images/raw/batch', data=body, headers={'Content-Type': content_type}
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    first, second, third = response.json()
+    assert second == {'path': None, 'error': Message.BYTES_ARE_NOT_A_IMAGE.value}
+    for saved in (first, third):
+        response = storage_client.get(
+            '/images/raw', params={'image_path': saved['path']}
+        )
+        assert response.content == image_2x2_in_bytes
+
+
+@pytest.mark.parametrize(
+    'body, content_type',
+    [
+        (b'1234', 'application/octet-stream'),
+        (b'1234', f'{MULTIPART_MIXED}; boundary=b'),
+        (b'--b\r\n\r\n1234\r\n--b--\r\n', f'{MULTIPART_MIXED}; boundary=b'),
+    ],
+)
+def test_add_raw_images_when_body_is_invalid(storage_client, body, content_type):
+    response = storage_client.post(
+        '/images/raw/batch', data=body, headers={'Content-Type': content_type}
+    )
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_add_image_keeps_png_bytes(storage_client, base64_2x2_image):
+    response = storage_client.post(
+        '/images', json={'user_id': 1, 'image': base64_2x2_image.decode()}
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    response = storage_client.get(
+        '/images/raw', params={'image_path': response.json()['path']}
+    )
+    assert encode_bytes_to_base64(response.content) == base64_2x2_image
+
+
+def test_images_batch_returns_multipart_when_accepted(storage_client, saved_path):
+    response = storage_client.post(
+        '/images/batch',
+        json={'paths': [saved_path, 'missing']},
+        headers={'Accept': MULTIPART_MIXED},
+    )
+    assert response.headers['content-type'].startswith(MULTIPART_MIXED)
+    assert f'{IMAGE_PATH_HEADER}: {saved_path}'.encode() in response.content
+    assert b'missing' in response.content
+
+
+def test_images_batch_returns_json_by_default(storage_client, saved_path):
+    response = storage_client.post(
+        '/images/batch', json={'paths': [saved_path, 'missing']}
+    )
+    body = response.json()
+    assert [image['path'] for image in body['images']] == [saved_path]
+    assert list(body['errors']) == ['missing']
+
+
+def test_remove_image_outside_storage(storage_client, tmp_path):
+    path = tmp_path / 'image.png'
+    path.write_bytes(b'1234')
+    response = storage_client.delete('/images', params={'image_path': str(path)})
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert path.exists()
+
+
+def test_remove_image(storage_client, saved_path):
+    response = storage_client.delete('/images', params={'image_path': saved_path})
+    assert response.status_code == HTTPStatus.NO_CONTENT
+    response = storage_client.get('/images/raw', params={'image_path': saved_path})
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+@pytest.fixture()
+def _segments_backend(mocker):
+    mocker.patch.object(image_storage_settings, 'backend', StorageBackend.SEGMENTS)
+    get_segment_store.cache_clear()
+    yield
+    get_segment_store().close()
+    get_segment_store.cache_clear()
+
+
+@pytest.mark.usefixtures('_segments_backend')
+def test_raw_image_from_segments(storage_client, saved_path):
+    response = storage_client.get('/images/raw', params={'image_path': saved_path})
+    assert response.status_code == HTTPStatus.OK
+    assert response.content.startswith(b'\x89PNG')
+    etag = response.headers['etag']
+    response = storage_client.get(
+        '/images/raw',
+        params={'image_path': saved_path},
+        headers={'If-None-Match': etag},
+    )
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+@pytest.mark.usefixtures('_segments_backend')
+def test_raw_image_from_segments_transcoded(storage_client, saved_path):
+    response = storage_client.get(
+        '/images/raw',
+        params={'image_path': saved_path},
+        headers={'Accept': 'image/jpeg'},
+    )
+    assert response.headers['content-type'] == 'image/jpeg'
+    assert response.content.startswith(b'\xff\xd8\xff')
+
+
+@pytest.mark.usefixtures('_segments_backend')
+def test_compact_segments(storage_client, saved_path):
+    storage_client.delete('/images', params={'image_path': saved_path})
+    response = storage_client.post('/segments/compaction')
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'reclaimed': 0}
+
+
+def test_compact_segments_when_backend_is_not_segments(storage_client):
+    response = storage_client.post('/segments/compaction')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
@@ -1,15 +1,27 @@
 import pathlib
+from http import HTTPStatus
+from io import BytesIO
 
 import pytest
-from final_project.config import image_storage_settings
+from final_project.config import (
+    ImageFormat,
+    StorageBackend,
+    image_storage_settings,
+)
 from final_project.data_access_layer.storage import (
-    get_all_user_images,
+    delete_image,
     get_image,
+    get_images,
+    get_segment_store,
+    read_image,
     save_image,
+    save_image_bytes,
 )
 from final_project.exceptions import DALError
+from final_project.messages import Message
 from final_project.utils import rmtree
 from PIL.Image import Image
+from PIL.Image import open as open_image
 
 
 @pytest.fixture()
@@ -61,6 +73,30 @@ def test_save_image(image):
     assert path.exists()
 
 
+def test_save_image_bytes_writes_png_as_is(image_2x2_in_bytes):
+    path = save_image_bytes(1, image_2x2_in_bytes)
+    assert path.read_bytes() == image_2x2_in_bytes
+
+
+def test_save_image_bytes_reencodes_other_format(image_2x2):
+    jpeg = BytesIO()
+    image_2x2.convert('RGB').save(jpeg, format='jpeg')
+    path = save_image_bytes(1, jpeg.getvalue())
+    assert open_image(path).format == 'PNG'
+
+
+def test_save_image_in_configured_format(mocker, image_2x2):
+    mocker.patch.object(image_storage_settings, 'image_format', ImageFormat.JPEG)
+    path = save_image(1, image_2x2)
+    assert path.suffix == '.jpeg'
+    assert open_image(path).format == 'JPEG'
+
+
+def test_save_image_bytes_when_bytes_are_not_image():
+    with pytest.raises(DALError):
+        save_image_bytes(1, b'1234')
+
+
 def test_get_image_from_storage_with_not_exists_path_raises_error():
     with pytest.raises(DALError):
         get_image(pathlib.Path('12343'))
@@ -71,47 +107,94 @@ def save_image_fixture(image_2x2):
     return save_image(1, image_2x2)
 
 
+def test_get_image_from_storage(save_image_fixture):
+    assert get_image(save_image_fixture)
+
+
+def test_get_images_returns_found_images_and_errors(save_image_fixture):
+    path = str(save_image_fixture)
+    res = get_images([path, '12343', path])
+    assert [img.path for img in res.images] == [path]
+    assert res.errors == {'12343': Message.IMAGE_DOES_NOT_EXISTS_ON_STORAGE.value}
+
+
 @pytest.fixture()
-def _save_two_images(image_2x2, image_1x1):
-    save_image(1, image_1x1)
-    save_image(1, image_2x2)
+def _content_addressed_backend(mocker):
+    mocker.patch.object(
+        image_storage_settings, 'backend', StorageBackend.CONTENT_ADDRESSED
+    )
 
 
-def test_get_image_from_storage(save_image_fixture):
-    assert get_image(save_image_fixture)
+@pytest.mark.usefixtures('_content_addressed_backend')
+def test_save_same_image_twice_stores_one_file(image_2x2):
+    first = save_image(1, image_2x2)
+    second = save_image(2, image_2x2)
+    assert first == second
+    assert first.exists()
 
 
-def test_get_all_users_images_when_main_folder_does_not_exists():
+@pytest.mark.usefixtures('_content_addressed_backend')
+def test_delete_content_addressed_image_after_last_reference(image_2x2):
+    path = save_image(1, image_2x2)
+    save_image(2, image_2x2)
+    delete_image(path)
+    assert path.exists()
+    delete_image(path)
+    assert not path.exists()
+
+
+@pytest.fixture()
+def _segments_backend(mocker):
+    mocker.patch.object(image_storage_settings, 'backend', StorageBackend.SEGMENTS)
+    get_segment_store.cache_clear()
+    yield
+    get_segment_store().close()
+    get_segment_store.cache_clear()
+
+
+@pytest.mark.usefixtures('_segments_backend')
+def test_save_image_to_segments(image_2x2):
+    path = save_image(1, image_2x2)
+    assert read_image(path).startswith(b'\x89PNG')
+    assert get_image(path)
+
+
+@pytest.mark.usefixtures('_segments_backend')
+def test_delete_image_from_segments(image_2x2):
+    path = save_image(1, image_2x2)
+    delete_image(path)
     with pytest.raises(DALError):
-        get_all_user_images(1)
+        read_image(path)
+    with pytest.raises(DALError):
+        delete_image(path)
+
+
+def test_delete_image(save_image_fixture):
+    delete_image(save_image_fixture)
+    assert not save_image_fixture.exists()
 
 
-def test_get_all_users_images_when_user_does_not_exists_images(proj_root):
-    image_folder = (proj_root / image_storage_settings.storage_folder_name).resolve()
-    image_folder.mkdir()
+def test_delete_not_existing_image_raises_error():
     with pytest.raises(DALError):
-        get_all_user_images(1)
+        delete_image(pathlib.Path('12343'))
 
 
-@pytest.fixture()
-def _mock_uuid4(mocker):
-    mocker.patch('final_project.data_access_layer.storage.uuid.uuid4').side_effect = [
-        '1',
-        '2',
-    ]
+@pytest.mark.parametrize(
+    'backend', [StorageBackend.FILES, StorageBackend.CONTENT_ADDRESSED]
+)
+def test_delete_image_outside_storage_raises_error(mocker, tmp_path, backend):
+    mocker.patch.object(image_storage_settings, 'backend', backend)
+    path = tmp_path / 'image.png'
+    path.write_bytes(b'1234')
+    with pytest.raises(DALError) as e:
+        delete_image(path)
+    assert e.value.status_code == HTTPStatus.NOT_FOUND
+    assert path.exists()
 
 
-@pytest.fixture()
-def image_path_for_user1():
-    return f'{image_storage_settings.storage_folder_name}/1-{image_storage_settings.items_in_one_folder}/1'
-
-
-@pytest.mark.usefixtures('_mock_uuid4', '_save_two_images')
-def test_get_all_users_images(image_path_for_user1):
-    images = get_all_user_images(1)
-    res = list(map(lambda img: img.path, images))
-    assert len(res) == 2
-    for path in res:
-        assert (
-            f'{image_path_for_user1}/1' in path or f'{image_path_for_user1}/2' in path
-        )
+def test_read_image_by_path_leading_out_of_storage_raises_error(
+    save_image_fixture, proj_root
+):
+    storage = proj_root / image_storage_settings.storage_folder_name
+    with pytest.raises(DALError):
+        read_image(storage / '..' / 'pyproject.toml')
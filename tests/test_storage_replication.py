@@ -0,0 +1,103 @@
+import threading
+from http import HTTPStatus
+
+import pytest
+from final_project.config import image_storage_settings
+from final_project.exceptions import StorageClientError, StorageError
+from final_project.messages import Message
+from final_project.storage_replication import (
+    _add_image_to_storage,
+    save_image_to_storage,
+)
+from final_project.storage_transport import OCTET_STREAM
+
+NODE = 'http://storage:8001'
+
+
+def test_save_image_to_storage_when_got_unexpecting_response_status(
+    mock_add_image_to_storage, base64_2x2_image
+):
+    mock_add_image_to_storage.side_effect = StorageClientError(
+        HTTPStatus.BAD_REQUEST.value, Message.BYTES_ARE_NOT_A_IMAGE.value
+    )
+    with pytest.raises(StorageError):
+        save_image_to_storage(base64_2x2_image, 1)
+
+
+def test_save_image_to_storage_returns_path_when_success(
+    mock_add_image_to_storage, base64_2x2_image
+):
+    mock_add_image_to_storage.return_value = {'path': 'path'}
+    res = save_image_to_storage(base64_2x2_image, user_id=1)
+    assert res == '0:path'
+
+
+@pytest.fixture()
+def mock_add_image_to_storage(mocker):
+    return mocker.patch('final_project.storage_replication._add_image_to_storage')
+
+
+def test_add_image_to_storage_uses_pooled_session(mocker):
+    session = mocker.patch(
+        'final_project.storage_client.client.get_sync_session'
+    ).return_value
+    session.post.return_value.status_code = HTTPStatus.CREATED.value
+    session.post.return_value.json.return_value = {'path': 'path'}
+    assert _add_image_to_storage(NODE, b'1234', 1) == {'path': 'path'}
+    assert session.post.call_args[1]['data'] == b'1234'
+    assert session.post.call_args[1]['headers'] == {'Content-Type': OCTET_STREAM}
+    assert (
+        session.post.call_args[1]['timeout'] == image_storage_settings.request_timeout
+    )
+
+
+@pytest.mark.usefixtures('_two_replicas')
+def test_save_image_to_storage_with_write_quorum(mock_add_image_to_storage):
+    def _add_image(node, image, user_id):
+        if node == 'http://node-0':
+            raise StorageClientError('error')
+        return {'path': 'path'}
+
+    mock_add_image_to_storage.side_effect = _add_image
+    assert save_image_to_storage(b'1234', 1) == '1:path'
+
+
+@pytest.mark.usefixtures('_two_replicas')
+def test_save_image_to_storage_when_quorum_not_reached(
+    mocker, mock_add_image_to_storage
+):
+    mocker.patch.object(image_storage_settings, 'write_quorum', 2)
+    delete = mocker.patch('final_project.storage_client.delete_image_from_storage')
+
+    def _add_image(node, image, user_id):
+        if node == 'http://node-0':
+            raise StorageClientError('error')
+        return {'path': 'path'}
+
+    mock_add_image_to_storage.side_effect = _add_image
+    with pytest.raises(StorageError):
+        save_image_to_storage(b'1234', 1)
+    delete.assert_called_once_with('1:path')
+
+
+@pytest.mark.usefixtures('_two_replicas')
+def test_save_image_to_storage_does_not_wait_slow_replica(
+    mocker, mock_add_image_to_storage
+):
+    mocker.patch.object(image_storage_settings, 'write_grace_ms', 0)
+    slow_replica = threading.Event()
+    deleted = threading.Event()
+    delete = mocker.patch('final_project.storage_client.delete_image_from_storage')
+    delete.side_effect = lambda path: deleted.set()
+
+    def _add_image(node, image, user_id):
+        if node == 'http://node-1':
+            slow_replica.wait()
+            return {'path': 'late'}
+        return {'path': 'path'}
+
+    mock_add_image_to_storage.side_effect = _add_image
+    assert save_image_to_storage(b'1234', 1) == '0:path'
+    slow_replica.set()
+    assert deleted.wait(1)
+    delete.assert_called_once_with('1:late')
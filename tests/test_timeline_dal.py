@@ -0,0 +1,378 @@
+import pytest
+from final_project.config import FeedMode, feed_settings
+from final_project.data_access_layer.feed import FeedDAL
+from final_project.data_access_layer.timeline import TAIL, TimelineDAL, to_entry
+from final_project.data_access_layer.timeline_feed import TimelineFeedDAL
+from final_project.data_access_layer.users import UsersDataAccessLayer
+from final_project.database.database import create_session
+from final_project.database.models import Post, User, user_subsriptions
+from final_project.exceptions import DALError, PaginationError
+from final_project.image_processor.worker import _add_post_to_db
+from final_project.metrics import metrics
+from final_project.redis import RedisInstances
+from final_project.redis_keys import get_timeline_key
+from final_project.timelines import backfill_subscribers_count, rebuild_timelines
+from final_project.utils import encode_feed_cursor
+from mock import MagicMock
+
+
+@pytest.fixture()
+def redis():
+    return MagicMock()
+
+
+@pytest.fixture()
+def pipeline(redis):
+    return redis.pipeline.return_value
+
+
+@pytest.fixture()
+def script(redis):
+    return redis.register_script.return_value
+
+
+@pytest.fixture()
+def _timeline_mode(mocker, redis):
+    mocker.patch.object(feed_settings, 'feed_mode', FeedMode.TIMELINE)
+    mocker.patch.object(RedisInstances, 'sync_redis').return_value = redis
+
+
+@pytest.fixture()
+async def _add_posts_from_two_users(_add_user, _add_second_user):
+    for i in range(4):
+        _add_post_to_db(i % 2 + 1, str(i), 'descr', None)
+    await UsersDataAccessLayer.subscribe(1, 2)
+
+
+def _get_entries(*ids):
+    with create_session() as session:
+        posts = session.query(Post).filter(Post.id.in_(ids)).order_by(Post.id)
+        return [to_entry(post.created_at, post.id) for post in posts]
+
+
+def _member(post_id):
+    return f'{post_id:020d}'.encode()
+
+
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_two_users')
+def test_rebuild_writes_all_feed_posts_and_tail(redis, pipeline):
+    with create_session() as session:
+        assert TimelineDAL.rebuild(redis, 1, session) == 4
+    key = get_timeline_key(1)
+    pipeline.delete.assert_called_once_with(key)
+    mapping = pipeline.zadd.call_args[0][1]
+    assert set(mapping) == {TAIL, *(f'{i:020d}' for i in range(1, 5))}
+
+
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_two_users')
+def test_rebuild_keeps_only_oldest_posts_without_tail(mocker, redis, pipeline):
+    mocker.patch.object(feed_settings, 'timeline_max_size', 2)
+    with create_session() as session:
+        TimelineDAL.rebuild(redis, 1, session)
+    mapping = pipeline.zadd.call_args[0][1]
+    assert set(mapping) == {f'{1:020d}', f'{2:020d}'}
+
+
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_two_users')
+def test_rebuild_adds_posts_saved_while_it_was_writing(redis, pipeline, script):
+    pipeline.execute.side_effect = lambda: _add_post_to_db(2, '4', 'descr', None)
+    with create_session() as session:
+        assert TimelineDAL.rebuild(redis, 1, session) == 5
+    assert f'{5:020d}' not in pipeline.zadd.call_args[0][1]
+    script.assert_called_once()
+    assert script.call_args[1]['keys'] == [get_timeline_key(1)]
+    assert script.call_args[1]['args'][2::2] == [f'{5:020d}']
+
+
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_two_users')
+def test_rebuild_without_new_posts_does_not_merge(redis, script):
+    with create_session() as session:
+        TimelineDAL.rebuild(redis, 1, session)
+    script.assert_not_called()
+
+
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_two_users')
+def test_fan_out_adds_post_to_author_and_followers_timelines(redis, script):
+    with create_session() as session:
+        TimelineDAL.fan_out(redis, 2, session)
+    keys = [call[1]['keys'] for call in script.call_args_list]
+    assert keys == [[get_timeline_key(2)], [get_timeline_key(1)]]
+    args = script.call_args[1]['args']
+    assert args[0] == feed_settings.timeline_max_size
+    assert args[2] == f'{2:020d}'
+
+
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_two_users')
+def test_backfill_adds_oldest_author_posts(redis, script):
+    with create_session() as session:
+        TimelineDAL.backfill(redis, 1, 2, session)
+    args = script.call_args[1]['args']
+    assert args[0] == feed_settings.timeline_max_size
+    assert args[2::2] == [f'{2:020d}', f'{4:020d}']
+
+
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_two_users')
+def test_prune_removes_author_posts(redis):
+    with create_session() as session:
+        TimelineDAL.prune(redis, 1, 2, session)
+    redis.zrem.assert_called_once_with(get_timeline_key(1), f'{2:020d}', f'{4:020d}')
+
+
+def test_get_entries_from_complete_timeline(redis, pipeline):
+    pipeline.execute.return_value = [
+        1,
+        float('inf'),
+        [(_member(1), 1.0), (_member(2), 2.0), (TAIL.encode(), float('inf'))],
+    ]
+    assert TimelineDAL.get_entries(redis, 1, 0, 3, None) == [(1.0, 1), (2.0, 2)]
+    pipeline.zrange.assert_called_once_with(get_timeline_key(1), 0, 2, withscores=True)
+
+
+def test_get_entries_from_beginning_of_trimmed_timeline(redis, pipeline):
+    pipeline.execute.return_value = [1, None, [(_member(1), 1.0), (_member(2), 2.0)]]
+    assert TimelineDAL.get_entries(redis, 1, 0, 2, None) == [(1.0, 1), (2.0, 2)]
+
+
+def test_get_entries_after_end_of_trimmed_timeline_returns_none(redis, pipeline):
+    pipeline.execute.return_value = [1, None, [(_member(1), 1.0)]]
+    assert TimelineDAL.get_entries(redis, 1, 0, 2, None) is None
+
+
+def test_get_entries_rebuilds_cold_timeline(mocker, redis, pipeline):
+    rebuild = mocker.patch.object(TimelineDAL, 'rebuild')
+    pipeline.execute.side_effect = [
+        [0, None, []],
+        [1, float('inf'), [(_member(1), 1.0)]],
+    ]
+    assert TimelineDAL.get_entries(redis, 1, 0, 2, None) == [(1.0, 1)]
+    rebuild.assert_called_once_with(redis, 1, None)
+
+
+def test_get_entries_after_skips_posts_with_same_time_before_cursor(redis, pipeline):
+    pipeline.execute.return_value = [1, float('inf')]
+    redis.zrangebyscore.return_value = [
+        (_member(1), 5.0),
+        (_member(2), 5.0),
+        (_member(3), 5.0),
+        (_member(4), 6.0),
+    ]
+    assert TimelineDAL.get_entries_after(redis, 1, (5.0, 2), 2, None) == [
+        (5.0, 3),
+        (6.0, 4),
+    ]
+
+
+def test_get_entries_after_reads_more_when_many_posts_have_same_time(redis, pipeline):
+    pipeline.execute.return_value = [1, float('inf')]
+    redis.zrangebyscore.side_effect = [
+        [(_member(1), 5.0), (_member(2), 5.0)],
+        [(_member(1), 5.0), (_member(2), 5.0), (_member(3), 5.0)],
+    ]
+    assert TimelineDAL.get_entries_after(redis, 1, (5.0, 2), 1, None) == [(5.0, 3)]
+
+
+def test_get_entries_after_from_trimmed_timeline(redis, pipeline):
+    pipeline.execute.return_value = [1, None]
+    redis.zrangebyscore.return_value = [(_member(2), 2.0), (_member(3), 3.0)]
+    assert TimelineDAL.get_entries_after(redis, 1, (1.0, 1), 2, None) == [
+        (2.0, 2),
+        (3.0, 3),
+    ]
+
+
+def test_get_entries_after_end_of_trimmed_part_returns_none(redis, pipeline):
+    pipeline.execute.return_value = [1, None]
+    redis.zrangebyscore.return_value = [(_member(5), 100.0)]
+    assert TimelineDAL.get_entries_after(redis, 1, (1.0, 1), 2, None) is None
+
+
+def test_get_entries_after_end_of_complete_timeline(redis, pipeline):
+    pipeline.execute.return_value = [1, float('inf')]
+    redis.zrangebyscore.return_value = [
+        (_member(5), 100.0),
+        (TAIL.encode(), float('inf')),
+    ]
+    assert TimelineDAL.get_entries_after(redis, 1, (1.0, 1), 2, None) == [(100.0, 5)]
+
+
+def test_get_first_entries_after_from_trimmed_timeline(redis, pipeline):
+    pipeline.execute.return_value = [1, None, [(_member(5), 100.0)]]
+    assert TimelineDAL.get_entries_after(redis, 1, None, 1, None) == [(100.0, 5)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_two_users', '_timeline_mode')
+async def test_get_feed_in_timeline_mode_reads_posts_by_timeline_entries(mocker):
+    mocker.patch.object(TimelineDAL, 'get_entries').return_value = [(1.0, 4), (2.0, 1)]
+    res = await UsersDataAccessLayer.get_feed_posts_with_paths(1, 1, 2)
+    assert [post.id for post in res.posts] == [4, 1]
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_two_users', '_timeline_mode')
+async def test_get_feed_in_timeline_mode_falls_back_to_query(mocker):
+    mocker.patch.object(TimelineDAL, 'get_entries_after').return_value = None
+    spy = mocker.spy(FeedDAL, 'get_page_after')
+    res = await UsersDataAccessLayer.get_feed_posts_with_paths(1, None, 3)
+    assert [post.id for post in res.posts] == [1, 2, 3]
+    spy.assert_called_once()
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_two_users', '_timeline_mode')
+async def test_get_feed_in_timeline_mode_after_end_raises_error(mocker):
+    mocker.patch.object(TimelineDAL, 'get_entries').return_value = []
+    with pytest.raises(DALError):
+        await UsersDataAccessLayer.get_feed_posts_with_paths(1, 3, 2)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_user', '_add_second_user', '_timeline_mode')
+async def test_subscribe_and_unsubscribe_update_timeline(mocker):
+    backfill = mocker.patch.object(TimelineDAL, 'backfill')
+    prune = mocker.patch.object(TimelineDAL, 'prune')
+    await UsersDataAccessLayer.subscribe(1, 2)
+    await UsersDataAccessLayer.unsubscribe(1, 2)
+    assert backfill.call_args[0][1:3] == (1, 2)
+    assert prune.call_args[0][1:3] == (1, 2)
+
+
+def _is_subscribed(user_id, author_id):
+    with create_session() as session:
+        subscription = session.query(user_subsriptions).filter(
+            user_subsriptions.c.follower_id == user_id,
+            user_subsriptions.c.followed_id == author_id,
+        )
+        return session.query(subscription.exists()).scalar()
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_user', '_add_second_user', '_timeline_mode')
+async def test_subscribe_and_unsubscribe_update_timeline_after_commit(mocker):
+    subscribed = []
+    mocker.patch.object(
+        TimelineDAL,
+        'backfill',
+        lambda redis, user_id, author_id, session: subscribed.append(
+            _is_subscribed(user_id, author_id)
+        ),
+    )
+    mocker.patch.object(
+        TimelineDAL,
+        'unsubscribe',
+        lambda redis, user_id, author_id, count, session: subscribed.append(
+            _is_subscribed(user_id, author_id)
+        ),
+    )
+    await UsersDataAccessLayer.subscribe(1, 2)
+    await UsersDataAccessLayer.unsubscribe(1, 2)
+    assert subscribed == [True, False]
+
+
+@pytest.mark.usefixtures('_init_db', '_add_posts_from_two_users')
+def test_rebuild_timelines_of_all_users(mocker):
+    rebuild = mocker.patch.object(TimelineDAL, 'rebuild')
+    mocker.patch.object(RedisInstances, 'sync_redis')
+    assert rebuild_timelines() == 2
+    assert [call[0][1] for call in rebuild.call_args_list] == [1, 2]
+
+
+@pytest.mark.usefixtures('_init_db', '_add_user', '_add_second_user')
+def test_backfill_subscribers_count():
+    with create_session() as session:
+        session.execute(user_subsriptions.insert().values(follower_id=1, followed_id=2))
+    assert backfill_subscribers_count() == 2
+    with create_session() as session:
+        counts = session.query(User.id, User.subscribers_count).order_by(User.id)
+        assert counts.all() == [(1, 0), (2, 1)]
+
+
+@pytest.fixture()
+def _second_user_is_pull_author(mocker):
+    mocker.patch.object(feed_settings, 'fan_out_followers_threshold', 0)
+
+
+@pytest.mark.usefixtures(
+    '_init_db', '_add_posts_from_two_users', '_second_user_is_pull_author'
+)
+def test_fan_out_of_pull_author_adds_post_only_to_his_timeline(redis, script):
+    with create_session() as session:
+        assert TimelineDAL.fan_out(redis, 2, session) == 1
+    assert script.call_args[1]['keys'] == [get_timeline_key(2)]
+
+
+@pytest.mark.usefixtures(
+    '_init_db', '_add_posts_from_two_users', '_second_user_is_pull_author'
+)
+def test_unsubscribe_from_author_dropping_to_threshold_invalidates_timelines(redis):
+    with create_session() as session:
+        TimelineDAL.unsubscribe(redis, 3, 2, 1, session)
+    redis.delete.assert_called_once_with(get_timeline_key(1))
+
+
+@pytest.mark.usefixtures(
+    '_init_db', '_add_posts_from_two_users', '_second_user_is_pull_author'
+)
+def test_unsubscribe_from_pull_author_keeps_timelines(redis):
+    with create_session() as session:
+        TimelineDAL.unsubscribe(redis, 3, 2, 2, session)
+    redis.zrem.assert_called_once()
+    redis.delete.assert_not_called()
+
+
+@pytest.mark.usefixtures(
+    '_init_db', '_add_posts_from_two_users', '_second_user_is_pull_author'
+)
+def test_backfill_skips_pull_author(redis, script):
+    with create_session() as session:
+        TimelineDAL.backfill(redis, 1, 2, session)
+    script.assert_not_called()
+
+
+@pytest.mark.usefixtures(
+    '_init_db', '_add_posts_from_two_users', '_second_user_is_pull_author'
+)
+def test_rebuild_skips_posts_of_pull_authors(redis, pipeline):
+    with create_session() as session:
+        TimelineDAL.rebuild(redis, 1, session)
+    mapping = pipeline.zadd.call_args[0][1]
+    assert set(mapping) == {TAIL, f'{1:020d}', f'{3:020d}'}
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures(
+    '_init_db',
+    '_add_posts_from_two_users',
+    '_second_user_is_pull_author',
+    '_timeline_mode',
+)
+async def test_get_feed_merges_posts_of_pull_authors(mocker):
+    metrics.clear()
+    mocker.patch.object(TimelineDAL, 'get_entries').return_value = _get_entries(1, 3)
+    first = await UsersDataAccessLayer.get_feed_posts_with_paths(1, 1, 3)
+    second = await UsersDataAccessLayer.get_feed_posts_with_paths(1, 2, 3)
+    assert [post.id for post in first.posts] == [1, 2, 3]
+    assert [post.id for post in second.posts] == [4]
+    assert metrics.snapshot()['feed_pull_merged_authors']['max'] == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures(
+    '_init_db',
+    '_add_posts_from_two_users',
+    '_second_user_is_pull_author',
+    '_timeline_mode',
+)
+async def test_get_feed_by_cursor_merges_posts_of_pull_authors(mocker):
+    mocker.patch.object(TimelineDAL, 'get_entries_after').return_value = _get_entries(3)
+    with create_session() as session:
+        first_post = session.query(Post).filter(Post.id == 1).one()
+        cursor = encode_feed_cursor(first_post.created_at, first_post.id)
+    res = await UsersDataAccessLayer.get_feed_posts_with_paths(1, None, 2, cursor)
+    assert [post.id for post in res.posts] == [2, 3]
+
+
+@pytest.mark.usefixtures('_init_db', '_add_user')
+def test_timeline_get_page_after_with_invalid_size_raises_error():
+    with create_session() as session, pytest.raises(PaginationError):
+        TimelineFeedDAL.get_page_after(1, None, 0, session)
@@ -196,7 +196,7 @@ def _add_post_from_third_user(post_adding_commons):
 @pytest.fixture()
 def _mock_storage_client(mocker):
     mocker.patch(
-        'final_project.data_access_layer.users.storage_client'
+        'final_project.data_access_layer.users.storage_batch'
     ).get_images = AsyncMock()
 
 
@@ -216,14 +216,28 @@ def image_with_path(base64_2x2_image):
 @pytest.mark.usefixtures('_init_db', '_add_user', '_mock_storage_client')
 async def test_get_feed_when_feed_clear():
     res = await UsersDataAccessLayer.get_feed(1, 1, 10)
-    assert len(res) == 0
+    assert len(res.posts) == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_user', '_add_post')
+async def test_get_feed_returns_cursor_when_image_is_missing(mocker):
+    storage_batch = mocker.patch('final_project.data_access_layer.users.storage_batch')
+    storage_batch.get_images = AsyncMock(return_value=[])
+    res = await UsersDataAccessLayer.get_feed(1, None, 1)
+    assert res.posts == []
+    assert res.missing_posts_ids == [1]
+    assert res.next_cursor is not None
+    res = await UsersDataAccessLayer.get_feed(1, None, 1, res.next_cursor)
+    assert res.posts == []
+    assert res.next_cursor is None
 
 
 @pytest.mark.asyncio
 @pytest.mark.usefixtures('_init_db', '_add_user', '_add_post')
 async def test_get_feed_when_user_add_post():
     res = await UsersDataAccessLayer.get_feed_posts_with_paths(1, 1, 10)
-    assert len(res) == 1
+    assert len(res.posts) == 1
 
 
 @pytest.mark.asyncio
@@ -233,7 +247,7 @@ async def test_get_feed_when_user_add_post():
 async def test_get_feed_when_subscription_add_post(image_with_path):
     await UsersDataAccessLayer.subscribe(1, 2)
     res = await UsersDataAccessLayer.get_feed_posts_with_paths(1, 1, 10)
-    assert len(res) == 1
+    assert len(res.posts) == 1
 
 
 @pytest.mark.asyncio
@@ -249,10 +263,10 @@ async def test_get_feed_when_two_subscriptions_add_post(image_with_path):
     await UsersDataAccessLayer.subscribe(1, 2)
     await UsersDataAccessLayer.subscribe(1, 3)
     res = await UsersDataAccessLayer.get_feed_posts_with_paths(1, 1, 10)
-    assert len(res) == 2
-    res_copy = res.copy()
+    assert len(res.posts) == 2
+    res_copy = res.posts.copy()
     res_copy.sort(key=lambda post: post.created_at)
-    assert res_copy == res
+    assert res_copy == res.posts
 
 
 @pytest.mark.asyncio
@@ -271,7 +285,32 @@ async def test_get_feed_when_two_subscriptions_add_post_and_user_add_post_too(
     await UsersDataAccessLayer.subscribe(1, 2)
     await UsersDataAccessLayer.subscribe(1, 3)
     res = await UsersDataAccessLayer.get_feed_posts_with_paths(1, 1, 10)
-    assert len(res) == 3
-    res_copy = res.copy()
+    assert len(res.posts) == 3
+    res_copy = res.posts.copy()
     res_copy.sort(key=lambda post: post.created_at)
-    assert res_copy == res
+    assert res_copy == res.posts
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_user', '_add_post')
+async def test_get_feed_when_page_after_end_of_feed():
+    with pytest.raises(DALError):
+        await UsersDataAccessLayer.get_feed_posts_with_paths(1, 2, 10)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_user', '_add_post')
+async def test_get_feed_with_invalid_cursor():
+    with pytest.raises(DALError):
+        await UsersDataAccessLayer.get_feed_posts_with_paths(1, None, 10, '1234')
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('_init_db', '_add_user', '_add_second_user')
+async def test_subscribe_and_unsubscribe_update_subscribers_count():
+    await UsersDataAccessLayer.subscribe(1, 2)
+    with create_session() as session:
+        assert session.query(User).filter(User.id == 2).one().subscribers_count == 1
+    await UsersDataAccessLayer.unsubscribe(1, 2)
+    with create_session() as session:
+        assert session.query(User).filter(User.id == 2).one().subscribers_count == 0
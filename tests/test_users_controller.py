@@ -1,8 +1,14 @@
+from datetime import datetime
 from http import HTTPStatus
 
+import pytest
+from final_project.api.users import NEXT_CURSOR_HEADER
+from final_project.api.utils import MISSING_POSTS_HEADER
+from final_project.data_access_layer.auth import check_authorization
 from final_project.data_access_layer.users import UsersDataAccessLayer
 from final_project.exceptions import DALError
 from final_project.messages import Message
+from final_project.models import FeedPage, OutUser, PostWithImage
 from requests import Response
 from starlette.testclient import TestClient
 
@@ -16,3 +22,62 @@ def test_add_user_returns_error_message_when_error_raised(
     response: Response = client.post('/users/', json=dict(in_user))
     assert response.status_code == HTTPStatus.BAD_REQUEST
     assert response.json()['detail'] == Message.USER_ALREADY_EXISTS.value
+
+
+@pytest.fixture()
+def authorized_client(client: TestClient):
+    client.app.dependency_overrides[check_authorization] = lambda: OutUser(
+        id=1, username='username'
+    )
+    return client
+
+
+@pytest.fixture()
+def feed_post():
+    return PostWithImage(
+        id=2,
+        user=OutUser(id=1, username='username'),
+        comments=[],
+        likes=[],
+        marked_users=[],
+        created_at=datetime(2020, 5, 1),
+        image=b'1234',
+    )
+
+
+@pytest.fixture()
+def mocked_get_feed(mocker, feed_post):
+    mock = mocker.patch.object(UsersDataAccessLayer, 'get_feed')
+    mock.return_value = FeedPage(posts=[feed_post], next_cursor='cursor')
+    return mock
+
+
+def test_get_feed_in_cursor_mode_returns_next_cursor(
+    authorized_client: TestClient, mocked_get_feed
+):
+    response: Response = authorized_client.get('/users/1/feed?size=1')
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json()) == 1
+    assert response.headers[NEXT_CURSOR_HEADER] == 'cursor'
+    mocked_get_feed.assert_called_once_with(
+        user_id=1, page=None, size=1, cursor=None, variant=None
+    )
+
+
+def test_get_feed_by_page_does_not_return_cursor(
+    authorized_client: TestClient, mocked_get_feed, feed_post
+):
+    mocked_get_feed.return_value = FeedPage(posts=[feed_post])
+    response: Response = authorized_client.get('/users/1/feed?size=1&page=1')
+    assert response.status_code == HTTPStatus.OK
+    assert NEXT_CURSOR_HEADER not in response.headers
+    assert MISSING_POSTS_HEADER not in response.headers
+
+
+def test_get_feed_lists_posts_without_images(
+    authorized_client: TestClient, mocked_get_feed, feed_post
+):
+    mocked_get_feed.return_value = FeedPage(posts=[feed_post], missing_posts_ids=[3])
+    response: Response = authorized_client.get('/users/1/feed?size=2&page=1')
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers[MISSING_POSTS_HEADER] == '3'
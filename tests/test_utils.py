@@ -1,8 +1,19 @@
+from datetime import datetime
 from typing import List, Optional
 
 import pytest
 from final_project.exceptions import PaginationError
-from final_project.utils import get_pagination
+from final_project.metrics import metrics
+from final_project.models import ImageWithPath, OutUser, PostWithImagePath
+from final_project.utils import (
+    FULL_VARIANT,
+    decode_feed_cursor,
+    encode_feed_cursor,
+    get_offset,
+    get_pagination,
+    get_variant_path,
+    join_posts_with_images,
+)
 
 
 @pytest.mark.parametrize(('size', 'page', 'expected_size'), [(15, 1, 15), (8, 2, 7)])
@@ -18,3 +29,77 @@ def test_pagination(size: int, page: int, expected_size: int):
 def test_pagination_with_invalid_size_and_page():
     with pytest.raises(PaginationError):
         get_pagination([], 0, 0)
+
+
+@pytest.mark.parametrize(('page', 'size', 'expected'), [(1, 10, 0), (3, 5, 10)])
+def test_get_offset(page: int, size: int, expected: int):
+    assert get_offset(page, size) == expected
+
+
+@pytest.mark.parametrize(('page', 'size'), [(0, 10), (1, 0)])
+def test_get_offset_with_invalid_size_and_page(page: int, size: int):
+    with pytest.raises(PaginationError):
+        get_offset(page, size)
+
+
+def test_feed_cursor_decodes_to_encoded_values():
+    created_at = datetime(2020, 5, 1, 12, 30, 15, 123)
+    cursor = encode_feed_cursor(created_at, 42)
+    assert decode_feed_cursor(cursor) == (created_at, 42)
+
+
+@pytest.mark.parametrize('cursor', ['', '1234', 'MjAyMC0wNS0wMQ=='])
+def test_decode_invalid_feed_cursor(cursor: str):
+    with pytest.raises(PaginationError):
+        decode_feed_cursor(cursor)
+
+
+def _get_post(id_: int) -> PostWithImagePath:
+    return PostWithImagePath(
+        id=id_,
+        user=OutUser(id=1, username='user'),
+        comments=[],
+        likes=[],
+        marked_users=[],
+        created_at=datetime(2020, 1, 1),
+        image_path=str(id_),
+    )
+
+
+def test_join_posts_with_images_keeps_order_of_posts():
+    posts = [_get_post(id_) for id_ in [3, 1, 2]]
+    images = [ImageWithPath(path=str(id_), image=b'1234') for id_ in [1, 2, 3]]
+    res, missing_ids = join_posts_with_images(posts, images)
+    assert [post.id for post in res] == [3, 1, 2]
+    assert missing_ids == []
+
+
+def test_join_posts_with_images_reports_posts_without_image():
+    metrics.clear()
+    posts = [_get_post(id_) for id_ in [1, 2, 3]]
+    res, missing_ids = join_posts_with_images(
+        posts, [ImageWithPath(path='2', image=b'1234')]
+    )
+    assert [post.id for post in res] == [2]
+    assert missing_ids == [1, 3]
+    assert metrics.snapshot()['posts_without_image'] == 2
+
+
+def test_get_variant_path():
+    post = _get_post(1)
+    post.image_variants = {'thumbnail': 'thumbnail'}
+    assert get_variant_path(post, 'thumbnail') == 'thumbnail'
+    assert get_variant_path(post, FULL_VARIANT) == '1'
+    assert get_variant_path(post) == '1'
+
+
+def test_get_variant_path_when_post_does_not_have_variant():
+    assert get_variant_path(_get_post(1), 'thumbnail') == '1'
+
+
+def test_join_posts_with_images_of_variant():
+    post = _get_post(1)
+    post.image_variants = {'thumbnail': 'thumbnail'}
+    images = [ImageWithPath(path='thumbnail', image=b'1234')]
+    res, _ = join_posts_with_images([post], images, 'thumbnail')
+    assert [p.id for p in res] == [1]
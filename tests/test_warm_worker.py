@@ -0,0 +1,94 @@
+import signal
+
+import pytest
+from final_project import storage_client
+from final_project.config import worker_settings
+from final_project.image_processor import warm_worker
+from final_project.image_processor.warm_worker import (
+    RECYCLE_EXIT_CODE,
+    WarmWorker,
+    run_recycled,
+)
+from final_project.image_processor.worker import warm_up
+from redis import Redis
+from rq import SimpleWorker
+
+
+@pytest.fixture()
+def worker():
+    return WarmWorker(['default'], connection=Redis(), prepare_for_work=False)
+
+
+def test_worker_counts_jobs(mocker, worker):
+    execute_job = mocker.patch.object(SimpleWorker, 'execute_job')
+    worker.execute_job(None, None)
+    worker.execute_job(None, None)
+    assert worker.jobs_count == 2
+    assert execute_job.call_count == 2
+
+
+def test_work_warms_up(mocker, worker):
+    warm_up_ = mocker.patch.object(warm_worker, 'warm_up')
+    work = mocker.patch.object(SimpleWorker, 'work', return_value=True)
+    assert worker.work(burst=True)
+    warm_up_.assert_called_once_with()
+    assert work.call_args[0][0] is True
+
+
+@pytest.mark.usefixtures('_init_db')
+def test_warm_up_opens_connections(mocker):
+    storage_warm_up = mocker.patch.object(storage_client.client, 'warm_up')
+    warm_up()
+    storage_warm_up.assert_called_once_with()
+
+
+def test_run_recycled_restarts_exhausted_worker(mocker):
+    mocker.patch('final_project.image_processor.warm_worker.signal.signal')
+    process = mocker.patch('final_project.image_processor.warm_worker.Process')
+    exit_codes = iter([RECYCLE_EXIT_CODE, RECYCLE_EXIT_CODE, 0])
+
+    def join():
+        process.return_value.exitcode = next(exit_codes)
+
+    process.return_value.join.side_effect = join
+    assert run_recycled(burst=True) == 0
+    assert process.return_value.start.call_count == 3
+
+
+@pytest.mark.parametrize('alive', [True, False])
+def test_run_recycled_stops_on_sigterm(mocker, alive):
+    signal_ = mocker.patch('final_project.image_processor.warm_worker.signal.signal')
+    process = mocker.patch('final_project.image_processor.warm_worker.Process')
+    kill = mocker.patch('final_project.image_processor.warm_worker.os.kill')
+    process.return_value.is_alive.return_value = alive
+
+    def join():
+        stop = signal_.call_args_list[0][0][1]
+        stop(signal.SIGTERM, None)
+        process.return_value.exitcode = RECYCLE_EXIT_CODE
+
+    process.return_value.join.side_effect = join
+    assert run_recycled() == RECYCLE_EXIT_CODE
+    assert process.return_value.start.call_count == 1
+    if alive:
+        kill.assert_called_once_with(process.return_value.pid, signal.SIGTERM)
+    else:
+        kill.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    ('max_jobs', 'jobs_count', 'exit_code'),
+    [(1, 1, RECYCLE_EXIT_CODE), (2, 1, 0), (0, 1, 0)],
+)
+def test_run_worker_exits_with_recycle_code_after_max_jobs(
+    mocker, max_jobs, jobs_count, exit_code
+):
+    mocker.patch.object(worker_settings, 'worker_max_jobs', max_jobs)
+    worker_class = mocker.patch.object(warm_worker, 'WarmWorker')
+    worker_class.return_value.jobs_count = jobs_count
+    with pytest.raises(SystemExit) as e:
+        warm_worker._run_worker(burst=True)
+    assert e.value.code == exit_code
+    worker_class.return_value.work.assert_called_once_with(
+        burst=True, max_jobs=max_jobs or None
+    )
@@ -2,15 +2,24 @@ from datetime import datetime
 from pathlib import Path
 
 import pytest
-from final_project.config import image_cutting_settings
+from final_project.config import FeedMode, feed_settings, image_cutting_settings
+from final_project.data_access_layer.timeline import TimelineDAL
 from final_project.data_access_layer.users import UsersDataAccessLayer
 from final_project.database.database import create_session
 from final_project.database.models import Post
+from final_project.exceptions import StorageError
 from final_project.image_processor.image import MyImage
-from final_project.image_processor.worker import Processor, process_image
+from final_project.image_processor.worker import (
+    Processor,
+    process_image,
+    process_posts,
+)
 from final_project.messages import Message
-from final_project.redis_keys import RedisKey
+from final_project.models import WorkerResult
+from final_project.redis import RedisInstances
+from final_project.redis_keys import RedisKey, get_timeline_key
 from redis import Redis
+from redis.exceptions import RedisError
 
 
 @pytest.fixture()
@@ -47,13 +56,14 @@ def _mock_processor(mocker):
     '_init_db', '_add_user', '_mock_cut', '_mock_save', '_mock_processor'
 )
 def test_process_image_will_call_read_cut_and_save(
-    in_post, mock_read_image, image_2x2, uuid
+    queued_post, mock_read_image, image_2x2, uuid
 ):
-    fake_image_bytes = '1234'
-    in_post.image = fake_image_bytes
     user_id: int = 1
-    process_image(user_id, in_post, uuid)
-    MyImage.cut.assert_called_once_with(image_cutting_settings.aspect_resolution)
+    process_image(user_id, queued_post, uuid)
+    MyImage.cut.assert_called_once_with(
+        image_cutting_settings.aspect_resolution,
+        max(image_cutting_settings.variants.values()),
+    )
     MyImage.save.assert_called_once_with(user_id)
 
 
@@ -111,20 +121,41 @@ def mocked_datetime(mocker):
     '_mock_add_marked_users',
     'mock_read_image',
 )
-def test_process_add_post_in_database(in_post, uuid, mocked_datetime):
+def test_process_add_post_in_database(queued_post, uuid, mocked_datetime):
     user_id = 1
     time = datetime.utcnow()
     mocked_datetime.utcnow.return_value = time
-    process_image(user_id, in_post, uuid)
+    process_image(user_id, queued_post, uuid)
     with create_session() as session:
         post = session.query(Post).filter(Post.id == 1).first()
         assert post
         assert post.user_id == user_id
-        assert post.location == in_post.location
-        assert post.description == in_post.description
+        assert post.location == queued_post.location
+        assert post.description == queued_post.description
         assert post.created_at == time
 
 
+@pytest.mark.usefixtures(
+    '_init_db', '_add_user', '_mock_processor', '_mock_add_marked_users'
+)
+def test_process_image_saves_variants(
+    mocker, queued_post, uuid, resource_directory, path
+):
+    queued_post.image = (resource_directory / 'image_4x4.png').read_bytes()
+    mocker.patch.object(image_cutting_settings, 'aspect_resolution', 4)
+    mocker.patch.object(image_cutting_settings, 'variants', {'thumbnail': 2})
+    save = mocker.patch(
+        'final_project.image_processor.image.save_image_to_storage',
+        side_effect=[path, 'thumbnail'],
+    )
+    process_image(1, queued_post, uuid)
+    assert save.call_count == 2
+    with create_session() as session:
+        post = session.query(Post).filter(Post.id == 1).one()
+        assert post.image_path == path
+        assert post.image_variants == {'thumbnail': 'thumbnail'}
+
+
 @pytest.fixture()
 async def _add_2_users(in_user):
     with create_session() as session:
@@ -142,11 +173,137 @@ async def _add_2_users(in_user):
     '_mock_processor',
     'mock_read_image',
 )
-def test_process_add_marked_users_to_database(in_post, uuid):
-    in_post.marked_users_ids = [2, 3]
-    process_image(1, in_post, uuid)
+def test_process_add_marked_users_to_database(queued_post, uuid):
+    queued_post.marked_users_ids = [2, 3]
+    process_image(1, queued_post, uuid)
     with create_session() as session:
         post = session.query(Post).filter(Post.id == 1).first()
         marked_users = post.marked_users
         assert len(marked_users) == 2
         assert list(map(lambda user: user.id, marked_users)) == [2, 3]
+
+
+@pytest.mark.usefixtures(
+    '_init_db',
+    '_add_user',
+    '_mock_cut',
+    '_mock_save',
+    '_mock_processor',
+    'mock_read_image',
+)
+def test_process_image_fans_out_post_in_timeline_mode(queued_post, uuid, mocker):
+    mocker.patch.object(feed_settings, 'feed_mode', FeedMode.TIMELINE)
+    fan_out = mocker.patch.object(TimelineDAL, 'fan_out')
+    process_image(1, queued_post, uuid)
+    assert fan_out.call_args[0][1] == 1
+
+
+@pytest.mark.usefixtures(
+    '_init_db', '_add_user', '_mock_cut', '_mock_save', 'mock_read_image'
+)
+def test_process_image_invalidates_timelines_when_fan_out_fails(
+    queued_post, uuid, mocker
+):
+    mocker.patch.object(feed_settings, 'feed_mode', FeedMode.TIMELINE)
+    mocker.patch.object(TimelineDAL, 'fan_out', side_effect=RedisError('down'))
+    invalidate = mocker.patch.object(TimelineDAL, 'invalidate_followers')
+    redis = mocker.patch.object(RedisInstances, 'sync_redis').return_value
+    on_result = mocker.patch.object(Processor, 'on_result')
+    process_image(1, queued_post, uuid)
+    assert on_result.call_args[0] == (uuid, WorkerResult(post_id=1))
+    redis.delete.assert_called_once_with(get_timeline_key(1))
+    assert invalidate.call_args[0][1] == 1
+
+
+@pytest.fixture()
+def image_4x4_post(resource_directory, queued_post, mocker):
+    mocker.patch.object(image_cutting_settings, 'aspect_resolution', 4)
+    mocker.patch.object(image_cutting_settings, 'variants', {'thumbnail': 2})
+    queued_post.image = (resource_directory / 'image_4x4.png').read_bytes()
+    return queued_post
+
+
+@pytest.mark.usefixtures('_init_db', '_add_user', '_add_2_users')
+def test_process_posts_saves_batch_in_one_upload(mocker, image_4x4_post):
+    marked_post = image_4x4_post.copy(update={'marked_users_ids': [2, 3]})
+    save = mocker.patch(
+        'final_project.storage_batch.save_images_to_storage',
+        return_value=['a', 'a_thumb', 'b', 'b_thumb'],
+    )
+    results = process_posts([(1, image_4x4_post), (2, marked_post)])
+    assert [result.post_id for result in results] == [1, 2]
+    save.assert_called_once()
+    assert [user_id for _, user_id in save.call_args[0][0]] == [1, 1, 2, 2]
+    with create_session() as session:
+        first, second = session.query(Post).order_by(Post.id).all()
+        assert (first.user_id, first.image_path) == (1, 'a')
+        assert first.image_variants == {'thumbnail': 'a_thumb'}
+        assert first.marked_users == []
+        assert (second.user_id, second.image_path) == (2, 'b')
+        assert [user.id for user in second.marked_users] == [2, 3]
+
+
+@pytest.mark.usefixtures('_init_db', '_add_user')
+def test_process_posts_records_failure_per_post(mocker, image_4x4_post):
+    mocker.patch(
+        'final_project.storage_batch.save_images_to_storage',
+        return_value=['a', 'a_thumb', 'b', StorageError('unavailable')],
+    )
+    delete = mocker.patch('final_project.storage_client.delete_image_from_storage')
+    broken_post = image_4x4_post.copy(update={'image': b'1234'})
+    results = process_posts(
+        [(1, image_4x4_post), (1, broken_post), (1, image_4x4_post)]
+    )
+    assert results[0].post_id == 1
+    assert results[1].error == Message.BYTES_ARE_NOT_A_IMAGE.value
+    assert results[2].error == 'unavailable'
+    delete.assert_called_once_with('b')
+    with create_session() as session:
+        assert session.query(Post).count() == 1
+
+
+@pytest.mark.usefixtures('_init_db', '_add_user')
+def test_process_posts_fans_out_posts_in_timeline_mode(mocker, image_4x4_post):
+    mocker.patch.object(feed_settings, 'feed_mode', FeedMode.TIMELINE)
+    mocker.patch(
+        'final_project.storage_batch.save_images_to_storage',
+        return_value=['a', 'a_thumb', 'b', 'b_thumb'],
+    )
+    fan_out = mocker.patch.object(TimelineDAL, 'fan_out')
+    process_posts([(1, image_4x4_post), (1, image_4x4_post)])
+    assert [call[0][1] for call in fan_out.call_args_list] == [1, 2]
+
+
+@pytest.mark.usefixtures('_init_db', '_add_user')
+def test_process_posts_deletes_images_when_db_fails(mocker, image_4x4_post):
+    mocker.patch(
+        'final_project.storage_batch.save_images_to_storage',
+        return_value=['a', 'a_thumb', 'b', 'b_thumb'],
+    )
+    delete = mocker.patch('final_project.storage_client.delete_image_from_storage')
+    marked_post = image_4x4_post.copy(update={'marked_users_ids': [100]})
+    results = process_posts([(1, image_4x4_post), (1, marked_post)])
+    assert all(result.post_id is None and result.error for result in results)
+    deleted = sorted(call[0][0] for call in delete.call_args_list)
+    assert deleted == ['a', 'a_thumb', 'b', 'b_thumb']
+    with create_session() as session:
+        assert session.query(Post).count() == 0
+
+
+@pytest.mark.usefixtures('_init_db', '_add_user')
+def test_process_posts_ignores_fan_out_errors(mocker, image_4x4_post):
+    mocker.patch.object(feed_settings, 'feed_mode', FeedMode.TIMELINE)
+    mocker.patch(
+        'final_project.storage_batch.save_images_to_storage',
+        return_value=['a', 'a_thumb', 'b', 'b_thumb'],
+    )
+    mocker.patch.object(TimelineDAL, 'fan_out', side_effect=RedisError('down'))
+    results = process_posts([(1, image_4x4_post), (1, image_4x4_post)])
+    assert [result.post_id for result in results] == [1, 2]
+
+
+def test_process_posts_without_valid_images(queued_post, mocker):
+    save = mocker.patch('final_project.storage_batch.save_images_to_storage')
+    results = process_posts([(1, queued_post)])
+    assert results[0].error == Message.BYTES_ARE_NOT_A_IMAGE.value
+    save.assert_not_called()
@@ -0,0 +1,221 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from final_project.config import worker_settings
+from final_project.image_processor.pool import (
+    ABANDONED_JOB_ERROR,
+    PROCESS_IMAGE,
+    WorkerPool,
+)
+from final_project.image_processor.worker import Processor, process_image
+from final_project.models import QueuedPost, WorkerResult
+from mock import ANY, MagicMock, Mock
+from rq import Queue
+from rq.defaults import DEFAULT_RESULT_TTL
+from rq.job import Job, JobStatus
+from rq.registry import StartedJobRegistry
+
+
+@pytest.fixture()
+def queue():
+    return Queue(connection=MagicMock())
+
+
+@pytest.fixture()
+def pipeline(queue):
+    return queue.connection.pipeline.return_value.__enter__.return_value
+
+
+@pytest.fixture()
+def on_result(mocker):
+    return mocker.patch.object(Processor, 'on_result')
+
+
+def _get_job(image: bytes, task_id: str) -> Mock:
+    job = Mock(spec=Job)
+    job.func_name = PROCESS_IMAGE
+    job.args = (1, QueuedPost(image=image, description='descr'), task_id)
+    job.timeout = 180
+    job.failure_ttl = None
+    job.get_result_ttl.return_value = DEFAULT_RESULT_TTL
+    return job
+
+
+def _create_job(queue, task_id: str) -> Job:
+    return Job.create(
+        process_image,
+        args=(1, QueuedPost(image=b'', description='descr'), task_id),
+        connection=queue.connection,
+        origin=queue.name,
+        failure_ttl=60,
+    )
+
+
+def _run(mocker, queue, jobs):
+    queued = iter([(job, queue) for job in jobs])
+    mocker.patch.object(
+        Queue, 'dequeue_any', side_effect=lambda *args, **kwargs: next(queued, None)
+    )
+    with WorkerPool(2) as pool:
+        return pool.run(queue, burst=True)
+
+
+@pytest.mark.usefixtures('_init_db', '_add_user')
+@pytest.mark.parametrize('image_in_bytes', ['image_4x4.png'], indirect=True)
+def test_run_processes_jobs_in_pool(mocker, queue, on_result, image_in_bytes):
+    mocker.patch(
+        'final_project.storage_batch.save_images_to_storage',
+        side_effect=lambda images: ['1'] * len(images),
+    )
+    mocker.patch.object(worker_settings, 'worker_batch_size', 2)
+    jobs = [_get_job(image_in_bytes, str(i)) for i in range(3)]
+    assert _run(mocker, queue, jobs) == 3
+    results = {call[0][0]: call[0][1] for call in on_result.call_args_list}
+    assert sorted(result.post_id for result in results.values()) == [1, 2, 3]
+    for job in jobs:
+        assert job.set_status.call_args_list == [
+            mocker.call(JobStatus.STARTED, pipeline=ANY),
+            mocker.call(JobStatus.FINISHED, pipeline=ANY),
+        ]
+        job.cleanup.assert_called_once_with(
+            DEFAULT_RESULT_TTL, pipeline=ANY, remove_from_queue=False
+        )
+
+
+def test_run_marks_failed_jobs(mocker, queue, on_result):
+    job = _get_job(b'1234', 'task')
+    assert _run(mocker, queue, [job]) == 1
+    task_id, result = on_result.call_args[0]
+    assert task_id == 'task'
+    assert result.error
+    job.set_status.assert_called_with(JobStatus.FAILED, pipeline=ANY)
+
+
+def test_run_performs_other_jobs_in_supervisor(mocker, queue, on_result):
+    worker = mocker.patch('final_project.image_processor.pool.SimpleWorker')
+    job = Mock(spec=Job)
+    job.func_name = 'other'
+    assert _run(mocker, queue, [job]) == 1
+    worker.return_value.perform_job.assert_called_once_with(job, queue)
+    on_result.assert_not_called()
+
+
+def _crash(posts):
+    os._exit(1)
+
+
+def test_run_marks_jobs_of_crashed_process_as_failed(mocker, queue, on_result):
+    mocker.patch('final_project.image_processor.pool.process_posts', _crash)
+    job = _get_job(b'1234', 'task')
+    assert _run(mocker, queue, [job]) == 1
+    assert on_result.call_args[0][1].error
+    job.set_status.assert_called_with(JobStatus.FAILED, pipeline=ANY)
+
+
+def test_run_marks_jobs_as_failed_when_pool_is_broken(mocker, queue, on_result):
+    mocker.patch.object(WorkerPool, 'submit', side_effect=BrokenProcessPool('broken'))
+    job = _get_job(b'1234', 'task')
+    assert _run(mocker, queue, [job]) == 1
+    assert on_result.call_args[0][1].error
+    job.set_status.assert_called_with(JobStatus.FAILED, pipeline=ANY)
+
+
+def test_dequeue_batch_collects_up_to_batch_size(mocker, queue):
+    mocker.patch.object(worker_settings, 'worker_batch_size', 2)
+    jobs = [_get_job(b'', str(i)) for i in range(3)]
+    queued = iter([(job, queue) for job in jobs])
+    mocker.patch.object(
+        Queue, 'dequeue_any', side_effect=lambda *args, **kwargs: next(queued, None)
+    )
+    assert WorkerPool._dequeue_batch(queue, block=False) == jobs[:2]
+    assert WorkerPool._dequeue_batch(queue, block=False) == jobs[2:]
+    assert WorkerPool._dequeue_batch(queue, block=False) == []
+
+
+def test_dequeue_batch_waits_for_jobs(mocker, queue):
+    mocker.patch.object(worker_settings, 'worker_batch_size', 2)
+    mocker.patch.object(worker_settings, 'worker_batch_wait_ms', 1000)
+    jobs = [_get_job(b'', str(i)) for i in range(2)]
+    queued = iter([(jobs[0], queue), None, None, (jobs[1], queue)])
+    mocker.patch.object(
+        Queue, 'dequeue_any', side_effect=lambda *args, **kwargs: next(queued, None)
+    )
+    assert WorkerPool._dequeue_batch(queue, block=True) == jobs
+
+
+def test_finish_records_result_of_each_job(mocker, queue, on_result):
+    jobs = [_get_job(b'', 'first'), _get_job(b'', 'second')]
+    results = [WorkerResult(post_id=1), WorkerResult(error='error')]
+    future = mocker.Mock()
+    future.result.return_value = results
+    WorkerPool._finish(jobs, future, queue)
+    assert on_result.call_args_list == [
+        mocker.call('first', results[0]),
+        mocker.call('second', results[1]),
+    ]
+    jobs[0].set_status.assert_called_once_with(JobStatus.FINISHED, pipeline=ANY)
+    jobs[1].set_status.assert_called_once_with(JobStatus.FAILED, pipeline=ANY)
+
+
+def test_finish_marks_crashed_jobs_as_failed(mocker, queue, on_result):
+    jobs = [_get_job(b'', 'first'), _get_job(b'', 'second')]
+    future = mocker.Mock()
+    future.result.side_effect = ValueError('crash')
+    WorkerPool._finish(jobs, future, queue)
+    assert on_result.call_args_list == [
+        mocker.call('first', WorkerResult(error='crash')),
+        mocker.call('second', WorkerResult(error='crash')),
+    ]
+    for job in jobs:
+        job.set_status.assert_called_once_with(JobStatus.FAILED, pipeline=ANY)
+
+
+@pytest.mark.parametrize(
+    ('result', 'ttl'),
+    [(WorkerResult(post_id=1), DEFAULT_RESULT_TTL), (WorkerResult(error='error'), 60)],
+)
+def test_finish_sets_ttl_of_job_key(mocker, queue, pipeline, on_result, result, ttl):
+    job = _create_job(queue, 'task')
+    future = mocker.Mock()
+    future.result.return_value = [result]
+    WorkerPool._finish([job], future, queue)
+    assert mocker.call(job.key, ttl) in pipeline.expire.call_args_list
+    pipeline.zrem.assert_called_once_with(StartedJobRegistry(queue=queue).key, job.id)
+    pipeline.execute.assert_called_once_with()
+
+
+def test_start_adds_jobs_to_started_registry(mocker, queue, pipeline):
+    mocker.patch.object(WorkerPool, 'submit')
+    jobs = [_get_job(b'', 'first'), _get_job(b'', 'second')]
+    WorkerPool(1)._start(jobs, queue)
+    key = StartedJobRegistry(queue=queue).key
+    assert [call[0][0] for call in pipeline.zadd.call_args_list] == [key, key]
+    pipeline.execute.assert_called_once_with()
+
+
+def test_fail_abandoned_marks_expired_jobs_as_failed(mocker, queue, on_result):
+    job = _create_job(queue, 'task')
+    mocker.patch.object(
+        StartedJobRegistry, 'get_expired_job_ids', return_value=[job.id]
+    )
+    cleanup = mocker.patch.object(StartedJobRegistry, 'cleanup')
+    mocker.patch.object(Job, 'fetch', return_value=job)
+    on_failure = mocker.patch.object(Processor, 'on_failure')
+    WorkerPool._fail_abandoned(queue)
+    on_failure.assert_called_once_with('task', ABANDONED_JOB_ERROR)
+    cleanup.assert_called_once()
+
+
+def test_submit_when_pool_is_not_started(queued_post):
+    with pytest.raises(RuntimeError):
+        WorkerPool(1).submit([(1, queued_post)])
+
+
+@pytest.mark.usefixtures('_init_db')
+def test_submit_restarts_broken_pool(mocker):
+    with WorkerPool(1) as pool:
+        broken = pool._executor
+        mocker.patch.object(broken, 'submit', side_effect=BrokenProcessPool())
+        assert pool.submit([]).result() == []
+        assert pool._executor is not broken